@@ -0,0 +1,561 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+"""
+Benchmark suite for the public PSyTran API.
+
+Each benchmark times a public function from :py:mod:`psytran.family`,
+:py:mod:`psytran.loop`, :py:mod:`psytran.directives`,
+:py:mod:`psytran.clauses` or :py:mod:`psytran.convert`, applied across a
+whole Schedule, on inputs of increasing size. Each size parameter (the number
+of Loop nests, the nest depth and the body length) is swept in turn with the
+others held fixed, and the empirical scaling exponent with respect to the
+number of Nodes in the Schedule is estimated by a least squares fit on a
+log-log scale. An exponent near one indicates linear scaling.
+
+Results are written as JSON and, if a baseline from an earlier run is given,
+any benchmark whose scaling exponent has grown by more than a tolerance, or
+whose time at the largest size has grown by more than a factor, is reported
+as a regression and the exit code is non-zero. Usage:
+
+.. code-block:: bash
+
+    python3 benchmarks/run_benchmarks.py -o results.json
+    python3 benchmarks/run_benchmarks.py -o new.json --baseline results.json
+
+Scaling curves are also plotted if ``--plot`` is given and matplotlib is
+installed.
+"""
+
+import argparse
+import datetime
+import json
+import math
+import platform
+import re
+import sys
+import time
+from collections import namedtuple
+from importlib import metadata
+
+from psyclone.psyir import nodes
+from psyclone.psyir.frontend.fortran import FortranReader
+from psyclone.psyir.transformations import ACCKernelsTrans
+from psyclone.transformations import ACCLoopTrans
+from psyclone.version import __VERSION__ as psyclone_version
+
+import psytran
+from psytran.dependency import get_dependency_cache
+from psytran.synthetic import generate_kernel
+
+Benchmark = namedtuple(
+    "Benchmark",
+    ["name", "module", "prepare", "setup", "array_notation"],
+    defaults=[None, False],
+)
+
+# Sizes swept for each parameter, and the values used when another is swept
+_base = {"loops": 8, "depth": 2, "body": 2}
+_sweeps = {
+    "loops": [4, 8, 16, 32, 64],
+    "depth": [1, 2, 3, 4, 5],
+    "body": [1, 4, 16, 64],
+}
+_quick_base = {"loops": 2, "depth": 2, "body": 1}
+_quick_sweeps = {"loops": [2, 4, 8], "depth": [1, 2, 3], "body": [1, 2, 4]}
+
+
+def _outer_loops(schedule):
+    return [
+        loop
+        for loop in schedule.walk(nodes.Loop)
+        if loop.ancestor(nodes.Loop) is None
+    ]
+
+
+def _for_each(func, items):
+    """
+    Return a callable which applies a function to each item in a list.
+    """
+    return lambda: [func(item) for item in items]
+
+
+def _with_kernels(schedule):
+    """
+    Wrap each outer Loop in an OpenACC ``kernels`` region.
+    """
+    trans = ACCKernelsTrans()
+    for loop in _outer_loops(schedule):
+        trans.apply(loop)
+
+
+def _with_loop_directives(schedule):
+    """
+    Wrap each outer Loop in a ``kernels`` region and apply ``loop`` directives
+    with clauses to every Loop.
+    """
+    _with_kernels(schedule)
+    trans = ACCLoopTrans()
+    loops = sorted(schedule.walk(nodes.Loop), key=lambda loop: loop.depth)
+    for i, loop in enumerate(loops):
+        options = {"gang": True} if i % 2 else {"sequential": True}
+        trans.apply(loop, options=options)
+
+
+def _benchmarks():
+    """
+    Define the benchmarks. Each one prepares a callable from a freshly parsed
+    Schedule, which may modify it, after an optional untimed setup step.
+    """
+    walk = nodes.Schedule.walk
+    return [
+        # psytran.family
+        Benchmark(
+            "iter_descendents",
+            "family",
+            lambda s: lambda: sum(
+                1 for _ in psytran.iter_descendents(s, nodes.Assignment)
+            ),
+        ),
+        Benchmark(
+            "get_descendents",
+            "family",
+            lambda s: lambda: psytran.get_descendents(s, nodes.Loop),
+        ),
+        Benchmark(
+            "get_children",
+            "family",
+            lambda s: _for_each(psytran.get_children, walk(s, nodes.Loop)),
+        ),
+        Benchmark(
+            "iter_ancestors",
+            "family",
+            lambda s: _for_each(
+                lambda node: list(psytran.iter_ancestors(node)),
+                walk(s, nodes.Assignment),
+            ),
+        ),
+        Benchmark(
+            "get_ancestors",
+            "family",
+            lambda s: _for_each(
+                lambda node: psytran.get_ancestors(node, nodes.Loop),
+                walk(s, nodes.Assignment),
+            ),
+        ),
+        Benchmark(
+            "has_descendent",
+            "family",
+            lambda s: _for_each(
+                lambda loop: psytran.has_descendent(loop, nodes.Assignment),
+                walk(s, nodes.Loop),
+            ),
+        ),
+        Benchmark(
+            "has_ancestor",
+            "family",
+            lambda s: _for_each(
+                lambda node: psytran.has_ancestor(node, nodes.Loop),
+                walk(s, nodes.Assignment),
+            ),
+        ),
+        Benchmark(
+            "is_ancestor",
+            "family",
+            lambda s: _for_each(
+                lambda node: psytran.is_ancestor(s, node),
+                walk(s, nodes.Assignment),
+            ),
+        ),
+        Benchmark(
+            "is_descendent",
+            "family",
+            lambda s: _for_each(
+                lambda node: psytran.is_descendent(node, s),
+                walk(s, nodes.Assignment),
+            ),
+        ),
+        # psytran.loop
+        Benchmark(
+            "is_outer_loop",
+            "loop",
+            lambda s: _for_each(psytran.is_outer_loop, walk(s, nodes.Loop)),
+        ),
+        Benchmark(
+            "loop2nest",
+            "loop",
+            lambda s: _for_each(psytran.loop2nest, _outer_loops(s)),
+        ),
+        Benchmark(
+            "nest2loop",
+            "loop",
+            lambda s: _for_each(
+                psytran.nest2loop,
+                [psytran.loop2nest(loop) for loop in _outer_loops(s)],
+            ),
+        ),
+        Benchmark(
+            "is_perfectly_nested",
+            "loop",
+            lambda s: _for_each(
+                psytran.is_perfectly_nested, walk(s, nodes.Loop)
+            ),
+        ),
+        Benchmark(
+            "is_simple_loop",
+            "loop",
+            lambda s: _for_each(psytran.is_simple_loop, walk(s, nodes.Loop)),
+        ),
+        Benchmark(
+            "is_independent",
+            "loop",
+            lambda s: _for_each(psytran.is_independent, walk(s, nodes.Loop)),
+        ),
+        Benchmark(
+            "is_parallelisable",
+            "loop",
+            lambda s: _for_each(
+                psytran.is_parallelisable, walk(s, nodes.Loop)
+            ),
+        ),
+        Benchmark(
+            "analyse_loops",
+            "loop",
+            lambda s: lambda: psytran.analyse_loops(s),
+        ),
+        # psytran.directives
+        Benchmark(
+            "apply_parallel_directive",
+            "directives",
+            lambda s: _for_each(
+                lambda loop: psytran.apply_parallel_directive(
+                    loop, ACCKernelsTrans
+                ),
+                _outer_loops(s),
+            ),
+        ),
+        Benchmark(
+            "apply_parallel_directives",
+            "directives",
+            lambda s: lambda: psytran.apply_parallel_directives(
+                _outer_loops(s), ACCKernelsTrans
+            ),
+        ),
+        Benchmark(
+            "has_parallel_directive",
+            "directives",
+            lambda s: _for_each(
+                lambda loop: psytran.has_parallel_directive(
+                    loop, nodes.ACCKernelsDirective
+                ),
+                walk(s, nodes.Loop),
+            ),
+            setup=_with_kernels,
+        ),
+        Benchmark(
+            "apply_loop_directive",
+            "directives",
+            lambda s: _for_each(
+                lambda loop: psytran.apply_loop_directive(
+                    loop, ACCLoopTrans()
+                ),
+                sorted(walk(s, nodes.Loop), key=lambda loop: loop.depth),
+            ),
+            setup=_with_kernels,
+        ),
+        Benchmark(
+            "apply_loop_directives",
+            "directives",
+            lambda s: lambda: psytran.apply_loop_directives(
+                walk(s, nodes.Loop), ACCLoopTrans()
+            ),
+            setup=_with_kernels,
+        ),
+        Benchmark(
+            "has_loop_directive",
+            "directives",
+            lambda s: _for_each(
+                psytran.has_loop_directive, walk(s, nodes.Loop)
+            ),
+            setup=_with_loop_directives,
+        ),
+        # psytran.clauses
+        Benchmark(
+            "has_seq_clause",
+            "clauses",
+            lambda s: _for_each(psytran.has_seq_clause, walk(s, nodes.Loop)),
+            setup=_with_loop_directives,
+        ),
+        Benchmark(
+            "has_gang_clause",
+            "clauses",
+            lambda s: _for_each(psytran.has_gang_clause, walk(s, nodes.Loop)),
+            setup=_with_loop_directives,
+        ),
+        Benchmark(
+            "has_vector_clause",
+            "clauses",
+            lambda s: _for_each(
+                psytran.has_vector_clause, walk(s, nodes.Loop)
+            ),
+            setup=_with_loop_directives,
+        ),
+        Benchmark(
+            "has_collapse_clause",
+            "clauses",
+            lambda s: _for_each(
+                psytran.has_collapse_clause, walk(s, nodes.Loop)
+            ),
+            setup=_with_loop_directives,
+        ),
+        # psytran.convert
+        Benchmark(
+            "convert_array_notation",
+            "convert",
+            lambda s: lambda: psytran.convert_array_notation(s),
+            array_notation=True,
+        ),
+    ]
+
+
+def _time(benchmark, sizes, repeats):
+    """
+    Time a benchmark for a given set of sizes, taking the best of a number of
+    repeats. Parsing and preparation are not timed.
+
+    :returns: the number of Nodes in the Schedule and the time in seconds.
+    """
+    source = generate_kernel(
+        num_loops=sizes["loops"],
+        depth=sizes["depth"],
+        body=sizes["body"],
+        array_notation=float(benchmark.array_notation),
+    )
+    reader = FortranReader()
+    best = math.inf
+    for _ in range(repeats):
+        schedule = reader.psyir_from_source(source).children[0]
+        if benchmark.setup is not None:
+            benchmark.setup(schedule)
+        size = len(schedule.walk(nodes.Node))
+        get_dependency_cache().clear()
+        func = benchmark.prepare(schedule)
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return size, best
+
+
+def _exponent(points):
+    """
+    Estimate the scaling exponent from a least squares fit of the logarithm of
+    time against the logarithm of size.
+    """
+    points = [(math.log(x), math.log(y)) for x, y in points if x > 0 and y > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        return None
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    return cov / var_x
+
+
+def run(benchmarks, base, sweeps, repeats, verbose=True):
+    """
+    Run the benchmarks, sweeping each size parameter in turn.
+
+    :returns: the results, as a JSON-serialisable dictionary.
+    """
+    results, scaling = [], []
+    for benchmark in benchmarks:
+        for dimension, values in sweeps.items():
+            points = []
+            for value in values:
+                sizes = dict(base, **{dimension: value})
+                size, seconds = _time(benchmark, sizes, repeats)
+                points.append((size, seconds))
+                results.append(
+                    {
+                        "name": benchmark.name,
+                        "module": benchmark.module,
+                        "dimension": dimension,
+                        "value": value,
+                        "nodes": size,
+                        "seconds": seconds,
+                    }
+                )
+            exponent = _exponent(points)
+            scaling.append(
+                {
+                    "name": benchmark.name,
+                    "module": benchmark.module,
+                    "dimension": dimension,
+                    "exponent": exponent,
+                    "seconds": points[-1][1],
+                }
+            )
+            if verbose:
+                exponent = "n/a" if exponent is None else f"{exponent:.2f}"
+                print(
+                    f"{benchmark.module:>10s}.{benchmark.name:<26s}"
+                    f" {dimension:<6s} exponent {exponent:>5s}"
+                    f"  largest {points[-1][1] * 1e3:9.3f} ms"
+                )
+    return {
+        "metadata": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "psyclone": psyclone_version,
+            "psytran": metadata.version("psytran"),
+            "repeats": repeats,
+            "base": base,
+            "sweeps": sweeps,
+        },
+        "results": results,
+        "scaling": scaling,
+    }
+
+
+def compare(current, baseline, tolerance, slowdown, min_time=1e-3):
+    """
+    Compare scaling results with those of a baseline run. Benchmarks which are
+    too fast at their largest size to be timed reliably are skipped.
+
+    :returns: a description of each regression found.
+    """
+    previous = {
+        (entry["name"], entry["dimension"]): entry
+        for entry in baseline["scaling"]
+    }
+    regressions = []
+    for entry in current["scaling"]:
+        old = previous.get((entry["name"], entry["dimension"]))
+        if old is None or max(entry["seconds"], old["seconds"]) < min_time:
+            continue
+        label = f"{entry['name']} ({entry['dimension']})"
+        if (
+            entry["exponent"] is not None
+            and old["exponent"] is not None
+            and entry["exponent"] > old["exponent"] + tolerance
+        ):
+            regressions.append(
+                f"{label}: scaling exponent {old['exponent']:.2f}"
+                f" -> {entry['exponent']:.2f}"
+            )
+        if entry["seconds"] > slowdown * old["seconds"]:
+            regressions.append(
+                f"{label}: largest size {old['seconds'] * 1e3:.3f} ms"
+                f" -> {entry['seconds'] * 1e3:.3f} ms"
+            )
+    return regressions
+
+
+def plot(data, filename):
+    """
+    Plot time against number of Nodes for each benchmark, with one panel per
+    size parameter.
+    """
+    try:
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not installed, so no plot is produced.")
+        return
+    dimensions = list(data["metadata"]["sweeps"])
+    fig, axes = plt.subplots(
+        1, len(dimensions), figsize=(6 * len(dimensions), 5)
+    )
+    for ax, dimension in zip(axes, dimensions):
+        curves = {}
+        for entry in data["results"]:
+            if entry["dimension"] == dimension:
+                curves.setdefault(entry["name"], []).append(
+                    (entry["nodes"], entry["seconds"])
+                )
+        for name, points in curves.items():
+            ax.loglog(*zip(*points), marker="o", label=name)
+        ax.set_title(f"Sweep over {dimension}")
+        ax.set_xlabel("Nodes in Schedule")
+        ax.set_ylabel("Time [s]")
+        ax.grid(True, which="both", alpha=0.3)
+    axes[-1].legend(
+        fontsize="x-small", loc="center left", bbox_to_anchor=(1, 0.5)
+    )
+    fig.tight_layout()
+    fig.savefig(filename)
+
+
+def main(arguments=None):
+    """
+    Command line interface for the benchmark suite.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "-o", "--output", default=None, help="JSON results file"
+    )
+    parser.add_argument(
+        "-k", "--filter", default=None, help="regex selecting benchmark names"
+    )
+    parser.add_argument(
+        "-n", "--repeats", type=int, default=3, help="repeats per size"
+    )
+    parser.add_argument(
+        "--quick", action="store_true", help="use small sizes, e.g., for CI"
+    )
+    parser.add_argument("--baseline", default=None, help="JSON results file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="allowed increase in the scaling exponent",
+    )
+    parser.add_argument(
+        "--slowdown",
+        type=float,
+        default=2.0,
+        help="allowed factor of slowdown at the largest size",
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=1e-3,
+        help="time in seconds below which regressions are not checked",
+    )
+    parser.add_argument("--plot", default=None, help="image file for curves")
+    args = parser.parse_args(arguments)
+
+    benchmarks = _benchmarks()
+    if args.filter is not None:
+        pattern = re.compile(args.filter)
+        benchmarks = [b for b in benchmarks if pattern.search(b.name)]
+    base, sweeps = (
+        (_quick_base, _quick_sweeps) if args.quick else (_base, _sweeps)
+    )
+    data = run(benchmarks, base, sweeps, args.repeats)
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(data, output_file, indent=2)
+    if args.plot is not None:
+        plot(data, args.plot)
+    if args.baseline is not None:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(
+            data, baseline, args.tolerance, args.slowdown, args.min_time
+        )
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        return int(bool(regressions))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
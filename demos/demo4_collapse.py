@@ -104,6 +104,12 @@ def trans(psy):
 #    script? Is the output the same? Convince yourself that everything is
 #    working as expected by reading the `API documentation <../psytran.html>`__.
 #
+# 4. Rather than hard-coding the number of loops to collapse, pass
+#    ``auto_collapse=True`` to :func:`psytran.directives.apply_loop_directive`
+#    to collapse as many loops as is legal, as determined by
+#    :func:`psytran.loop.max_collapse`. Is the output the same? What happens
+#    if the bounds of the inner loop depend on the variable of the outer one?
+#
 # This demo can also be viewed as a `Python script <demo4_collapse.py>`__.
 #
 # .. # pylint: enable=C0114
@@ -7,8 +7,30 @@
 This module imports everything from the public PSyTran namespace.
 """
 
+from importlib import metadata
+
+try:
+    __version__ = metadata.version("psytran")
+except metadata.PackageNotFoundError:
+    __version__ = "unknown"
+
+from psytran.batch import *  # noqa
+from psytran.cache import *  # noqa
 from psytran.clauses import *  # noqa
 from psytran.convert import *  # noqa
+from psytran.cost import *  # noqa
+from psytran.data import *  # noqa
+from psytran.dependency import *  # noqa
 from psytran.directives import *  # noqa
 from psytran.family import *  # noqa
+from psytran.fusion import *  # noqa
+from psytran.index import *  # noqa
+from psytran.interchange import *  # noqa
 from psytran.loop import *  # noqa
+from psytran.parallelise import *  # noqa
+from psytran.profiling import *  # noqa
+from psytran.queues import *  # noqa
+from psytran.report import *  # noqa
+from psytran.synthetic import *  # noqa
+from psytran.tiling import *  # noqa
+from psytran.transfer import *  # noqa
@@ -0,0 +1,670 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+"""
+This module provides a driver for applying a PSyclone transformation script to
+many Fortran source files using a pool of worker processes.
+
+It may also be run from the command line, e.g.,
+
+.. code-block:: bash
+
+    psytran-batch -s trans.py -o outputs -j 64 src/
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import re
+import shlex
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from psyclone.generator import main as psyclone_main
+from psytran.cache import TransformCache, cache_key
+
+__all__ = [
+    "FileResult",
+    "find_sources",
+    "loop_directives",
+    "map_sources",
+    "region_directives",
+    "scan_directives",
+    "summarise_output",
+    "transform_file",
+    "transform_files",
+    "write_report",
+]
+
+# File extensions recognised as Fortran source
+_fortran_suffixes = (".f90", ".F90", ".f", ".F", ".f95", ".F95")
+
+# Region and loop directives recognised by scan_directives, mapped to the
+# types of the PSyIR nodes which represent them
+region_directives = {
+    "acc kernels": "ACCKernelsDirective",
+    "acc parallel": "ACCParallelDirective",
+    "acc data": "ACCDataDirective",
+    "omp parallel": "OMPParallelDirective",
+    "omp target": "OMPTargetDirective",
+}
+loop_directives = {
+    "acc loop": "ACCLoopDirective",
+    "omp do": "OMPDoDirective",
+    "omp loop": "OMPLoopDirective",
+    "omp parallel do": "OMPParallelDoDirective",
+    "omp teams distribute parallel do": (
+        "OMPTeamsDistributeParallelDoDirective"
+    ),
+    "omp teams loop": "OMPTeamsLoopDirective",
+}
+_do_statement = re.compile(r"^\s*(?:\w+\s*:\s*)?do\b")
+
+
+class FileResult:
+    """
+    Outcome of transforming a single source file.
+
+    :ivar source: path of the input file.
+    :ivar output: path of the output file.
+    :ivar status: ``"ok"`` if the file was transformed, ``"failed"`` if
+        PSyclone or the transformation script raised an error, or
+        ``"crashed"`` if the worker process died.
+    :ivar seconds: the wall-clock time taken.
+    :ivar message: any error message.
+    :ivar cached: ``True`` if the output was served from a
+        :class:`psytran.cache.TransformCache`.
+    :ivar summary: a summary of the transformed output, as computed by
+        :func:`summarise_output`, if the file was transformed.
+    """
+
+    __slots__ = (
+        "source",
+        "output",
+        "status",
+        "seconds",
+        "message",
+        "cached",
+        "summary",
+    )
+
+    def __init__(
+        self,
+        source,
+        output,
+        status,
+        seconds=0.0,
+        message="",
+        cached=False,
+        summary=None,
+    ):
+        """
+        :arg source: path of the input file.
+        :type source: :py:class:`str`
+        :arg output: path of the output file.
+        :type output: :py:class:`str`
+        :arg status: the outcome.
+        :type status: :py:class:`str`
+        :kwarg seconds: the wall-clock time taken.
+        :type seconds: :py:class:`float`
+        :kwarg message: any error message.
+        :type message: :py:class:`str`
+        :kwarg cached: whether the output was served from a cache.
+        :type cached: :py:class:`bool`
+        :kwarg summary: a summary of the transformed output.
+        :type summary: :py:class:`dict`
+        """
+        self.source = source
+        self.output = output
+        self.status = status
+        self.seconds = seconds
+        self.message = message
+        self.cached = cached
+        self.summary = summary
+
+    @property
+    def ok(self):
+        """
+        :returns: ``True`` if the file was transformed, else ``False``.
+        :rtype: :py:class:`bool`
+        """
+        return self.status == "ok"
+
+    def as_dict(self):
+        """
+        :returns: the result as a dictionary, e.g., for JSON output.
+        :rtype: :py:class:`dict`
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return (
+            f"FileResult(source={self.source!r}, status={self.status!r},"
+            f" seconds={self.seconds:.3f}, cached={self.cached})"
+        )
+
+
+def find_sources(paths, suffixes=_fortran_suffixes):
+    """
+    Find the Fortran source files among a list of files and directories,
+    searching directories recursively.
+
+    :arg paths: the files and directories to search.
+    :type paths: :py:class:`list` of :py:class:`str`
+    :kwarg suffixes: file extensions to accept.
+    :type suffixes: :py:class:`tuple` of :py:class:`str`
+
+    :returns: pairs of the path of each source file and its path relative to
+        the directory it was found in, sorted by path. Files given directly
+        are relative to their own directory.
+    :rtype: :py:class:`list` of :py:class:`tuple`
+
+    :raises FileNotFoundError: if a path does not exist.
+    :raises ValueError: if two different source files have the same relative
+        path, since their outputs would overwrite each other.
+    """
+    sources = []
+    for path in paths:
+        if os.path.isfile(path):
+            sources.append((path, os.path.basename(path)))
+        elif os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith(suffixes):
+                        source = os.path.join(root, name)
+                        sources.append((source, os.path.relpath(source, path)))
+        else:
+            raise FileNotFoundError(f"No such file or directory: '{path}'.")
+    found = {}
+    for source, relative in sources:
+        other = found.setdefault(relative, source)
+        if os.path.realpath(other) != os.path.realpath(source):
+            raise ValueError(
+                f"Sources '{other}' and '{source}' would both be written to"
+                f" '{relative}'."
+            )
+    return sorted((source, relative) for relative, source in found.items())
+
+
+def summarise_output(output):
+    """
+    Summarise the Fortran generated by a transformation, counting the lines
+    and the OpenACC and OpenMP directives by name, e.g., ``"acc kernels"``.
+
+    The summary is stored alongside the output in a
+    :class:`psytran.cache.TransformCache`, so that it is available without
+    re-transforming or re-parsing files which are served from the cache.
+
+    :arg output: the generated Fortran.
+    :type output: :py:class:`str`
+
+    :returns: the summary.
+    :rtype: :py:class:`dict`
+    """
+    lines = output.splitlines()
+    directives = {}
+    continued = False
+    for line in lines:
+        text = line.strip().lower()
+        is_directive = text[:5] in ("!$acc", "!$omp")
+        if is_directive and not continued:
+            words = text[2:].replace("(", " ").split()
+            if len(words) > 1 and words[1] != "end":
+                name = " ".join(words[:2])
+                directives[name] = directives.get(name, 0) + 1
+        continued = is_directive and text.endswith("&")
+    return {"lines": len(lines), "directives": directives}
+
+
+def _directive_name(words, names):
+    """
+    Get the longest directive name among a collection which begins a list of
+    words, provided it is not followed by a further ``loop`` or ``do``.
+    """
+    for length in range(len(words), 1, -1):
+        name = " ".join(words[:length])
+        if name in names:
+            if length < len(words) and words[length] in ("loop", "do"):
+                return None
+            return name
+    return None
+
+
+def scan_directives(lines):
+    """
+    Scan the lines of a free-form Fortran source file for the OpenACC and
+    OpenMP directives in :data:`region_directives` and
+    :data:`loop_directives`, joining any continuation lines.
+
+    The Fortran frontend of PSyclone does not represent directives in the
+    source, so this allows them to be recovered, e.g., from the outputs of a
+    porting run.
+
+    :arg lines: the lines of the file.
+    :type lines: :py:class:`list` of :py:class:`str`
+
+    :returns: the region directives, as (name, first line, last line, text)
+        tuples, and a mapping from the line number of each ``DO`` statement
+        preceded by a ``loop`` directive to the name and text of the
+        directive.
+    :rtype: :py:class:`tuple` of :py:class:`list` and :py:class:`dict`
+    """
+    regions, open_regions, loops = [], [], {}
+    pending = None
+    directive = ""
+    for number, line in enumerate(lines, start=1):
+        text = line.strip().lower()
+        if text[:5] in ("!$acc", "!$omp"):
+            sentinel, body = text[2:5], text[5:].lstrip("&").strip()
+            directive += " " + body.rstrip("&")
+            if body.endswith("&"):
+                continue
+            words = f"{sentinel} {directive}".split()
+            directive = ""
+            if words[1:2] == ["end"]:
+                name = _directive_name(
+                    words[:1] + words[2:], region_directives
+                )
+                for i in range(len(open_regions) - 1, -1, -1):
+                    if open_regions[i][0] == name:
+                        _, first, opening = open_regions.pop(i)
+                        regions.append((name, first, number, opening))
+                        break
+            elif _directive_name(words, loop_directives):
+                pending = (
+                    _directive_name(words, loop_directives),
+                    " ".join(words),
+                )
+            elif _directive_name(words, region_directives):
+                name = _directive_name(words, region_directives)
+                open_regions.append((name, number, " ".join(words)))
+        elif text and not text.startswith("!"):
+            if pending is not None and _do_statement.match(text):
+                loops[number] = pending
+            pending = None
+    regions.extend(
+        (name, first, len(lines), text) for name, first, text in open_regions
+    )
+    return regions, loops
+
+
+def map_sources(function, paths, jobs=None):
+    """
+    Apply a function to each of the Fortran source files among a list of files
+    and directories, in a pool of worker processes, and combine the results.
+
+    The function is given the path of a file and should return a list of
+    records for the file, together with an error message if it failed, or
+    ``None`` otherwise, rather than raising. It must be defined at module
+    level, so that it can be sent to the worker processes.
+
+    :arg function: the function to apply.
+    :type function: :py:class:`function`
+    :arg paths: the files and directories to search.
+    :type paths: :py:class:`list` of :py:class:`str`
+    :kwarg jobs: the number of worker processes. Defaults to the number of
+        CPUs. If ``1``, files are processed in the current process.
+    :type jobs: :py:class:`int`
+
+    :returns: the records of all files, in order of path, and the error
+        message of each file which failed, keyed by path.
+    :rtype: :py:class:`tuple` of :py:class:`list` and :py:class:`dict`
+    """
+    sources = [source for source, _ in find_sources(paths)]
+    records, errors = [], {}
+
+    def collect(results):
+        for source, (file_records, error) in zip(sources, results):
+            records.extend(file_records)
+            if error is not None:
+                errors[source] = error
+
+    if jobs == 1:
+        collect(map(function, sources))
+    else:
+        workers = jobs or os.cpu_count() or 1
+        chunksize = max(1, len(sources) // (8 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            collect(executor.map(function, sources, chunksize=chunksize))
+    return records, errors
+
+
+def _forget_script(script):
+    """
+    Remove a previously imported transformation script from the module cache,
+    since PSyclone imports scripts by name and would otherwise reuse a stale
+    script, or a different script with the same name, in later runs within
+    the same process.
+    """
+    name = os.path.splitext(os.path.basename(script))[0]
+    module = sys.modules.get(name)
+    filename = getattr(module, "__file__", None) or ""
+    if os.path.basename(filename) == os.path.basename(script):
+        del sys.modules[name]
+
+
+def transform_file(source, output, script, psyclone_args=(), cache_dir=None):
+    """
+    Apply a transformation script to a single source file with PSyclone,
+    capturing any failure rather than raising it.
+
+    If a cache directory is given then the output is served from the cache
+    when neither the source, the script nor the PSyclone setup has changed
+    since an earlier successful run, together with the summary computed by
+    :func:`summarise_output` when the file was transformed. Failures are
+    never cached.
+
+    :arg source: path of the input file.
+    :type source: :py:class:`str`
+    :arg output: path of the output file.
+    :type output: :py:class:`str`
+    :arg script: path of the transformation script.
+    :type script: :py:class:`str`
+    :kwarg psyclone_args: additional command line arguments for PSyclone.
+    :type psyclone_args: :py:class:`tuple` of :py:class:`str`
+    :kwarg cache_dir: the directory of a :class:`TransformCache` to use.
+    :type cache_dir: :py:class:`str`
+
+    :returns: the outcome.
+    :rtype: :py:class:`FileResult`
+    """
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    if cache_dir is not None:
+        cache = TransformCache(cache_dir)
+        key = cache_key(source, script, psyclone_args)
+        entry = cache.get(key)
+        if entry is not None:
+            with open(output, "w", encoding="utf-8") as output_file:
+                output_file.write(entry[0])
+            seconds = time.perf_counter() - start
+            return FileResult(
+                source, output, "ok", seconds, cached=True, summary=entry[1]
+            )
+    arguments = ["-s", script, "-o", output, *psyclone_args, source]
+    stderr = io.StringIO()
+    status, message = "ok", ""
+    _forget_script(script)
+    try:
+        with contextlib.redirect_stderr(stderr):
+            psyclone_main(arguments)
+    except SystemExit as error:
+        if error.code not in (None, 0):
+            status, message = "failed", stderr.getvalue().strip()
+    except Exception as error:  # pylint: disable=broad-except
+        status, message = "failed", f"{type(error).__name__}: {error}"
+    summary = None
+    if status == "ok":
+        with open(output, encoding="utf-8") as output_file:
+            text = output_file.read()
+        summary = summarise_output(text)
+        if cache_dir is not None:
+            cache.put(key, text, summary)
+    seconds = time.perf_counter() - start
+    return FileResult(
+        source, output, status, seconds, message, summary=summary
+    )
+
+
+def _transform_job(job):
+    """
+    Entry point for worker processes, unpacking the arguments of
+    :func:`transform_file`.
+    """
+    return transform_file(*job)
+
+
+def _pooled_transform_jobs(job_list, indices, jobs, results):
+    """
+    Run jobs of :func:`transform_files` in a pool of worker processes, keeping
+    no more jobs in flight than there are workers, so that if a worker process
+    dies then only the jobs in flight at the time are suspected of killing it.
+
+    :arg job_list: the arguments of :func:`transform_file` for each job.
+    :type job_list: :py:class:`list` of :py:class:`tuple`
+    :arg indices: the indices of the jobs to run.
+    :type indices: :py:class:`list` of :py:class:`int`
+    :arg jobs: the number of worker processes.
+    :type jobs: :py:class:`int`
+    :arg results: the outcome of each job, which is filled in as jobs finish.
+    :type results: :py:class:`list` of :py:class:`FileResult`
+
+    :returns: the indices of the jobs in flight when the pool broke, if it
+        did.
+    :rtype: :py:class:`list` of :py:class:`int`
+    """
+    queue = iter(indices)
+    running = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        while True:
+            for index in itertools.islice(queue, jobs - len(running)):
+                future = executor.submit(_transform_job, job_list[index])
+                running[future] = index
+            if not running:
+                return []
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            suspects = []
+            for future in done:
+                index = running.pop(future)
+                try:
+                    results[index] = future.result()
+                except BrokenProcessPool:
+                    suspects.append(index)
+            if suspects:
+                return suspects + list(running.values())
+
+
+def _isolated_transform_jobs(job_list):
+    """
+    Run jobs of :func:`transform_files` concurrently, each in its own worker
+    process, so that a crash of a process is attributed to its job alone.
+
+    :arg job_list: the arguments of :func:`transform_file` for each job.
+    :type job_list: :py:class:`list` of :py:class:`tuple`
+
+    :returns: the outcome of each job.
+    :rtype: :py:class:`list` of :py:class:`FileResult`
+    """
+    executors = [ProcessPoolExecutor(max_workers=1) for _ in job_list]
+    try:
+        futures = [
+            executor.submit(_transform_job, job)
+            for executor, job in zip(executors, job_list)
+        ]
+        results = []
+        for job, future in zip(job_list, futures):
+            try:
+                results.append(future.result())
+            except BrokenProcessPool as error:
+                message = str(error) or "worker process terminated"
+                results.append(
+                    FileResult(job[0], job[1], "crashed", 0.0, message)
+                )
+    finally:
+        for executor in executors:
+            executor.shutdown()
+    return results
+
+
+def transform_files(
+    paths,
+    script,
+    output_dir,
+    jobs=None,
+    psyclone_args=(),
+    report=None,
+    cache=None,
+):
+    """
+    Apply a transformation script to all Fortran source files in a list of
+    files and directories, using a pool of worker processes.
+
+    Output files are written beneath ``output_dir``, mirroring the layout of
+    the input directories. Each file is processed independently, so that a
+    failure in one does not affect the others. If a worker process dies, the
+    files left unfinished by the broken pool are resubmitted to a fresh pool.
+    Files which were in flight when two pools broke are then retried in a
+    process of their own each, and only a file whose process dies again is
+    reported as ``"crashed"``.
+
+    :arg paths: the files and directories to transform.
+    :type paths: :py:class:`list` of :py:class:`str`
+    :arg script: path of the transformation script.
+    :type script: :py:class:`str`
+    :arg output_dir: the directory to write outputs to.
+    :type output_dir: :py:class:`str`
+    :kwarg jobs: the number of worker processes. Defaults to the number of
+        CPUs. If ``1``, files are processed in the current process.
+    :type jobs: :py:class:`int`
+    :kwarg psyclone_args: additional command line arguments for PSyclone.
+    :type psyclone_args: :py:class:`tuple` of :py:class:`str`
+    :kwarg report: path of a JSON file to write the per-file results to.
+    :type report: :py:class:`str`
+    :kwarg cache: a cache of earlier results. Its least recently used entries
+        are evicted at the end of the run if it has grown too large.
+    :type cache: :py:class:`TransformCache`
+
+    :returns: the outcome for each file, in order of source path.
+    :rtype: :py:class:`list` of :py:class:`FileResult`
+
+    :raises FileNotFoundError: if the script does not exist.
+    """
+    if not os.path.isfile(script):
+        raise FileNotFoundError(f"No such transformation script: '{script}'.")
+    script = os.path.abspath(script)
+    cache_dir = None if cache is None else cache.directory
+    job_list = [
+        (
+            source,
+            os.path.join(output_dir, relative),
+            script,
+            tuple(psyclone_args),
+            cache_dir,
+        )
+        for source, relative in find_sources(paths)
+    ]
+    if jobs == 1:
+        results = [_transform_job(job) for job in job_list]
+    else:
+        jobs = jobs or os.cpu_count() or 1
+        results = [None] * len(job_list)
+        breaks = [0] * len(job_list)
+        pending = list(range(len(job_list)))
+        while pending:
+            for index in _pooled_transform_jobs(
+                job_list, pending, jobs, results
+            ):
+                breaks[index] += 1
+            pending = [
+                index
+                for index in pending
+                if results[index] is None and breaks[index] < 2
+            ]
+
+        # Only jobs in flight when two pools broke are left unfinished
+        suspects = [i for i, result in enumerate(results) if result is None]
+        isolated = _isolated_transform_jobs([job_list[i] for i in suspects])
+        for index, result in zip(suspects, isolated):
+            results[index] = result
+    if cache is not None:
+        cache.evict()
+    if report is not None:
+        write_report(results, report)
+    return results
+
+
+def write_report(results, filename):
+    """
+    Write the per-file results of :func:`transform_files` to a JSON file.
+
+    :arg results: the results.
+    :type results: :py:class:`list` of :py:class:`FileResult`
+    :arg filename: path of the JSON file.
+    :type filename: :py:class:`str`
+    """
+    summary = {
+        "files": len(results),
+        "ok": sum(result.ok for result in results),
+        "cached": sum(result.cached for result in results),
+        "seconds": sum(result.seconds for result in results),
+        "results": [result.as_dict() for result in results],
+    }
+    with open(filename, "w", encoding="utf-8") as report_file:
+        json.dump(summary, report_file, indent=2)
+
+
+def main(arguments=None):
+    """
+    Command line interface for :func:`transform_files`.
+
+    :kwarg arguments: the command line arguments. Defaults to ``sys.argv``.
+    :type arguments: :py:class:`list` of :py:class:`str`
+
+    :returns: the exit code, which is non-zero if any file failed.
+    :rtype: :py:class:`int`
+    """
+    parser = argparse.ArgumentParser(
+        prog="psytran-batch",
+        description="Apply a PSyclone transformation script to many files.",
+    )
+    parser.add_argument("paths", nargs="+", help="files or directories")
+    parser.add_argument(
+        "-s", "--script", required=True, help="PSyclone script"
+    )
+    parser.add_argument(
+        "-o", "--output-dir", required=True, help="output directory"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="number of workers"
+    )
+    parser.add_argument(
+        "-r", "--report", default=None, help="JSON report file"
+    )
+    parser.add_argument(
+        "--psyclone-args",
+        default="",
+        help="additional PSyclone arguments, as a single string",
+    )
+    parser.add_argument(
+        "--cache-dir", default=None, help="directory of a transformation cache"
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=1024,
+        help="maximum size of the transformation cache, in MiB",
+    )
+    args = parser.parse_args(arguments)
+    cache = None
+    if args.cache_dir is not None:
+        cache = TransformCache(args.cache_dir, args.cache_size * 2**20)
+    results = transform_files(
+        args.paths,
+        args.script,
+        args.output_dir,
+        jobs=args.jobs,
+        psyclone_args=shlex.split(args.psyclone_args),
+        report=args.report or os.path.join(args.output_dir, "report.json"),
+        cache=cache,
+    )
+    for result in results:
+        if not result.ok:
+            print(
+                f"{result.status}: {result.source}\n{result.message}",
+                file=sys.stderr,
+            )
+    ok = sum(result.ok for result in results)
+    cached = sum(result.cached for result in results)
+    print(f"Transformed {ok}/{len(results)} files ({cached} from cache).")
+    return int(ok != len(results))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+"""
+This module provides a content-addressed on-disk cache of the results of
+applying a transformation script to a Fortran source file, so that unchanged
+files need not be re-parsed and re-transformed between builds.
+
+Entries are keyed on a hash of everything which determines the result: the
+source, the transformation script and any modules it imports from alongside
+it, the PSyclone command line arguments, the PSyclone version and
+configuration file, and the PSyTran version. Each entry is written to a
+temporary file and atomically renamed into place, so that several processes
+may share a cache directory without readers ever seeing a partially written
+entry.
+"""
+
+import ast
+import hashlib
+import json
+import os
+import tempfile
+import time
+from psyclone.configuration import Config
+from psyclone.version import __VERSION__ as psyclone_version
+import psytran
+
+__all__ = ["TransformCache", "cache_key"]
+
+# Bump to invalidate all existing entries if the entry format changes
+_format_version = 2
+
+# Age in seconds after which a temporary file is assumed to have been left
+# behind by an interrupted write, rather than belonging to a write in progress
+_stale_seconds = 3600
+
+
+def _config_file(psyclone_args):
+    """
+    Get the PSyclone configuration file which applies to a run.
+
+    :arg psyclone_args: the PSyclone command line arguments.
+    :type psyclone_args: :py:class:`tuple` of :py:class:`str`
+
+    :returns: the path of the configuration file.
+    :rtype: :py:class:`str`
+    """
+    psyclone_args = list(psyclone_args)
+    for i, arg in enumerate(psyclone_args):
+        if arg == "--config" and i + 1 < len(psyclone_args):
+            return psyclone_args[i + 1]
+        if arg.startswith("--config="):
+            return arg.split("=", 1)[1]
+    return Config.get().filename
+
+
+def _read_bytes(filename):
+    """
+    :returns: the contents of a file, or nothing if it cannot be read.
+    :rtype: :py:class:`bytes`
+    """
+    try:
+        with open(filename, "rb") as binary_file:
+            return binary_file.read()
+    except (OSError, TypeError):
+        return b""
+
+
+def _local_imports(script, directory, found=None):
+    """
+    Find the modules imported by a transformation script, directly or through
+    other such modules, which live in the directory of the script, since
+    PSyclone adds that directory to the module search path.
+
+    :arg script: path of the transformation script, or of a module it imports.
+    :type script: :py:class:`str`
+    :arg directory: the directory of the transformation script.
+    :type directory: :py:class:`str`
+    :kwarg found: the paths of modules found so far.
+    :type found: :py:class:`set` of :py:class:`str`
+
+    :returns: the paths of the modules.
+    :rtype: :py:class:`set` of :py:class:`str`
+    """
+    if found is None:
+        found = set()
+    try:
+        tree = ast.parse(_read_bytes(script))
+    except (SyntaxError, ValueError):
+        return found
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            if node.level == 0:
+                names.append(node.module)
+                names.extend(
+                    f"{node.module}.{alias.name}" for alias in node.names
+                )
+    for name in names:
+        path = os.path.join(directory, *name.split("."))
+        for candidate in (f"{path}.py", os.path.join(path, "__init__.py")):
+            if os.path.isfile(candidate) and candidate not in found:
+                found.add(candidate)
+                _local_imports(candidate, directory, found)
+    return found
+
+
+def cache_key(source, script, psyclone_args=()):
+    """
+    Compute the cache key for applying a transformation script to a source
+    file.
+
+    Modules imported by the script are hashed if they live alongside it, but
+    installed packages are only accounted for through the PSyclone and PSyTran
+    versions. Files which are pulled in by the source, e.g., through
+    ``INCLUDE`` statements or ``USE`` of modules on the include path, are not
+    hashed.
+
+    :arg source: path of the input file.
+    :type source: :py:class:`str`
+    :arg script: path of the transformation script.
+    :type script: :py:class:`str`
+    :kwarg psyclone_args: additional command line arguments for PSyclone.
+    :type psyclone_args: :py:class:`tuple` of :py:class:`str`
+
+    :returns: the hexadecimal digest.
+    :rtype: :py:class:`str`
+    """
+    digest = hashlib.sha256()
+    parts = [
+        str(_format_version).encode(),
+        psytran.__version__.encode(),
+        psyclone_version.encode(),
+        _read_bytes(_config_file(psyclone_args)),
+        "\0".join(psyclone_args).encode(),
+        _read_bytes(script),
+        _read_bytes(source),
+    ]
+    directory = os.path.dirname(os.path.abspath(script))
+    for module in sorted(_local_imports(script, directory)):
+        parts.append(os.path.relpath(module, directory).encode())
+        parts.append(_read_bytes(module))
+    for part in parts:
+        # Prefix each part with its length so that the boundaries are unique
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class TransformCache:
+    """
+    Size-bounded on-disk cache of transformed Fortran sources.
+
+    Each entry holds the generated Fortran and a JSON-serialisable summary of
+    the transformation. Storing an entry does not check the size of the cache,
+    since that requires scanning the whole directory; instead, :meth:`evict`
+    removes the least recently used entries, as determined by their
+    modification times, which are updated on every hit. The batch driver in
+    :py:mod:`psytran.batch` calls it once at the end of each run.
+
+    Opening a cache does not scan it either, so that each worker process may
+    open it cheaply. Temporary files left behind by interrupted writes are
+    removed by :meth:`evict`, once they are old enough not to belong to a
+    write in progress, and by :meth:`clear`.
+    """
+
+    def __init__(self, directory, max_bytes=2**30):
+        """
+        :arg directory: the directory holding the cache, which is created if
+            it does not exist.
+        :type directory: :py:class:`str`
+        :kwarg max_bytes: the maximum total size of the entries, or ``None``
+            for no limit.
+        :type max_bytes: :py:class:`int`
+
+        :raises ValueError: if the maximum size is negative.
+        """
+        if max_bytes is not None and max_bytes < 0:
+            raise ValueError(f"Expected a non-negative size, not {max_bytes}.")
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        """
+        :returns: the path of the entry with a given key.
+        :rtype: :py:class:`str`
+        """
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _entries(self):
+        """
+        :returns: the path, size and modification time of each entry.
+        :rtype: :py:class:`list` of :py:class:`tuple`
+        """
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # Evicted by another process
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _remove_temporaries(self, max_age):
+        """
+        Remove temporary files left behind by interrupted writes.
+
+        :arg max_age: the age in seconds above which to remove them.
+        :type max_age: :py:class:`float`
+
+        :returns: the number of files removed.
+        :rtype: :py:class:`int`
+        """
+        now = time.time()
+        removed = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    if now - os.stat(path).st_mtime >= max_age:
+                        os.unlink(path)
+                        removed += 1
+                except FileNotFoundError:
+                    # Renamed into place or removed by another process
+                    continue
+        return removed
+
+    def get(self, key):
+        """
+        Look up an entry.
+
+        :arg key: the key, as computed by :func:`cache_key`.
+        :type key: :py:class:`str`
+
+        :returns: the generated Fortran and the summary, or ``None`` if there
+            is no entry.
+        :rtype: :py:class:`tuple` or :py:class:`NoneType`
+        """
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as entry_file:
+                entry = json.load(entry_file)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["output"], entry["summary"]
+
+    def put(self, key, output, summary=None):
+        """
+        Store an entry.
+
+        If several processes store the same key concurrently, each writes a
+        complete entry and the last to finish is kept.
+
+        :arg key: the key, as computed by :func:`cache_key`.
+        :type key: :py:class:`str`
+        :arg output: the generated Fortran.
+        :type output: :py:class:`str`
+        :kwarg summary: a JSON-serialisable summary of the transformation.
+        :type summary: :py:class:`dict`
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(
+            dir=os.path.dirname(path), suffix=".tmp"
+        )
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as entry_file:
+                json.dump({"output": output, "summary": summary}, entry_file)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def evict(self, max_bytes=None):
+        """
+        Evict the least recently used entries until the total size of the
+        entries is within a limit, and remove stale temporary files.
+
+        :kwarg max_bytes: the limit. Defaults to the maximum size of the cache.
+        :type max_bytes: :py:class:`int`
+
+        :returns: the number of entries evicted.
+        :rtype: :py:class:`int`
+        """
+        self._remove_temporaries(_stale_seconds)
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        if max_bytes is None:
+            return 0
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if total <= max_bytes:
+                break
+            try:
+                os.unlink(path)
+                evicted += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        return evicted
+
+    def size(self):
+        """
+        :returns: the total size of the entries, in bytes.
+        :rtype: :py:class:`int`
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def __len__(self):
+        return len(self._entries())
+
+    def clear(self):
+        """
+        Remove all entries, as well as any temporary files.
+        """
+        self.evict(max_bytes=0)
+        self._remove_temporaries(0)
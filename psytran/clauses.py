@@ -9,11 +9,13 @@ OpenACC clauses associated with them, as well as for applying such clauses.
 """
 
 from psytran.directives import (
+    get_directive_map,
     has_loop_directive,
     _check_directive,
 )
 from psytran.family import get_ancestors
 from psytran.loop import _check_loop
+from psytran.profiling import profiled
 
 __all__ = [
     "has_seq_clause",
@@ -37,6 +39,7 @@ def _prepare_loop_for_clause(loop, directive):
     _check_directive(directive)
 
 
+@profiled
 def has_seq_clause(loop):
     """
     Determine whether a loop has a ``seq`` clause.
@@ -47,9 +50,13 @@ def has_seq_clause(loop):
     :returns: ``True`` if the Loop has a ``seq`` clause, else ``False``.
     :rtype: :py:class:`bool`
     """
+    directive_map = get_directive_map(loop)
+    if directive_map is not None:
+        return directive_map[loop].sequential
     return has_loop_directive(loop) and loop.parent.parent.sequential
 
 
+@profiled
 def has_gang_clause(loop):
     """
     Determine whether a loop has a ``gang`` clause.
@@ -60,9 +67,13 @@ def has_gang_clause(loop):
     :returns: ``True`` if the Loop has a ``gang`` clause, else ``False``.
     :rtype: :py:class:`bool`
     """
+    directive_map = get_directive_map(loop)
+    if directive_map is not None:
+        return directive_map[loop].gang
     return has_loop_directive(loop) and loop.parent.parent.gang
 
 
+@profiled
 def has_vector_clause(loop):
     """
     Determine whether a loop has a ``vector`` clause.
@@ -73,9 +84,13 @@ def has_vector_clause(loop):
     :returns: ``True`` if the Loop has a ``vector`` clause, else ``False``.
     :rtype: :py:class:`bool`
     """
+    directive_map = get_directive_map(loop)
+    if directive_map is not None:
+        return directive_map[loop].vector
     return has_loop_directive(loop) and loop.parent.parent.vector
 
 
+@profiled
 def has_collapse_clause(loop):
     """
     Determine whether a loop lies within a collapsed loop nest.
@@ -87,6 +102,9 @@ def has_collapse_clause(loop):
     :rtype: :py:class:`bool`
     """
     _check_loop(loop)
+    directive_map = get_directive_map(loop)
+    if directive_map is not None:
+        return directive_map[loop].collapsed
     ancestors = get_ancestors(loop, inclusive=True)
     for i, current in enumerate(ancestors):
         if has_loop_directive(current):
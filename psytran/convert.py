@@ -8,31 +8,78 @@ This module provides functions for converting the array notation used in a
 :py:class:`Schedule`.
 """
 
+from collections import namedtuple
+from collections.abc import Iterable
 from psyclone.psyir import nodes
 from psyclone.psyir import transformations as trans
 from psyclone.psyir import symbols
 from psyclone.transformations import TransformationError
-from psytran.family import has_ancestor
+from psytran.profiling import profiled
 
-__all__ = ["convert_array_notation"]
+__all__ = ["ConversionCounts", "convert_array_notation"]
 
+ConversionCounts = namedtuple("ConversionCounts", ["converted", "skipped"])
 
+
+def _array_references(root):
+    """
+    Find the References to whole arrays beneath a Node, in a single traversal
+    which does not enter Calls or the indices of other References.
+
+    :arg root: the Node to search beneath.
+    :type root: :py:class:`Node`
+
+    :returns: the References found, in the order they appear.
+    :rtype: :py:class:`list`
+    """
+    references = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, nodes.Call):
+            continue
+        if isinstance(node, nodes.Reference):
+            symbol = node.symbol
+            if (
+                type(node) is nodes.Reference  # pylint: disable=C0123
+                and isinstance(symbol, symbols.DataSymbol)
+                and symbol.is_array
+            ):
+                references.append(node)
+            continue
+        stack.extend(reversed(node.children))
+    return references
+
+
+@profiled
 def convert_array_notation(schedule):
     """
-    Convert implicit array range assignments into explicit ones.
+    Convert implied array range assignments into explicit ones.
 
     Wrapper for the :meth:`apply` method of :class:`Reference2ArrayRangeTrans`.
-    If this fails due to a :class:`TransformationError` then the conversion is
-    skipped.
+    References within Calls are left unchanged. If a conversion fails due to a
+    :class:`TransformationError` then it is skipped.
 
-    :arg schedule: the Schedule to transform.
-    :type schedule: :py:class:`Schedule`
+    :arg schedule: the Schedule to transform, or a Node containing several
+        Schedules, such as a Container, or a list of such Nodes.
+    :type schedule: :py:class:`Node` or :py:class:`list`
+
+    :returns: the numbers of References which were converted and skipped.
+    :rtype: :py:class:`ConversionCounts`
     """
-    for reference in schedule.walk(nodes.Reference, stop_type=nodes.Reference):
-        if has_ancestor(reference, nodes.Call):
-            continue
-        if isinstance(reference.symbol, symbols.DataSymbol):
-            try:
-                trans.Reference2ArrayRangeTrans().apply(reference)
-            except TransformationError:  # pragma: no cover
-                pass
+    roots = schedule if isinstance(schedule, Iterable) else [schedule]
+    references = []
+    for root in roots:
+        assert isinstance(
+            root, nodes.Node
+        ), f"Expected a Node, not '{type(root)}'."
+        references.extend(_array_references(root))
+    transformation = trans.Reference2ArrayRangeTrans()
+    converted = 0
+    for reference in references:
+        try:
+            transformation.apply(reference)
+            converted += 1
+        except TransformationError:
+            pass
+    return ConversionCounts(converted, len(references) - converted)
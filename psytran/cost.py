@@ -0,0 +1,388 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+r"""
+This module provides a static cost model for :py:class:`Loop`\s, for
+prioritising which Loop nests to offload.
+
+The work done by a Loop is estimated as its trip count multiplied by the
+number of operations in its body, where the work of each inner Loop is
+included. Trip counts are evaluated from literal bounds and from bounds given
+in terms of ``PARAMETER``\s; otherwise a symbolic expression for the trip
+count is recorded and a default trip count is assumed. Operations are counted
+as assignments, unary and binary operations and calls, with both branches of
+any ``IF`` block included, so the estimate is an upper bound on the work of
+each iteration.
+"""
+
+from psyclone.psyir import nodes
+from psyclone.psyir.symbols import DataSymbol
+from psytran.loop import LoopAnalysis, _enclosing_loops
+from psytran.profiling import profiled
+
+__all__ = [
+    "LoopCost",
+    "CostAnalysis",
+    "estimate_trip_count",
+    "estimate_costs",
+    "estimate_cost",
+    "rank_nests",
+    "is_worth_offloading",
+    "default_launch_overhead",
+]
+
+# Node types which are counted as operations
+_operation_types = (nodes.Assignment, nodes.Operation, nodes.Call)
+
+# Integer arithmetic supported when evaluating Loop bounds
+_binary_operators = {
+    nodes.BinaryOperation.Operator.ADD: lambda a, b: a + b,
+    nodes.BinaryOperation.Operator.SUB: lambda a, b: a - b,
+    nodes.BinaryOperation.Operator.MUL: lambda a, b: a * b,
+    nodes.BinaryOperation.Operator.DIV: lambda a, b: (
+        abs(a) // abs(b) * (1 if a * b >= 0 else -1) if b else None
+    ),
+    nodes.BinaryOperation.Operator.POW: lambda a, b: (
+        a**b if b >= 0 else None
+    ),
+}
+
+# Default work, in operations, below which offloading a Loop nest is assumed
+# not to pay for the overhead of launching a kernel
+default_launch_overhead = 10000
+
+
+def _evaluate(expr, depth=0):
+    r"""
+    Evaluate an integer expression built from literals, ``PARAMETER``\s and
+    integer arithmetic.
+
+    :arg expr: the expression to evaluate.
+    :type expr: :py:class:`Node`
+    :kwarg depth: the number of ``PARAMETER`` definitions followed so far.
+    :type depth: :py:class:`int`
+
+    :returns: the value, or ``None`` if it cannot be determined statically.
+    :rtype: :py:class:`int` or :py:class:`NoneType`
+    """
+    if depth > 32:
+        return None
+    if isinstance(expr, nodes.Literal):
+        try:
+            return int(expr.value)
+        except ValueError:
+            return None
+    if type(expr) is nodes.Reference:  # pylint: disable=C0123
+        symbol = expr.symbol
+        if (
+            isinstance(symbol, DataSymbol)
+            and symbol.is_constant
+            and symbol.initial_value is not None
+        ):
+            return _evaluate(symbol.initial_value, depth + 1)
+        return None
+    if isinstance(expr, nodes.UnaryOperation):
+        value = _evaluate(expr.children[0], depth)
+        if value is None:
+            return None
+        if expr.operator == nodes.UnaryOperation.Operator.MINUS:
+            return -value
+        if expr.operator == nodes.UnaryOperation.Operator.PLUS:
+            return value
+        return None
+    if isinstance(expr, nodes.BinaryOperation):
+        operator = _binary_operators.get(expr.operator)
+        if operator is None:
+            return None
+        values = [_evaluate(child, depth) for child in expr.children]
+        if None in values:
+            return None
+        return operator(*values)
+    return None
+
+
+@profiled
+def estimate_trip_count(loop):
+    """
+    Estimate the number of iterations of a Loop from its bounds.
+
+    :arg loop: the Loop to query.
+    :type loop: :py:class:`Loop`
+
+    :returns: the trip count, or ``None`` if it cannot be determined
+        statically, together with an expression for it in terms of the Loop
+        bounds.
+    :rtype: :py:class:`tuple` of :py:class:`int` and :py:class:`str`
+
+    :raises TypeError: if the loop argument is not a Loop Node.
+    """
+    if not isinstance(loop, nodes.Loop):
+        raise TypeError(f"Expected a Loop, not '{type(loop)}'.")
+    bounds = (loop.start_expr, loop.stop_expr, loop.step_expr)
+    start, stop, step = (_evaluate(bound) for bound in bounds)
+    if None not in (start, stop, step) and step != 0:
+        count = max((stop - start) // step + 1, 0)
+        return count, str(count)
+
+    # Bracket any compound bounds in the expression
+    start_str, stop_str, step_str = (
+        str(value) if value is not None else bound.debug_string()
+        for value, bound in zip((start, stop, step), bounds)
+    )
+    start_str, step_str = (
+        f"({text})" if " " in text or text.startswith("-") else text
+        for text in (start_str, step_str)
+    )
+    if step != 1:
+        return None, f"({stop_str} - {start_str}) / {step_str} + 1"
+    if start == 1:
+        return None, stop_str
+    return None, f"{stop_str} - {start_str} + 1"
+
+
+class LoopCost:
+    """
+    Record of the estimated cost of a single Loop, as computed by
+    :func:`estimate_costs`.
+
+    :ivar loop: the Loop Node.
+    :ivar depth: the number of Loops enclosing the Loop.
+    :ivar nest: the number of the Loop nest containing the Loop, counting
+        outer-most Loops in order of appearance.
+    :ivar nest_depth: the number of levels of Loops in the nest beneath the
+        Loop (inclusive).
+    :ivar trip_count: the number of iterations, or ``None`` if it cannot be
+        determined statically.
+    :ivar trip_expression: an expression for the number of iterations.
+    :ivar operations: the number of operations in the Loop body, excluding
+        those of inner Loops.
+    :ivar work: the estimated number of operations performed by the Loop,
+        including those of inner Loops.
+    :ivar exact: ``True`` if the trip counts of the Loop and of all of its
+        inner Loops are known.
+    """
+
+    __slots__ = (
+        "loop",
+        "depth",
+        "nest",
+        "nest_depth",
+        "trip_count",
+        "trip_expression",
+        "operations",
+        "work",
+        "exact",
+    )
+
+    def __init__(self, loop, depth, nest):
+        """
+        :arg loop: the Loop Node.
+        :type loop: :py:class:`Loop`
+        :arg depth: the number of Loops enclosing the Loop.
+        :type depth: :py:class:`int`
+        :arg nest: the number of the Loop nest containing the Loop.
+        :type nest: :py:class:`int`
+        """
+        self.loop = loop
+        self.depth = depth
+        self.nest = nest
+        self.nest_depth = 1
+        self.trip_count, self.trip_expression = estimate_trip_count(loop)
+        self.operations = 0
+        self.work = 0
+        self.exact = self.trip_count is not None
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{name}={getattr(self, name)!r}"
+            for name in self.__slots__
+            if name != "loop"
+        )
+        return f"LoopCost(loop={self.loop.variable.name!r}, {fields})"
+
+
+class CostAnalysis(LoopAnalysis):
+    """
+    Table of :class:`LoopCost` records for all Loops in a Schedule, as
+    returned by :func:`estimate_costs`.
+
+    Records are iterated in the order returned by :meth:`Node.walk` and may be
+    looked up by Loop Node. The table is not updated if the Schedule is
+    subsequently modified.
+    """
+
+    def ranked(self):
+        """
+        :returns: the records for the outer-most Loops, in decreasing order of
+            work.
+        :rtype: :py:class:`list` of :py:class:`LoopCost`
+        """
+        return sorted(
+            (record for record in self if record.depth == 0),
+            key=lambda record: record.work,
+            reverse=True,
+        )
+
+
+def _count_operations(loop, positions):
+    """
+    Count the operations in the body of a Loop, without descending into inner
+    Loops.
+
+    :arg loop: the Loop to query.
+    :type loop: :py:class:`Loop`
+    :arg positions: the positions of all Loops in the Schedule, keyed by
+        identity.
+    :type positions: :py:class:`dict`
+
+    :returns: the number of operations and the positions of the inner Loops
+        which are directly nested in the Loop.
+    :rtype: :py:class:`tuple` of :py:class:`int` and :py:class:`list`
+    """
+    operations, inner = 0, []
+    stack = list(loop.loop_body.children)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, nodes.Loop):
+            inner.append(positions[id(node)])
+            continue
+        if isinstance(node, _operation_types):
+            operations += 1
+        stack.extend(node.children)
+    return operations, inner
+
+
+@profiled
+def estimate_costs(schedule, default_trip_count=100):
+    """
+    Estimate the cost of every Loop in a Schedule in a single pass.
+
+    :arg schedule: the Schedule to analyse.
+    :type schedule: :py:class:`Schedule`
+    :kwarg default_trip_count: the number of iterations assumed for Loops
+        whose trip counts cannot be determined statically.
+    :type default_trip_count: :py:class:`int`
+
+    :returns: the cost table.
+    :rtype: :py:class:`CostAnalysis`
+
+    :raises TypeError: if the default trip count is not an integer.
+    :raises ValueError: if the default trip count is negative.
+    """
+    if not isinstance(default_trip_count, int):
+        raise TypeError(
+            f"Expected an int for default_trip_count, not"
+            f" '{type(default_trip_count)}'."
+        )
+    if default_trip_count < 0:
+        raise ValueError(
+            "Expected a non-negative default_trip_count, not"
+            f" {default_trip_count}."
+        )
+    loops = schedule.walk(nodes.Loop)
+    enclosing = _enclosing_loops(loops, schedule)
+    positions = {id(loop): i for i, loop in enumerate(loops)}
+
+    records, num_nests = [], 0
+    for i, loop in enumerate(loops):
+        outer = enclosing[i]
+        if outer is None:
+            records.append(LoopCost(loop, 0, num_nests))
+            num_nests += 1
+        else:
+            depth, nest = records[outer].depth + 1, records[outer].nest
+            records.append(LoopCost(loop, depth, nest))
+
+    # Inner Loops appear after their enclosing Loops in pre-order
+    for i in range(len(loops) - 1, -1, -1):
+        record = records[i]
+        record.operations, inner = _count_operations(loops[i], positions)
+        per_iteration = record.operations
+        for j in inner:
+            per_iteration += records[j].work
+            record.nest_depth = max(
+                record.nest_depth, records[j].nest_depth + 1
+            )
+            record.exact = record.exact and records[j].exact
+        trip_count = record.trip_count
+        if trip_count is None:
+            trip_count = default_trip_count
+        record.work = trip_count * per_iteration
+    return CostAnalysis(records)
+
+
+@profiled
+def estimate_cost(loop, default_trip_count=100):
+    """
+    Estimate the cost of a single Loop, including its inner Loops.
+
+    :arg loop: the Loop to query.
+    :type loop: :py:class:`Loop`
+    :kwarg default_trip_count: the number of iterations assumed for Loops
+        whose trip counts cannot be determined statically.
+    :type default_trip_count: :py:class:`int`
+
+    :returns: the cost record.
+    :rtype: :py:class:`LoopCost`
+
+    :raises TypeError: if the loop argument is not a Loop Node.
+    """
+    if not isinstance(loop, nodes.Loop):
+        raise TypeError(f"Expected a Loop, not '{type(loop)}'.")
+    costs = estimate_costs(loop, default_trip_count=default_trip_count)
+    record = costs[loop]
+    ancestor = loop.ancestor(nodes.Loop)
+    while ancestor is not None:
+        record.depth += 1
+        ancestor = ancestor.ancestor(nodes.Loop)
+    return record
+
+
+@profiled
+def rank_nests(schedule, default_trip_count=100):
+    """
+    Rank the Loop nests of a Schedule by their estimated work.
+
+    :arg schedule: the Schedule to analyse.
+    :type schedule: :py:class:`Schedule`
+    :kwarg default_trip_count: the number of iterations assumed for Loops
+        whose trip counts cannot be determined statically.
+    :type default_trip_count: :py:class:`int`
+
+    :returns: the cost records of the outer-most Loops, in decreasing order of
+        work.
+    :rtype: :py:class:`list` of :py:class:`LoopCost`
+    """
+    return estimate_costs(
+        schedule, default_trip_count=default_trip_count
+    ).ranked()
+
+
+@profiled
+def is_worth_offloading(
+    loop_or_cost, launch_overhead=default_launch_overhead, assume_large=True
+):
+    """
+    Determine whether the estimated work of a Loop exceeds the overhead of
+    launching a kernel for it.
+
+    :arg loop_or_cost: the Loop to query, or its cost record.
+    :type loop_or_cost: :py:class:`Loop` or :py:class:`LoopCost`
+    :kwarg launch_overhead: the overhead of launching a kernel, in operations.
+    :type launch_overhead: :py:class:`int`
+    :kwarg assume_large: if ``True``, Loop nests whose trip counts are not all
+        known are always deemed worth offloading. Otherwise, their work is
+        estimated using the default trip count.
+    :type assume_large: :py:class:`bool`
+
+    :returns: ``True`` if the Loop is worth offloading, else ``False``.
+    :rtype: :py:class:`bool`
+    """
+    cost = loop_or_cost
+    if not isinstance(cost, LoopCost):
+        cost = estimate_cost(loop_or_cost)
+    if assume_large and not cost.exact:
+        return True
+    return cost.work >= launch_overhead
@@ -0,0 +1,466 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+r"""
+This module provides an analysis of the arrays accessed by OpenACC ``kernels``
+regions and the insertion of enclosing ``data`` regions, so that arrays stay
+resident on the device across consecutive regions rather than being moved
+between host and device around each of them.
+
+The data clause for each array is chosen from where its values are needed:
+
+* ``copyin`` if it is only read on the device;
+* ``copy`` if it is written on the device, its values are defined on entry to
+  the ``data`` region and they are needed after it;
+* ``copyout`` if it is written on the device and its values are only needed
+  after the ``data`` region;
+* ``create`` if it is written on the device and its values are needed neither
+  before nor after the ``data`` region, e.g., a local work array.
+"""
+
+from collections import namedtuple
+from psyclone.core import VariablesAccessInfo
+from psyclone.psyir import nodes
+from psyclone.psyir.nodes import (
+    ACCCopyClause,
+    ACCCopyInClause,
+    ACCCopyOutClause,
+    ACCDataDirective,
+    ACCKernelsDirective,
+    Clause,
+)
+from psyclone.psyir.symbols import ArgumentInterface, DataSymbol
+from psytran.profiling import profiled
+
+__all__ = [
+    "ArrayAccesses",
+    "ACCCreateClause",
+    "DataRegionDirective",
+    "get_array_accesses",
+    "data_clauses",
+    "insert_data_regions",
+]
+
+ArrayAccesses = namedtuple("ArrayAccesses", ["reads", "writes"])
+ArrayAccesses.__doc__ = """
+Names of the arrays read and written beneath a Node.
+
+:ivar reads: the names of the arrays which are read.
+:ivar writes: the names of the arrays which are written.
+"""
+
+# Clauses in the order they are written, with their classes
+_clause_types = {
+    "copyin": ACCCopyInClause,
+    "copyout": ACCCopyOutClause,
+    "copy": ACCCopyClause,
+}
+
+
+class ACCCreateClause(Clause):
+    """
+    OpenACC ``create`` clause. Specifies a list of arrays which are allocated
+    on the device for the duration of the associated region, without being
+    copied to or from the host.
+    """
+
+    _children_valid_format = "Reference"
+    _clause_string = "create"
+
+    @staticmethod
+    def _validate_child(position, child):
+        """
+        Any number of children are allowed, all of type Reference.
+        """
+        return isinstance(child, nodes.Reference)
+
+
+_clause_types["create"] = ACCCreateClause
+
+
+class DataRegionDirective(ACCDataDirective):
+    """
+    OpenACC ``data`` directive whose clauses are chosen by :func:`data_clauses`
+    when it is inserted by :func:`insert_data_regions`.
+
+    Unlike PSyclone's :class:`ACCDataDirective`, the clauses are not
+    regenerated from the accesses beneath the directive whenever the tree
+    changes, since the choice between them depends on the accesses in the rest
+    of the routine.
+    """
+
+    @staticmethod
+    def _validate_child(position, child):
+        """
+        The first child is the Schedule of the region and the remaining
+        children are data clauses.
+        """
+        if position == 0:
+            return isinstance(child, nodes.Schedule)
+        return isinstance(child, Clause)
+
+    def _update_node(self):
+        """
+        Keep the clauses set on insertion.
+        """
+
+
+def _is_array(symbol, node):
+    """
+    Determine whether an access is to an array, either as declared or, if the
+    declaration is not available, as referenced.
+    """
+    if isinstance(symbol, DataSymbol) and symbol.is_array:
+        return True
+    return isinstance(node, nodes.ArrayReference)
+
+
+@profiled
+def get_array_accesses(node):
+    """
+    Get the names of the arrays read and written beneath a Node, as
+    determined by PSyclone's :class:`VariablesAccessInfo`. Scalars and
+    derived type components are not included.
+
+    :arg node: the Node to analyse, e.g., a kernels region.
+    :type node: :py:class:`Node`
+
+    :returns: the names of the arrays read and written.
+    :rtype: :py:class:`ArrayAccesses`
+    """
+    assert isinstance(
+        node, nodes.Node
+    ), f"Expected a Node, not '{type(node)}'."
+    reads, writes = set(), set()
+    var_info = VariablesAccessInfo(node)
+    for sig in var_info.all_signatures:
+        info = var_info[sig]
+        if sig.is_structure or not info.has_data_access():
+            continue
+        access = info.all_accesses[0].node
+        symbol = getattr(access, "symbol", None)
+        if not _is_array(symbol, access):
+            continue
+        if info.is_read():
+            reads.add(sig.var_name)
+        if info.is_written():
+            writes.add(sig.var_name)
+    return ArrayAccesses(frozenset(reads), frozenset(writes))
+
+
+def _device_accesses(node):
+    """
+    Get the arrays read and written within the kernels regions beneath a
+    Node.
+    """
+    reads, writes = set(), set()
+    for region in node.walk(ACCKernelsDirective):
+        accesses = get_array_accesses(region)
+        reads.update(accesses.reads)
+        writes.update(accesses.writes)
+    return reads, writes
+
+
+def _device_nodes(node):
+    """
+    Get the ids of the Nodes within the kernels regions beneath a Node.
+    """
+    return {
+        id(descendent)
+        for region in node.walk(ACCKernelsDirective)
+        for descendent in region.walk(nodes.Node)
+    }
+
+
+def _host_nodes(node, device):
+    """
+    Get the Nodes beneath a Node, inclusive, whose ids are not among those of
+    the Nodes within kernels regions given by :func:`_device_nodes`.
+    """
+    return [
+        descendent
+        for descendent in node.walk(nodes.Node)
+        if id(descendent) not in device
+    ]
+
+
+def _is_barrier(node):
+    """
+    Determine whether a Node on the host prevents a data region from being
+    placed around it, since it may leave the region, may access arrays which
+    are not visible to the analysis, or has its own directives.
+    """
+    if isinstance(node, (nodes.Return, nodes.CodeBlock, nodes.Directive)):
+        return True
+    return isinstance(node, nodes.Call) and not isinstance(
+        node, nodes.IntrinsicCall
+    )
+
+
+def _host_arrays(host_nodes):
+    """
+    Get the names of the References among some Nodes on the host.
+    """
+    return {
+        node.name for node in host_nodes if isinstance(node, nodes.Reference)
+    }
+
+
+def _persists(symbol, routine):
+    """
+    Determine whether the values of an array may be observed outside the
+    routine, i.e., if it is not a local variable of the routine.
+    """
+    local = routine.symbol_table.lookup(
+        symbol.name, scope_limit=routine, otherwise=None
+    )
+    if local is not symbol or not symbol.is_automatic:
+        return True
+    return getattr(symbol, "initial_value", None) is not None
+
+
+def _host_references(span, routine, names):
+    """
+    Get the names of the arrays referenced on the host before and after a
+    span of sibling Nodes within a routine. References within a Loop which
+    encloses the span are counted as both.
+    """
+    inside = {id(node) for child in span for node in child.walk(nodes.Node)}
+    loop = None
+    ancestor = span[0].parent
+    while ancestor is not None and ancestor is not routine:
+        if isinstance(ancestor, (nodes.Loop, nodes.WhileLoop)):
+            loop = ancestor
+        ancestor = ancestor.parent
+    looped = set()
+    if loop is not None:
+        looped = {id(node) for node in loop.walk(nodes.Reference)}
+
+    before, after, seen = set(), set(), False
+    for node in routine.walk(nodes.Node):
+        if id(node) in inside:
+            seen = True
+            continue
+        if not isinstance(node, nodes.Reference) or node.name not in names:
+            continue
+        if id(node) in looped:
+            before.add(node.name)
+            after.add(node.name)
+        else:
+            (after if seen else before).add(node.name)
+    return before, after
+
+
+@profiled
+def data_clauses(span):
+    """
+    Choose the data clause for each array accessed by the kernels regions
+    beneath a span of sibling Nodes, if a ``data`` region were placed around
+    them.
+
+    The choice depends on whether the values of each array are defined on
+    entry to the span, i.e., if it is not a local variable or ``INTENT(OUT)``
+    argument or is referenced before the span, and whether they are needed
+    after it, i.e., if it is not a local variable or is referenced after the
+    span. Any reference within a Loop which encloses the span counts as both.
+
+    :arg span: the adjacent sibling Nodes, in order, within a Routine.
+    :type span: :py:class:`list` of :py:class:`Node`
+
+    :returns: the names of the arrays for each of the clauses ``"copyin"``,
+        ``"copyout"``, ``"copy"`` and ``"create"``, in sorted order.
+    :rtype: :py:class:`dict`
+
+    :raises ValueError: if the span is empty, if its Nodes are not adjacent
+        siblings or if it is not within a Routine.
+    """
+    span = list(span)
+    if not span:
+        raise ValueError("Expected at least one node.")
+    first = span[0]
+    for i, node in enumerate(span):
+        if node.parent is not first.parent or node.position != (
+            first.position + i
+        ):
+            raise ValueError("Expected adjacent sibling nodes.")
+    routine = first.ancestor(nodes.Routine)
+    if routine is None:
+        raise ValueError("Expected nodes within a Routine.")
+
+    reads, writes = set(), set()
+    for node in span:
+        node_reads, node_writes = _device_accesses(node)
+        reads.update(node_reads)
+        writes.update(node_writes)
+    names = reads | writes
+    before, after = _host_references(span, routine, names)
+
+    clauses = {key: [] for key in _clause_types}
+    table = first.scope.symbol_table
+    for name in sorted(names):
+        if name not in writes:
+            clauses["copyin"].append(name)
+            continue
+        symbol = table.lookup(name)
+        persists = _persists(symbol, routine)
+        defined = name in before or (
+            persists
+            and not (
+                symbol.is_argument
+                and symbol.interface.access == ArgumentInterface.Access.WRITE
+            )
+        )
+        needed = name in after or persists
+        if defined and needed:
+            clauses["copy"].append(name)
+        elif defined:
+            clauses["copyin"].append(name)
+        elif needed:
+            clauses["copyout"].append(name)
+        else:
+            clauses["create"].append(name)
+    return clauses
+
+
+def _wrappable(node, host_nodes, host_arrays):
+    """
+    Determine whether a Node containing kernels regions may be placed in a
+    ``data`` region as a whole, given the Nodes beneath it on the host and the
+    arrays they reference, returning the arrays accessed on the device if so,
+    else ``None``.
+    """
+    if any(_is_barrier(host) for host in host_nodes):
+        return None
+    reads, writes = _device_accesses(node)
+    names = reads | writes
+    if names & host_arrays:
+        return None
+    return names
+
+
+def _find_sub_spans(node, device):
+    """
+    Find the spans within the Schedules of the children of a Node.
+    """
+    return [
+        span
+        for child in node.children
+        if isinstance(child, nodes.Schedule)
+        for span in _find_spans(child, device)
+    ]
+
+
+def _find_spans(schedule, device=None):
+    """
+    Find the spans of sibling Nodes within a Schedule, and recursively within
+    the Schedules of its children, around which ``data`` regions may be
+    placed.
+
+    A span starts at a Node containing kernels regions and is extended over
+    subsequent Nodes for as long as those on the host do not access any array
+    accessed on the device within the span.
+
+    :kwarg device: the ids of the Nodes within kernels regions, as given by
+        :func:`_device_nodes`, if they are already known.
+    """
+    if device is None:
+        device = _device_nodes(schedule)
+    spans, span, names = [], None, set()
+    pending, pending_arrays = [], set()
+    for child in schedule.children:
+        if span is None:
+            pending, pending_arrays = [], set()
+        if child.walk(ACCDataDirective):
+            span = None
+            if not isinstance(child, nodes.Directive):
+                spans.extend(_find_sub_spans(child, device))
+            continue
+        kernels = bool(child.walk(ACCKernelsDirective))
+        if not kernels and span is None:
+            continue
+        host_nodes = _host_nodes(child, device)
+        host_arrays = _host_arrays(host_nodes)
+        if not kernels:
+            if any(_is_barrier(host) for host in host_nodes) or (
+                names & host_arrays
+            ):
+                span = None
+            else:
+                pending.append(child)
+                pending_arrays |= host_arrays
+            continue
+
+        arrays = _wrappable(child, host_nodes, host_arrays)
+        if arrays is None:
+            # Place regions within the Node instead
+            span = None
+            spans.extend(_find_sub_spans(child, device))
+            continue
+        if span is not None and not arrays & pending_arrays:
+            span.extend(pending)
+            span.append(child)
+            names |= arrays
+        else:
+            span, names = [child], set(arrays)
+            spans.append(span)
+        pending, pending_arrays = [], set()
+    return spans
+
+
+@profiled
+def insert_data_regions(node):
+    """
+    Insert OpenACC ``data`` regions around the kernels regions beneath a
+    Node, so that arrays remain on the device between the regions.
+
+    Each ``data`` region is placed at the outermost point at which it is safe,
+    i.e., around the largest span of sibling Nodes, including any Loops which
+    contain kernels regions, such that no array accessed on the device within
+    the span is accessed on the host within it. Spans are broken by calls to
+    routines, ``RETURN`` statements, code blocks and other directives. The
+    clauses of each region are chosen by :func:`data_clauses`.
+
+    Kernels regions which are already within a ``data`` region are left
+    unchanged.
+
+    :arg node: the Node to transform, e.g., a Routine.
+    :type node: :py:class:`Node`
+
+    :returns: the ``data`` regions inserted.
+    :rtype: :py:class:`list` of :py:class:`DataRegionDirective`
+    """
+    assert isinstance(
+        node, nodes.Node
+    ), f"Expected a Node, not '{type(node)}'."
+    if node.ancestor(ACCDataDirective, include_self=True) is not None:
+        return []
+    schedules = [node] if isinstance(node, nodes.Schedule) else []
+    if not schedules:
+        schedules = [
+            child
+            for child in node.children
+            if isinstance(child, nodes.Schedule)
+        ]
+    spans = [span for schedule in schedules for span in _find_spans(schedule)]
+
+    # Decide all clauses before modifying the tree
+    clauses = [data_clauses(span) for span in spans]
+    regions = []
+    for span, span_clauses in zip(spans, clauses):
+        table = span[0].scope.symbol_table
+        parent, position = span[0].parent, span[0].position
+        region = DataRegionDirective(
+            children=[child.detach() for child in span]
+        )
+        parent.children.insert(position, region)
+        for key, clause_type in _clause_types.items():
+            if span_clauses[key]:
+                references = [
+                    nodes.Reference(table.lookup(name))
+                    for name in span_clauses[key]
+                ]
+                region.addchild(clause_type(children=references))
+        regions.append(region)
+    return regions
@@ -0,0 +1,194 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+r"""
+This module provides a memoisation layer for PSyclone's dependency analysis of
+:py:class:`Loop`\s, which is used by :func:`psytran.loop.is_parallelisable`.
+"""
+
+import functools
+import weakref
+from collections import OrderedDict, namedtuple
+from psyclone.psyir import nodes
+
+__all__ = [
+    "DependencyCache",
+    "DependencyCacheInfo",
+    "get_dependency_cache",
+]
+
+DependencyCacheInfo = namedtuple(
+    "DependencyCacheInfo",
+    ["hits", "misses", "invalidations", "evictions", "maxsize", "currsize"],
+)
+
+
+def _signature(loop):
+    """
+    Compute a signature of everything which the dependency analysis of a Loop
+    depends on: its code, as well as the identity, name, kind, type and
+    interface of each Symbol that it refers to. The latter may be changed
+    without modifying the tree, e.g., by renaming or re-typing a Symbol, or by
+    pointing a Reference at a different Symbol.
+
+    :arg loop: the Loop to sign.
+    :type loop: :py:class:`Loop`
+
+    :returns: the signature.
+    :rtype: :py:class:`tuple`
+    """
+    symbols = {}
+    for reference in loop.walk(nodes.Reference):
+        symbols[id(reference.symbol)] = reference.symbol
+    return (loop.debug_string(),) + tuple(
+        (
+            key,
+            symbol.name,
+            type(symbol).__name__,
+            str(getattr(symbol, "datatype", None)),
+            str(symbol.interface),
+        )
+        for key, symbol in symbols.items()
+    )
+
+
+class DependencyCache:
+    r"""
+    Bounded cache of the results of :meth:`Loop.independent_iterations`.
+
+    Entries are keyed on the identity of the Loop and on a signature of its
+    code and of the Symbols that it refers to, so any transformation of the
+    Loop, or change to those Symbols, invalidates its entry. Computing the
+    signature walks the Loop, which is much cheaper than the analysis itself.
+    Loops are only referenced weakly, so entries are dropped together with
+    their Loops. When the cache is full, the least recently used entry is
+    evicted.
+    """
+
+    def __init__(self, maxsize=1024):
+        """
+        :kwarg maxsize: the maximum number of entries. A value of zero disables
+            caching.
+        :type maxsize: :py:class:`int`
+        """
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._evictions = 0
+        self.resize(maxsize)
+
+    def resize(self, maxsize):
+        """
+        Set the maximum number of entries, evicting entries if necessary.
+
+        :arg maxsize: the maximum number of entries.
+        :type maxsize: :py:class:`int`
+
+        :raises TypeError: if the maximum size is not an integer.
+        :raises ValueError: if the maximum size is negative.
+        """
+        if not isinstance(maxsize, int):
+            raise TypeError(f"Expected an int, not '{type(maxsize)}'.")
+        if maxsize < 0:
+            raise ValueError(f"Expected a non-negative size, not {maxsize}.")
+        self.maxsize = maxsize
+        self._evict()
+
+    def _evict(self):
+        """
+        Evict least recently used entries until the cache is within its
+        maximum size.
+        """
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def independent_iterations(self, loop):
+        """
+        Determine whether the iterations of a Loop are independent, reusing a
+        previous result if the Loop has not been modified since.
+
+        :arg loop: the Loop to query.
+        :type loop: :py:class:`Loop`
+
+        :returns: ``True`` if the Loop iterations are independent, else
+            ``False``.
+        :rtype: :py:class:`bool`
+
+        :raises TypeError: if the loop argument is not a Loop Node.
+        """
+        if not isinstance(loop, nodes.Loop):
+            raise TypeError(f"Expected a Loop, not '{type(loop)}'.")
+        signature = _signature(loop)
+        key = id(loop)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0]() is loop:
+            if entry[1] == signature:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[2]
+            self._invalidations += 1
+        self._misses += 1
+        result = loop.independent_iterations()
+        if self.maxsize > 0:
+            reference = weakref.ref(
+                loop, functools.partial(self._discard, key)
+            )
+            self._entries[key] = (reference, signature, result)
+            self._entries.move_to_end(key)
+            self._evict()
+        return result
+
+    def _discard(self, key, reference):
+        """
+        Remove the entry of a Loop which no longer exists.
+
+        :arg key: the key of the entry.
+        :type key: :py:class:`int`
+        :arg reference: the weak reference to the Loop.
+        :type reference: :py:class:`weakref.ref`
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is reference:
+            del self._entries[key]
+
+    def info(self):
+        """
+        :returns: the hit, miss, invalidation and eviction statistics, as well
+            as the maximum and current sizes of the cache.
+        :rtype: :py:class:`DependencyCacheInfo`
+        """
+        return DependencyCacheInfo(
+            self._hits,
+            self._misses,
+            self._invalidations,
+            self._evictions,
+            self.maxsize,
+            len(self._entries),
+        )
+
+    def clear(self):
+        """
+        Remove all entries and reset the statistics.
+        """
+        self._entries.clear()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._evictions = 0
+
+
+_dependency_cache = DependencyCache()
+
+
+def get_dependency_cache():
+    """
+    Get the cache used by :func:`psytran.loop.is_parallelisable`.
+
+    :returns: the cache.
+    :rtype: :py:class:`DependencyCache`
+    """
+    return _dependency_cache
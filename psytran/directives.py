@@ -20,17 +20,78 @@ from psyclone.psyir.nodes import (
     OMPTeamsDistributeParallelDoDirective,
     OMPTeamsLoopDirective,
 )
+from psyclone.psyir.transformations import ACCKernelsTrans, TransformationError
 from psyclone.transformations import ACCLoopTrans, OMPLoopTrans
-from psytran.loop import _check_loop
+from psytran.index import _watch_versions, tree_version
+from psytran.loop import _check_loop, max_collapse
+from psytran.profiling import _count_visits, profiled
+
+# OpenMP directives which count as ``loop`` directives
+_omp_loop_directives = (
+    OMPDoDirective,
+    OMPLoopDirective,
+    OMPParallelDoDirective,
+    OMPTeamsDistributeParallelDoDirective,
+    OMPTeamsLoopDirective,
+)
+
+# Active directive maps, keyed by the identity of their root Node
+_directive_maps = {}
 
 __all__ = [
+    "DirectiveResult",
+    "LoopDirectiveInfo",
+    "DirectiveMap",
+    "build_directive_map",
+    "drop_directive_map",
+    "get_directive_map",
     "apply_parallel_directive",
+    "apply_parallel_directives",
     "has_parallel_directive",
+    "merge_kernels_regions",
     "apply_loop_directive",
+    "apply_loop_directives",
     "has_loop_directive",
 ]
 
 
+class DirectiveResult:
+    """
+    Outcome of applying a directive to a single Node (or block of Nodes) as
+    part of a batch.
+
+    :ivar node: the Node or block that the directive was applied to.
+    :ivar error: the exception raised when validating or applying the
+        directive, or ``None`` if it was applied successfully.
+    """
+
+    __slots__ = ("node", "error")
+
+    def __init__(self, node, error=None):
+        """
+        :arg node: the Node or block that the directive was applied to.
+        :type node: :py:class:`Node` or :py:class:`list`
+        :kwarg error: the exception raised, if any.
+        :type error: :py:class:`Exception`
+        """
+        self.node = node
+        self.error = error
+
+    @property
+    def applied(self):
+        """
+        :returns: ``True`` if the directive was applied, else ``False``.
+        :rtype: :py:class:`bool`
+        """
+        return self.error is None
+
+    def __bool__(self):
+        return self.applied
+
+    def __repr__(self):
+        return f"DirectiveResult(applied={self.applied}, error={self.error!r})"
+
+
 def _check_directive(directive):
     """
     Determine whether the directive to be applied is supported by PSyclone.
@@ -47,6 +108,7 @@ def _check_directive(directive):
         )
 
 
+@profiled
 def apply_parallel_directive(block, directive_cls, options=None):
     """
     Apply an directive to a block of code.
@@ -68,6 +130,44 @@ def apply_parallel_directive(block, directive_cls, options=None):
     directive_cls().apply(block, options=options)
 
 
+@profiled
+def apply_parallel_directives(blocks, directive_cls, options=None):
+    """
+    Apply a directive to each of several blocks of code.
+
+    A single transformation object is used for all blocks, which are
+    processed in the order given. Failures are recorded, rather than raised.
+
+    :arg blocks: the blocks of code to apply the directive to.
+    :type blocks: :py:class:`list`
+    :arg directive_cls: the type of directive
+    :type directive_cls: :py:class:`psyclone.psyir.transformations.\
+        parallel_loop_trans.ParallelLoopTrans.__class__`
+    :kwarg options: a dictionary of clause options.
+    :type options: :py:class:`dict`
+
+    :returns: the outcome for each block, in the order given.
+    :rtype: :py:class:`list` of :py:class:`DirectiveResult`
+
+    :raises TypeError: if the options argument is not a dictionary.
+    """
+    if options is None:
+        options = {}
+    if not isinstance(options, dict):
+        raise TypeError(f"Expected a dict, not '{type(options)}'.")
+    directive = directive_cls()
+    results = []
+    for block in blocks:
+        try:
+            directive.apply(block, options=options)
+        except TransformationError as error:
+            results.append(DirectiveResult(block, error))
+        else:
+            results.append(DirectiveResult(block))
+    return results
+
+
+@profiled
 def has_parallel_directive(node, directive_cls):
     """
     Determine whether a node is inside a parallel directive of a given type.
@@ -84,10 +184,150 @@ def has_parallel_directive(node, directive_cls):
     if isinstance(node, Iterable):
         return has_parallel_directive(node[0], directive_cls)
     assert isinstance(node, nodes.Node)
+    directive_map = get_directive_map(node)
+    if directive_map is not None:
+        return any(
+            isinstance(region, directive_cls)
+            for region in directive_map.regions(node)
+        )
     return bool(node.ancestor(directive_cls))
 
 
-def apply_loop_directive(loop, directive, options=None):
+def _collapse_options(loop, options, auto_collapse):
+    """
+    Replace any ``collapse`` clause in a dictionary of clause options with the
+    largest legal collapse of a Loop, if requested.
+
+    :arg loop: the Loop the options are for.
+    :type loop: :py:class:`Loop`
+    :arg options: a dictionary of clause options, or ``None``.
+    :type options: :py:class:`dict`
+    :arg auto_collapse: whether to determine the ``collapse`` clause with
+        :func:`psytran.loop.max_collapse`.
+    :type auto_collapse: :py:class:`bool`
+
+    :returns: the clause options to apply.
+    :rtype: :py:class:`dict` or :py:class:`NoneType`
+    """
+    if not auto_collapse:
+        return options
+    options = dict(options or {})
+    options.pop("collapse", None)
+    depth = max_collapse(loop)
+    if depth > 1:
+        options["collapse"] = depth
+    return options
+
+
+def _can_include_in_kernels(node, trans):
+    """
+    Determine whether a statement may be moved into an ACC ``kernels`` region,
+    according to the validation of :class:`ACCKernelsTrans`.
+
+    :arg node: the statement to check.
+    :type node: :py:class:`Node`
+    :arg trans: the transformation to validate with.
+    :type trans: :py:class:`ACCKernelsTrans`
+
+    :returns: ``True`` if the statement may be included, else ``False``.
+    :rtype: :py:class:`bool`
+    """
+    if node.walk(nodes.Directive):
+        return False
+    try:
+        trans.validate([node], options={"disable_loop_check": True})
+    except (TransformationError, NotImplementedError):
+        return False
+    return True
+
+
+def _same_clauses(region, other):
+    """
+    Determine whether two ACC ``kernels`` regions have the same clauses.
+
+    :arg region: the first region.
+    :type region: :py:class:`ACCKernelsDirective`
+    :arg other: the second region.
+    :type other: :py:class:`ACCKernelsDirective`
+
+    :returns: ``True`` if the clauses are the same, else ``False``.
+    :rtype: :py:class:`bool`
+    """
+    return region.begin_string() == other.begin_string()
+
+
+@profiled
+def merge_kernels_regions(node, include_statements=True):
+    """
+    Merge runs of ACC ``kernels`` regions which are siblings beneath a Node
+    into maximal regions, so that the regions, and the synchronisation at the
+    end of each, are replaced by one.
+
+    Regions are merged if they are adjacent or, optionally, separated only by
+    statements which could themselves be placed in a ``kernels`` region, as
+    determined by :class:`ACCKernelsTrans`, and which contain no directives.
+    Note that such statements are then executed on the device, rather than
+    on the host. Regions are only merged if they have the same clauses, e.g.,
+    ``default(present)``, and regions of subclasses of
+    :class:`ACCKernelsDirective`, such as those with ``async`` clauses, are
+    never merged, since their clauses carry synchronisation which merging
+    would change. The contents of each run are moved into its first region,
+    so any directives within the regions are preserved.
+
+    :arg node: the Node to transform, e.g., a Schedule.
+    :type node: :py:class:`Node`
+    :kwarg include_statements: if ``True``, merge regions separated by
+        statements which may be included in a ``kernels`` region.
+    :type include_statements: :py:class:`bool`
+
+    :returns: the merged regions.
+    :rtype: :py:class:`list` of :py:class:`ACCKernelsDirective`
+    """
+    assert isinstance(
+        node, nodes.Node
+    ), f"Expected a Node, not '{type(node)}'."
+    trans = ACCKernelsTrans()
+    merged = []
+    for schedule in node.walk(nodes.Schedule):
+        # Each run holds a region followed by statements and further regions,
+        # while the statements since the last region are pending
+        runs, run, pending = [], None, []
+        for child in schedule.children:
+            if type(child) is ACCKernelsDirective:  # pylint: disable=C0123
+                if run is not None and _same_clauses(child, run[0]):
+                    run.extend(pending)
+                    run.append(child)
+                else:
+                    run = [child]
+                    runs.append(run)
+                pending = []
+            elif (
+                run is not None
+                and include_statements
+                and _can_include_in_kernels(child, trans)
+            ):
+                pending.append(child)
+            else:
+                run, pending = None, []
+
+        for run in runs:
+            if len(run) < 2:
+                continue
+            region = run[0]
+            for child in run[1:]:
+                child.detach()
+                if isinstance(child, ACCKernelsDirective):
+                    region.dir_body.children.extend(
+                        child.dir_body.pop_all_children()
+                    )
+                else:
+                    region.dir_body.children.append(child)
+            merged.append(region)
+    return merged
+
+
+@profiled
+def apply_loop_directive(loop, directive, options=None, auto_collapse=False):
     """
     Apply a ``loop`` directive.
 
@@ -95,6 +335,10 @@ def apply_loop_directive(loop, directive, options=None):
     :type loop: :py:class:`Loop`
     :kwarg options: a dictionary of clause options.
     :type options: :py:class:`dict`
+    :kwarg auto_collapse: if ``True``, add a ``collapse`` clause for as many
+        Loops as may legally be collapsed, as determined by
+        :func:`psytran.loop.max_collapse`, overriding any ``collapse`` option.
+    :type auto_collapse: :py:class:`bool`
 
     :raises TypeError: if the options argument is not a dictionary.
     :raises ValueError: if a ``kernels`` directive has not yet been applied to
@@ -107,23 +351,128 @@ def apply_loop_directive(loop, directive, options=None):
     _check_directive(directive)
     # Check loop is valid
     _check_loop(loop)
+    _check_kernels(
+        directive, has_parallel_directive(loop, ACCKernelsDirective)
+    )
 
-    if isinstance(directive, ACCLoopTrans):
-        if not has_parallel_directive(loop, ACCKernelsDirective):
-            raise ValueError(
-                "Cannot apply an ACC loop directive without a kernels "
-                "directive."
-            )
-    if isinstance(directive, OMPLoopTrans):
-        if has_parallel_directive(loop, ACCKernelsDirective):
-            raise ValueError(
-                "Cannot apply an OMP loop directive to a kernel with an "
-                "ACC kernels directive."
+    options = _collapse_options(loop, options, auto_collapse)
+    directive.apply(loop, options=options)
+
+
+def _check_kernels(directive, in_kernels):
+    """
+    Check that a ``loop`` directive is compatible with whether or not the Loop
+    it is applied to lies within an ACC ``kernels`` region.
+
+    :arg directive: the directive to be applied.
+    :type directive: :py:class:`Directive`
+    :arg in_kernels: whether the Loop lies within a ``kernels`` region.
+    :type in_kernels: :py:class:`bool`
+
+    :raises ValueError: if an ACC ``loop`` directive is applied outside a
+        ``kernels`` region, or an OMP one is applied inside.
+    """
+    if isinstance(directive, ACCLoopTrans) and not in_kernels:
+        raise ValueError(
+            "Cannot apply an ACC loop directive without a kernels directive."
+        )
+    if isinstance(directive, OMPLoopTrans) and in_kernels:
+        raise ValueError(
+            "Cannot apply an OMP loop directive to a kernel with an "
+            "ACC kernels directive."
+        )
+
+
+def _has_ancestor_cached(node, node_type, cache):
+    """
+    Determine whether a Node has an ancestor of a given type, sharing the
+    search with other Nodes in the same tree.
+
+    :arg node: the Node to check.
+    :type node: :py:class:`Node`
+    :arg node_type: the type of ancestor to search for.
+    :type node_type: :py:class:`type`
+    :arg cache: maps the identity of each Node already visited to whether it,
+        or one of its ancestors, has the given type.
+    :type cache: :py:class:`dict`
+
+    :returns: ``True`` if the Node has an ancestor of the given type, else
+        ``False``.
+    :rtype: :py:class:`bool`
+    """
+    path, current, found = [], node.parent, False
+    while current is not None:
+        if id(current) in cache:
+            found = cache[id(current)]
+            break
+        path.append(current)
+        if isinstance(current, node_type):
+            found = True
+            break
+        current = current.parent
+    for visited in path:
+        cache[id(visited)] = found
+    return found
+
+
+@profiled
+def apply_loop_directives(loops, directive, options=None, auto_collapse=False):
+    """
+    Apply a ``loop`` directive to each of several Loops.
+
+    The whole batch is validated before any directive is applied, with the
+    searches for enclosing ``kernels`` regions shared between Loops. Loops are
+    then processed outer-most first, so that, e.g., a ``collapse`` clause is
+    applied before any of the Loops it covers are wrapped. Failures are
+    recorded, rather than raised.
+
+    :arg loops: the Loop Nodes to apply the directive to.
+    :type loops: :py:class:`list`
+    :arg directive: the directive to apply.
+    :type directive: :py:class:`Directive`
+    :kwarg options: a dictionary of clause options.
+    :type options: :py:class:`dict`
+    :kwarg auto_collapse: if ``True``, add a ``collapse`` clause for as many
+        Loops as may legally be collapsed, as determined for each Loop by
+        :func:`psytran.loop.max_collapse` before any directive is applied.
+    :type auto_collapse: :py:class:`bool`
+
+    :returns: the outcome for each Loop, in the order given.
+    :rtype: :py:class:`list` of :py:class:`DirectiveResult`
+
+    :raises TypeError: if the options argument is not a dictionary.
+    """
+    if options is not None and not isinstance(options, dict):
+        raise TypeError(f"Expected a dict, not '{type(options)}'.")
+    _check_directive(directive)
+
+    # Validate the whole batch before modifying the tree
+    results, valid, cache = [], [], {}
+    for loop in loops:
+        result = DirectiveResult(loop)
+        results.append(result)
+        try:
+            _check_loop(loop)
+            in_kernels = _has_ancestor_cached(loop, ACCKernelsDirective, cache)
+            _check_kernels(directive, in_kernels)
+        except (TypeError, ValueError) as error:
+            result.error = error
+        else:
+            valid.append(
+                (result, _collapse_options(loop, options, auto_collapse))
             )
 
-    directive.apply(loop, options=options)
+    # Apply to outer Loops before the Loops they contain
+    valid.sort(key=lambda entry: entry[0].node.depth)
+    for result, loop_options in valid:
+        try:
+            directive.apply(result.node, options=loop_options)
+        except TransformationError as error:
+            result.error = error
+    return results
 
 
+@profiled
 def has_loop_directive(loop):
     """
     Determine whether a node has an OpenACC ``loop`` directive.
@@ -136,20 +485,264 @@ def has_loop_directive(loop):
     :rtype: :py:class:`bool`
     """
     assert isinstance(loop, nodes.Loop)
+    directive_map = get_directive_map(loop)
+    if directive_map is not None:
+        return directive_map[loop].directive is not None
     if isinstance(
         loop.parent.parent, ACCLoopDirective
     ) and has_parallel_directive(loop, ACCKernelsDirective):
         return True
-    if isinstance(
-        loop.parent.parent,
-        (
-            OMPDoDirective,
-            OMPLoopDirective,
-            OMPParallelDoDirective,
-            OMPTeamsDistributeParallelDoDirective,
-            OMPTeamsLoopDirective,
-        ),
-    ):
+    if isinstance(loop.parent.parent, _omp_loop_directives):
         return True
 
     return False
+
+
+class LoopDirectiveInfo:
+    """
+    Record of the directives which apply to a single Loop.
+
+    :ivar loop: the Loop.
+    :ivar regions: the Directives enclosing the Loop, nearest first.
+    :ivar directive: the ``loop`` directive of the Loop, as determined by
+        :func:`has_loop_directive`, or ``None``.
+    :ivar sequential: whether the ``loop`` directive has a ``seq`` clause.
+    :ivar gang: whether the ``loop`` directive has a ``gang`` clause.
+    :ivar vector: whether the ``loop`` directive has a ``vector`` clause.
+    :ivar collapse: the ``collapse`` clause of the ``loop`` directive, if any.
+    :ivar collapsed: whether the Loop lies within a collapsed Loop nest, as
+        determined by :func:`psytran.clauses.has_collapse_clause`.
+    """
+
+    __slots__ = (
+        "loop",
+        "regions",
+        "directive",
+        "sequential",
+        "gang",
+        "vector",
+        "collapse",
+        "collapsed",
+    )
+
+    def __init__(self, loop, regions, directive=None):
+        """
+        :arg loop: the Loop.
+        :type loop: :py:class:`Loop`
+        :arg regions: the Directives enclosing the Loop, nearest first.
+        :type regions: :py:class:`tuple`
+        :kwarg directive: the ``loop`` directive of the Loop.
+        :type directive: :py:class:`Directive`
+        """
+        self.loop = loop
+        self.regions = regions
+        self.directive = directive
+        self.sequential = bool(getattr(directive, "sequential", False))
+        self.gang = bool(getattr(directive, "gang", False))
+        self.vector = bool(getattr(directive, "vector", False))
+        self.collapse = getattr(directive, "collapse", None)
+        self.collapsed = False
+
+    def __repr__(self):
+        directive = type(self.directive).__name__ if self.directive else None
+        return (
+            f"LoopDirectiveInfo(loop={self.loop.variable.name!r},"
+            f" directive={directive}, sequential={self.sequential},"
+            f" gang={self.gang}, vector={self.vector},"
+            f" collapse={self.collapse}, collapsed={self.collapsed})"
+        )
+
+
+class DirectiveMap:
+    r"""
+    Record of the Directives enclosing every Node beneath a root
+    :py:class:`Node`, and of the ``loop`` directive and clauses of every
+    :py:class:`Loop`, computed in a single traversal.
+
+    While a map is registered with :func:`build_directive_map`, the ``has_*``
+    queries in :py:mod:`psytran.directives` and :py:mod:`psytran.clauses`
+    become lookups. The map is rebuilt lazily whenever the tree has been
+    modified, so it is best built once the directives have been inserted,
+    e.g., for auditing.
+    """
+
+    def __init__(self, root):
+        """
+        :arg root: the root Node of the tree to map.
+        :type root: :py:class:`Node`
+        """
+        assert isinstance(
+            root, nodes.Node
+        ), f"Expected a Node, not '{type(root)}'."
+        self.root = root
+        self._version = None
+        _watch_versions(self)
+        self.rebuild()
+
+    def rebuild(self):
+        """
+        Re-compute the map from the current state of the tree.
+        """
+        self._regions = {}
+        self._loops = {}
+        regions = []
+        ancestor = self.root.parent
+        while ancestor is not None:
+            if isinstance(ancestor, nodes.Directive):
+                regions.append(ancestor)
+            ancestor = ancestor.parent
+
+        # Each stack entry holds a Node, its enclosing Directives and the
+        # collapse clause in effect for its nearest enclosing Loop, as a pair
+        # of the number of Loops collapsed and the Loop's position within them
+        stack = [(self.root, tuple(regions), None)]
+        while stack:
+            node, regions, collapse = stack.pop()
+            self._regions[id(node)] = (node, regions)
+            if isinstance(node, nodes.Loop):
+                info = LoopDirectiveInfo(
+                    node, regions, self._loop_directive(node, regions)
+                )
+                if info.collapse is not None:
+                    collapse = (info.collapse, 0)
+                elif collapse is not None:
+                    collapse = (collapse[0], collapse[1] + 1)
+                info.collapsed = (
+                    collapse is not None and collapse[0] > collapse[1]
+                )
+                self._loops[id(node)] = info
+            if isinstance(node, nodes.Directive):
+                regions = (node,) + regions
+            stack.extend(
+                (child, regions, collapse) for child in reversed(node.children)
+            )
+        self._version = tree_version(self.root)
+        _count_visits(len(self._regions))
+
+    @staticmethod
+    def _loop_directive(loop, regions):
+        """
+        Get the ``loop`` directive of a Loop, following the same rules as
+        :func:`has_loop_directive`.
+        """
+        if loop.parent is None:
+            return None
+        directive = loop.parent.parent
+        if isinstance(directive, ACCLoopDirective) and any(
+            isinstance(region, ACCKernelsDirective) for region in regions
+        ):
+            return directive
+        if isinstance(directive, _omp_loop_directives):
+            return directive
+        return None
+
+    @property
+    def stale(self):
+        """
+        :returns: ``True`` if the tree has changed since the map was built.
+        :rtype: :py:class:`bool`
+        """
+        return self._version != tree_version(self.root)
+
+    def refresh(self):
+        """
+        Rebuild the map if the tree has changed since it was last built.
+        """
+        if self.stale:
+            self.rebuild()
+
+    def __contains__(self, node):
+        self.refresh()
+        entry = self._regions.get(id(node))
+        return entry is not None and entry[0] is node
+
+    def __len__(self):
+        self.refresh()
+        return len(self._loops)
+
+    def __iter__(self):
+        self.refresh()
+        return iter(self._loops.values())
+
+    def __getitem__(self, loop):
+        """
+        :arg loop: the Loop to look up.
+        :type loop: :py:class:`Loop`
+
+        :returns: the directives which apply to the Loop.
+        :rtype: :py:class:`LoopDirectiveInfo`
+
+        :raises KeyError: if the Loop is not in the mapped tree.
+        """
+        self.refresh()
+        info = self._loops.get(id(loop))
+        if info is None or info.loop is not loop:
+            raise KeyError(f"Loop '{loop.node_str(False)}' is not mapped.")
+        return info
+
+    def regions(self, node):
+        """
+        Get the Directives enclosing a Node.
+
+        :arg node: the Node to look up.
+        :type node: :py:class:`Node`
+
+        :returns: the enclosing Directives, nearest first.
+        :rtype: :py:class:`tuple`
+
+        :raises KeyError: if the Node is not in the mapped tree.
+        """
+        if node not in self:
+            raise KeyError(f"Node '{node.node_str(False)}' is not mapped.")
+        return self._regions[id(node)][1]
+
+
+def build_directive_map(root):
+    """
+    Build a :class:`DirectiveMap` for the tree beneath a Node and register it
+    so that the ``has_*`` queries consult it.
+
+    If a map already exists for the Node then it is returned.
+
+    :arg root: the root Node of the tree to map, e.g., a Schedule.
+    :type root: :py:class:`Node`
+
+    :returns: the map.
+    :rtype: :py:class:`DirectiveMap`
+    """
+    directive_map = _directive_maps.get(id(root))
+    if directive_map is None or directive_map.root is not root:
+        directive_map = DirectiveMap(root)
+        _directive_maps[id(root)] = directive_map
+    return directive_map
+
+
+def drop_directive_map(root):
+    """
+    Deregister the :class:`DirectiveMap` for the tree beneath a Node, if one
+    exists.
+
+    :arg root: the root Node of the mapped tree.
+    :type root: :py:class:`Node`
+    """
+    directive_map = _directive_maps.get(id(root))
+    if directive_map is not None and directive_map.root is root:
+        del _directive_maps[id(root)]
+
+
+def get_directive_map(node):
+    """
+    Get a registered :class:`DirectiveMap` which contains a Node.
+
+    :arg node: the Node to look up.
+    :type node: :py:class:`Node`
+
+    :returns: the map, or ``None`` if the Node has not been mapped.
+    :rtype: :py:class:`DirectiveMap` or :py:class:`NoneType`
+    """
+    if not _directive_maps:
+        return None
+    for directive_map in _directive_maps.values():
+        if node in directive_map:
+            return directive_map
+    return None
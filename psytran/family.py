@@ -9,21 +9,191 @@ This module provides functions for determining the ancestors and descendents of
 """
 
 from psyclone.psyir.nodes import Loop, Node
+from psytran.index import get_index
+from psytran.profiling import _count_visits, profiled
 
 __all__ = [
+    "iter_descendents",
+    "iter_ancestors",
     "get_descendents",
     "get_ancestors",
     "get_children",
     "has_descendent",
     "has_ancestor",
+    "is_ancestor",
+    "is_descendent",
 ]
 
 
+def _check_relatives_query(node, node_type, inclusive, depth):
+    """
+    Check the arguments of a query for the ancestors or descendents of a Node.
+
+    :arg node: the Node to search for relatives of.
+    :type node: :py:class:`Node`
+    :arg node_type: the type of node to search for.
+    :type node_type: :py:class:`type`
+    :arg inclusive: if ``True``, the current node is included.
+    :type inclusive: :py:class:`bool`
+    :arg depth: specify a depth for the relatives to have.
+    :type depth: :py:class:`int`
+    """
+    assert isinstance(node, Node), f"Expected a Node, not '{type(node)}'."
+    assert isinstance(
+        inclusive, bool
+    ), f"Expected a bool, not '{type(inclusive)}'."
+    assert isinstance(node_type, tuple) or issubclass(node_type, Node)
+    if depth is not None:
+        assert isinstance(depth, int), f"Expected an int, not '{type(depth)}'."
+
+
+def _walk_descendents(node, node_type, inclusive, exclude, depth):
+    """
+    Generator for the descendents of a Node, in the same order as
+    :meth:`Node.walk`.
+
+    See :func:`iter_descendents` for the arguments.
+    """
+    level = node.depth if depth is not None else None
+    stack = [(node, level)]
+    visits = 0
+    while stack:
+        current, level = stack.pop()
+        visits += 1
+        if (
+            isinstance(current, node_type)
+            and not isinstance(current, exclude)
+            and (inclusive or current is not node)
+            and (depth is None or level == depth)
+        ):
+            _count_visits(visits)
+            visits = 0
+            yield current
+        if depth is None:
+            stack.extend((child, None) for child in reversed(current.children))
+        elif level < depth:
+            stack.extend(
+                (child, level + 1) for child in reversed(current.children)
+            )
+    _count_visits(visits)
+
+
+def _walk_ancestors(node, node_type, inclusive, exclude, depth):
+    """
+    Generator for the ancestors of a Node, nearest first.
+
+    See :func:`iter_ancestors` for the arguments.
+    """
+    level = node.depth if depth is not None else None
+    if not inclusive:
+        node = node.parent
+        if level is not None:
+            level -= 1
+    visits = 0
+    while node is not None:
+        visits += 1
+        if (
+            isinstance(node, node_type)
+            and not isinstance(node, exclude)
+            and (depth is None or level == depth)
+        ):
+            _count_visits(visits)
+            visits = 0
+            yield node
+        node = node.parent
+        if level is not None:
+            level -= 1
+    _count_visits(visits)
+
+
+@profiled
+def iter_descendents(
+    node, node_type=Node, inclusive=False, exclude=(), depth=None
+):
+    """
+    Iterate over the descendents of a Node with a given type.
+
+    Descendents are generated lazily, in the same order as
+    :func:`get_descendents`, so that searches may be terminated early. The tree
+    should not be modified during iteration.
+
+    :arg node: the Node to search for descendents of.
+    :type node: :py:class:`Node`
+    :kwarg node_type: the type of node to search for.
+    :type node_type: :py:class:`type`
+    :kwarg inclusive: if ``True``, the current node is included.
+    :type inclusive: :py:class:`bool`
+    :kwarg exclude: type(s) of node to exclude.
+    :type exclude: :py:class:`bool`
+    :kwarg depth: specify a depth for the descendents to have.
+    :type depth: :py:class:`int`
+
+    :returns: iterator over descendents according to specifications.
+    :rtype: :py:class:`collections.abc.Iterator`
+    """
+    _check_relatives_query(node, node_type, inclusive, depth)
+    index = get_index(node)
+    if index is not None:
+        return iter(
+            index.descendents(
+                node,
+                node_type=node_type,
+                inclusive=inclusive,
+                exclude=exclude,
+                depth=depth,
+            )
+        )
+    return _walk_descendents(node, node_type, inclusive, exclude, depth)
+
+
+@profiled
+def iter_ancestors(
+    node, node_type=Loop, inclusive=False, exclude=(), depth=None
+):
+    """
+    Iterate over the ancestors of a Node with a given type.
+
+    Ancestors are generated lazily, nearest first, so that searches may be
+    terminated early. The tree should not be modified during iteration.
+
+    :arg node: the Node to search for ancestors of.
+    :type node: :py:class:`Node`
+    :kwarg node_type: the type of node to search for.
+    :type node_type: :py:class:`type`
+    :kwarg inclusive: if ``True``, the current node is included.
+    :type inclusive: :py:class:`bool`
+    :kwarg exclude: type(s) of node to exclude.
+    :type exclude: :py:class:`bool`
+    :kwarg depth: specify a depth for the ancestors to have.
+    :type depth: :py:class:`int`
+
+    :returns: iterator over ancestors according to specifications.
+    :rtype: :py:class:`collections.abc.Iterator`
+    """
+    _check_relatives_query(node, node_type, inclusive, depth)
+    index = get_index(node)
+    if index is not None:
+        return iter(
+            index.ancestors(
+                node,
+                node_type=node_type,
+                inclusive=inclusive,
+                exclude=exclude,
+                depth=depth,
+            )
+        )
+    return _walk_ancestors(node, node_type, inclusive, exclude, depth)
+
+
+@profiled
 def get_descendents(
     node, node_type=Node, inclusive=False, exclude=(), depth=None
 ):
     """
-    Get all ancestors of a Node with a given type.
+    Get all descendents of a Node with a given type.
+
+    If the Node belongs to a tree indexed with :func:`build_index` then the
+    index is consulted rather than walking the tree.
 
     :arg node: the Node to search for descendents of.
     :type node: :py:class:`Node`
@@ -39,27 +209,27 @@ def get_descendents(
     :returns: list of descendents according to specifications.
     :rtype: :py:class:`list`
     """
-    assert isinstance(node, Node), f"Expected a Node, not '{type(node)}'."
-    assert isinstance(
-        inclusive, bool
-    ), f"Expected a bool, not '{type(inclusive)}'."
-    assert isinstance(node_type, tuple) or issubclass(node_type, Node)
-    if depth is not None:
-        assert isinstance(depth, int), f"Expected an int, not '{type(depth)}'."
-    return [
-        descendent
-        for descendent in node.walk(node_type, depth=depth)
-        if not isinstance(descendent, exclude)
-        and (inclusive or descendent is not node)
-    ]
+    return list(
+        iter_descendents(
+            node,
+            node_type=node_type,
+            inclusive=inclusive,
+            exclude=exclude,
+            depth=depth,
+        )
+    )
 
 
+@profiled
 def get_ancestors(
     node, node_type=Loop, inclusive=False, exclude=(), depth=None
 ):
     """
     Get all ancestors of a Node with a given type.
 
+    If the Node belongs to a tree indexed with :func:`build_index` then the
+    index is consulted rather than walking the tree.
+
     :arg node: the Node to search for ancestors of.
     :type node: :py:class:`Node`
     :kwarg node_type: the type of node to search for.
@@ -74,23 +244,18 @@ def get_ancestors(
     :returns: list of ancestors according to specifications.
     :rtype: :py:class:`list`
     """
-    assert isinstance(node, Node), f"Expected a Node, not '{type(node)}'."
-    assert isinstance(
-        inclusive, bool
-    ), f"Expected a bool, not '{type(inclusive)}'."
-    assert isinstance(node_type, tuple) or issubclass(node_type, Node)
-    if depth is not None:
-        assert isinstance(depth, int), f"Expected an int, not '{type(depth)}'."
-    ancestors = []
-    node = node.ancestor(node_type, excluding=exclude, include_self=inclusive)
-    while node is not None:
-        ancestors.append(node)
-        node = node.ancestor(node_type, excluding=exclude)
-    if depth is not None:
-        ancestors = [a for a in ancestors if a.depth == depth]
-    return ancestors
+    return list(
+        iter_ancestors(
+            node,
+            node_type=node_type,
+            inclusive=inclusive,
+            exclude=exclude,
+            depth=depth,
+        )
+    )
 
 
+@profiled
 def get_children(node, node_type=Node, exclude=()):
     """
     Get all immediate descendents of a Node with a given type, i.e., those at
@@ -120,6 +285,7 @@ def get_children(node, node_type=Node, exclude=()):
     return children
 
 
+@profiled
 def has_descendent(node, node_type, inclusive=False):
     """
     Check whether a Node has a descendent node with a given type.
@@ -135,11 +301,13 @@ def has_descendent(node, node_type, inclusive=False):
         ``False``.
     :rtype: :py:class:`bool`
     """
-    return bool(
-        get_descendents(node, inclusive=inclusive, node_type=node_type)
+    descendents = iter_descendents(
+        node, inclusive=inclusive, node_type=node_type
     )
+    return next(descendents, None) is not None
 
 
+@profiled
 def has_ancestor(node, node_type=Loop, inclusive=False, name=None):
     """
     Check whether a Node has an ancestor node with a given type.
@@ -157,7 +325,62 @@ def has_ancestor(node, node_type=Loop, inclusive=False, name=None):
         ``False``.
     :rtype: :py:class:`bool`
     """
-    ancestors = get_ancestors(node, inclusive=inclusive, node_type=node_type)
+    ancestors = iter_ancestors(node, inclusive=inclusive, node_type=node_type)
     if name:
         return any(ancestor.variable.name == name for ancestor in ancestors)
-    return bool(ancestors)
+    return next(ancestors, None) is not None
+
+
+@profiled
+def is_ancestor(ancestor, node, inclusive=False):
+    """
+    Check whether a Node is an ancestor of another Node.
+
+    If both Nodes belong to a tree indexed with :func:`build_index` then this
+    is a constant time comparison of their pre-order intervals. Otherwise, the
+    ancestors of ``node`` are searched.
+
+    :arg ancestor: the candidate ancestor Node.
+    :type ancestor: :py:class:`Node`
+    :arg node: the Node to check for ancestors of.
+    :type node: :py:class:`Node`
+    :kwarg inclusive: if ``True``, a Node is considered its own ancestor.
+    :type inclusive: :py:class:`bool`
+
+    :returns: ``True`` if ``ancestor`` is an ancestor of ``node``, else
+        ``False``.
+    :rtype: :py:class:`bool`
+    """
+    assert isinstance(node, Node), f"Expected a Node, not '{type(node)}'."
+    assert isinstance(
+        ancestor, Node
+    ), f"Expected a Node, not '{type(ancestor)}'."
+    index = get_index(node)
+    if index is not None and ancestor in index:
+        return index.is_ancestor(ancestor, node, inclusive=inclusive)
+    if not inclusive:
+        node = node.parent
+    while node is not None:
+        if node is ancestor:
+            return True
+        node = node.parent
+    return False
+
+
+@profiled
+def is_descendent(descendent, node, inclusive=False):
+    """
+    Check whether a Node is a descendent of another Node.
+
+    :arg descendent: the candidate descendent Node.
+    :type descendent: :py:class:`Node`
+    :arg node: the Node to check for descendents of.
+    :type node: :py:class:`Node`
+    :kwarg inclusive: if ``True``, a Node is considered its own descendent.
+    :type inclusive: :py:class:`bool`
+
+    :returns: ``True`` if ``descendent`` is a descendent of ``node``, else
+        ``False``.
+    :rtype: :py:class:`bool`
+    """
+    return is_ancestor(node, descendent, inclusive=inclusive)
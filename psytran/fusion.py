@@ -0,0 +1,196 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+r"""
+This module provides an analysis of which adjacent :py:class:`Loop`\s may be
+fused, along with helpers for fusing them. Fusing sibling Loop nests before
+directives are applied reduces the number of kernels launched.
+"""
+
+from psyclone.core import SymbolicMaths
+from psyclone.psyir import nodes
+from psyclone.psyir.tools import DependencyTools
+from psyclone.psyir.transformations import LoopFuseTrans
+from psytran.family import iter_ancestors
+from psytran.loop import _check_loop
+from psytran.profiling import profiled
+
+__all__ = [
+    "can_fuse",
+    "find_fusible_loops",
+    "fuse_loops",
+    "fuse_adjacent_loops",
+]
+
+
+def _same_bounds(loop1, loop2):
+    """
+    Determine whether two Loops have the same iteration space.
+    """
+    return all(
+        SymbolicMaths.equal(expr1, expr2)
+        for expr1, expr2 in zip(
+            (loop1.start_expr, loop1.stop_expr, loop1.step_expr),
+            (loop2.start_expr, loop2.stop_expr, loop2.step_expr),
+        )
+    )
+
+
+@profiled
+def can_fuse(loop1, loop2):
+    """
+    Determine whether two Loops have the same bounds and no dependence between
+    them which would prevent them from being fused, as determined by
+    PSyclone's :class:`DependencyTools`.
+
+    The Loops need not be adjacent, but the second is assumed to follow the
+    first.
+
+    :arg loop1: the first Loop.
+    :type loop1: :py:class:`Loop`
+    :arg loop2: the second Loop.
+    :type loop2: :py:class:`Loop`
+
+    :returns: ``True`` if the Loops may be fused, else ``False``.
+    :rtype: :py:class:`bool`
+
+    :raises TypeError: if either argument is not a Loop Node.
+    """
+    _check_loop(loop1)
+    _check_loop(loop2)
+    if not _same_bounds(loop1, loop2):
+        return False
+    return DependencyTools().can_loops_be_fused(loop1, loop2)
+
+
+def _fusible_runs(siblings):
+    """
+    Split a list of sibling Nodes into runs of adjacent Loops which may all be
+    fused together.
+
+    :arg siblings: the children of a Node, in order.
+    :type siblings: :py:class:`list`
+
+    :returns: the runs of two or more Loops.
+    :rtype: :py:class:`list` of :py:class:`list`
+    """
+    runs, run = [], []
+    for node in siblings:
+        if not isinstance(node, nodes.Loop):
+            run = []
+            continue
+        # A Loop may join a run if it may be fused with each of its members
+        if run and all(can_fuse(member, node) for member in run):
+            run.append(node)
+        else:
+            run = [node]
+            runs.append(run)
+    return [run for run in runs if len(run) > 1]
+
+
+@profiled
+def find_fusible_loops(node):
+    """
+    Find the runs of adjacent sibling Loops beneath a Node which may be fused.
+
+    Runs are maximal from their first Loop, in the sense that each run is
+    extended for as long as the next sibling is a Loop which may be fused with
+    all Loops in the run, as determined by :func:`can_fuse`.
+
+    :arg node: the Node to search beneath, e.g., a Schedule.
+    :type node: :py:class:`Node`
+
+    :returns: the runs of two or more Loops, in the order returned by
+        :meth:`Node.walk`.
+    :rtype: :py:class:`list` of :py:class:`list`
+    """
+    assert isinstance(
+        node, nodes.Node
+    ), f"Expected a Node, not '{type(node)}'."
+    runs = []
+    for schedule in node.walk(nodes.Schedule):
+        runs.extend(_fusible_runs(schedule.children))
+    runs.sort(key=lambda run: run[0].abs_position)
+    return runs
+
+
+@profiled
+def fuse_loops(loops, nests=True):
+    """
+    Fuse a run of adjacent sibling Loops into the first of them.
+
+    If the Loops use different variables then references to the variables of
+    the later Loops are replaced with the variable of the first, as in
+    PSyclone's :class:`LoopFuseTrans`.
+
+    :arg loops: the Loops to fuse, in order.
+    :type loops: :py:class:`list` of :py:class:`Loop`
+    :kwarg nests: if ``True``, go on to fuse any Loops which become adjacent
+        within the body of the fused Loop, e.g., the inner Loops of fused Loop
+        nests.
+    :type nests: :py:class:`bool`
+
+    :returns: the fused Loop.
+    :rtype: :py:class:`Loop`
+
+    :raises TypeError: if any of the Loops is not a Loop Node.
+    :raises ValueError: if fewer than two Loops are given, if the Loops are not
+        adjacent siblings, or if they may not be fused.
+    """
+    loops = list(loops)
+    for loop in loops:
+        _check_loop(loop)
+    if len(loops) < 2:
+        raise ValueError(f"Expected at least two loops, not {len(loops)}.")
+    first = loops[0]
+    for i, loop in enumerate(loops):
+        if loop.parent is not first.parent:
+            raise ValueError("Can only fuse loops with the same parent.")
+        if loop.position != first.position + i:
+            raise ValueError("Can only fuse adjacent loops.")
+        for previous in loops[:i]:
+            if not can_fuse(previous, loop):
+                raise ValueError(
+                    f"Cannot fuse loop '{previous.variable.name}' with loop"
+                    f" '{loop.variable.name}'."
+                )
+
+    # Dependencies have been checked for each pair of Loops above
+    trans = LoopFuseTrans()
+    for loop in loops[1:]:
+        trans.apply(first, loop, options={"force": True})
+    if nests:
+        fuse_adjacent_loops(first.loop_body, nests=True)
+    return first
+
+
+@profiled
+def fuse_adjacent_loops(node, nests=True):
+    """
+    Fuse all runs of adjacent sibling Loops beneath a Node which may be
+    fused, as found by :func:`find_fusible_loops`.
+
+    :arg node: the Node to transform, e.g., a Schedule.
+    :type node: :py:class:`Node`
+    :kwarg nests: if ``True``, go on to fuse any Loops which become adjacent
+        within the bodies of fused Loops, e.g., the inner Loops of fused Loop
+        nests.
+    :type nests: :py:class:`bool`
+
+    :returns: the Loop into which each run was fused, not including Loops
+        fused within the bodies of other fused Loops.
+    :rtype: :py:class:`list` of :py:class:`Loop`
+    """
+    fused, fused_ids = [], set()
+    for run in find_fusible_loops(node):
+        if nests and any(
+            id(ancestor) in fused_ids for ancestor in iter_ancestors(run[0])
+        ):
+            # Already handled when fusing the enclosing Loops
+            continue
+        loop = fuse_loops(run, nests=nests)
+        fused.append(loop)
+        fused_ids.add(id(loop))
+    return fused
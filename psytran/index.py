@@ -0,0 +1,415 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+r"""
+This module provides an opt-in traversal index for a tree of
+:py:class:`Node`\s, which the query functions in :py:mod:`psytran.family`
+consult in order to avoid re-walking the tree on every call.
+
+The index records a pre-order numbering of the tree, together with the last
+pre-order number within each subtree, so that the descendents of a Node form a
+contiguous interval. Nodes are also bucketed by type so that typed queries only
+visit the Nodes that they return.
+"""
+
+import weakref
+from bisect import bisect_left, bisect_right
+from psyclone.psyir.nodes import Node
+from psytran.profiling import _count_visits
+
+__all__ = [
+    "TraversalIndex",
+    "build_index",
+    "drop_index",
+    "get_index",
+    "tree_version",
+]
+
+# Registered indices, each of which is also stored on its root Node, so that
+# it is only kept alive by the tree it indexes
+_indices = weakref.WeakSet()
+
+
+# The original Node.update_signal while the version hook is installed, and the
+# number of live objects which rely on the hook
+_update_signal = None
+_watchers = 0
+
+
+def _counting_update_signal(self):
+    """
+    Increment the version counter of a Node, if it has one, before passing on
+    PSyclone's update signal.
+    """
+    version = vars(self).get("_psytran_version")
+    if version is not None:
+        self._psytran_version = version + 1
+    _update_signal(self)
+
+
+def _watch_versions(owner):
+    """
+    Track modifications of trees for :func:`tree_version` for as long as an
+    object is alive.
+
+    PSyclone propagates an update signal from any modified Node up to the root
+    of its tree, so wrapping :meth:`Node.update_signal` means that the counter
+    of a Node changes whenever the tree beneath it is structurally modified.
+    The wrapper is installed on the class, rather than on individual Nodes, so
+    that copies of a Node keep their own counter. It is only installed while
+    at least one object is watching, so that PSyclone is left untouched when
+    no index or map is in use.
+
+    :arg owner: the object which relies on the version stamps.
+    :type owner: :py:class:`object`
+    """
+    global _update_signal, _watchers  # pylint: disable=global-statement
+    if _watchers == 0:
+        _update_signal = Node.update_signal
+        Node.update_signal = _counting_update_signal
+    _watchers += 1
+    weakref.finalize(owner, _unwatch_versions)
+
+
+def _unwatch_versions():
+    """
+    Stop watching on behalf of an object passed to :func:`_watch_versions`,
+    restoring :meth:`Node.update_signal` once no objects are watching.
+    """
+    global _update_signal, _watchers  # pylint: disable=global-statement
+    _watchers -= 1
+    if _watchers == 0:
+        if Node.update_signal is _counting_update_signal:
+            Node.update_signal = _update_signal
+        _update_signal = None
+
+
+def tree_version(node):
+    """
+    Get a version stamp for the tree beneath a Node, which changes whenever
+    that tree is structurally modified.
+
+    The first call for a given Node starts tracking modifications to it, so
+    stamps should only be compared with those obtained from earlier calls.
+    Modifications are only tracked while a :class:`TraversalIndex` or a
+    :class:`psytran.directives.DirectiveMap` is alive.
+
+    :arg node: the Node to query.
+    :type node: :py:class:`Node`
+
+    :returns: the version stamp.
+    :rtype: :py:class:`int`
+
+    :raises RuntimeError: if modifications are not being tracked.
+    """
+    assert isinstance(node, Node), f"Expected a Node, not '{type(node)}'."
+    if _watchers == 0:
+        raise RuntimeError(
+            "Tree versions are only tracked while a TraversalIndex or"
+            " DirectiveMap is alive."
+        )
+    version = vars(node).get("_psytran_version")
+    if version is None:
+        version = node._psytran_version = 0
+    return version
+
+
+class TraversalIndex:
+    r"""
+    Pre-computed traversal data for the tree beneath a root :py:class:`Node`.
+
+    The index is rebuilt lazily whenever the tree has been modified since it
+    was last built, so queries never return stale answers.
+    """
+
+    def __init__(self, root):
+        """
+        :arg root: the root Node of the tree to index.
+        :type root: :py:class:`Node`
+        """
+        assert isinstance(root, Node), f"Expected a Node, not '{type(root)}'."
+        self.root = root
+        self._version = None
+        _watch_versions(self)
+        self.rebuild()
+
+    def rebuild(self):
+        """
+        Re-compute the index from the current state of the tree.
+        """
+        self._nodes = []
+        self._position = {}
+        self._end = []
+        self._parent = []
+        self._depth = []
+        self._buckets = {}
+        self._classes = {}
+        stack = [(self.root, -1, self.root.depth)]
+        while stack:
+            node, parent, depth = stack.pop()
+            position = len(self._nodes)
+            self._nodes.append(node)
+            self._position[id(node)] = position
+            self._end.append(position)
+            self._parent.append(parent)
+            self._depth.append(depth)
+            self._buckets.setdefault(type(node), []).append(position)
+            stack.extend(
+                (child, position, depth + 1)
+                for child in reversed(node.children)
+            )
+
+        # Children are numbered after their parents, so a reverse sweep gives
+        # the last pre-order number within each subtree
+        for position in range(len(self._nodes) - 1, 0, -1):
+            parent = self._parent[position]
+            self._end[parent] = max(self._end[parent], self._end[position])
+        self._version = tree_version(self.root)
+        _count_visits(len(self._nodes))
+
+    @property
+    def stale(self):
+        """
+        :returns: ``True`` if the tree has changed since the index was built.
+        :rtype: :py:class:`bool`
+        """
+        return self._version != tree_version(self.root)
+
+    def refresh(self):
+        """
+        Rebuild the index if the tree has changed since it was last built.
+        """
+        if self.stale:
+            self.rebuild()
+
+    def __contains__(self, node):
+        self.refresh()
+        position = self._position.get(id(node))
+        return position is not None and self._nodes[position] is node
+
+    def __len__(self):
+        self.refresh()
+        return len(self._nodes)
+
+    def position(self, node):
+        """
+        Get the pre-order number of a Node within the index.
+
+        :arg node: the Node to look up.
+        :type node: :py:class:`Node`
+
+        :returns: the pre-order number.
+        :rtype: :py:class:`int`
+
+        :raises KeyError: if the Node is not in the indexed tree.
+        """
+        if node not in self:
+            raise KeyError(f"Node '{node.node_str(False)}' is not indexed.")
+        return self._position[id(node)]
+
+    def depth(self, node):
+        """
+        Get the depth of a Node, as would be returned by :attr:`Node.depth`.
+
+        :arg node: the Node to look up.
+        :type node: :py:class:`Node`
+
+        :returns: the depth of the Node.
+        :rtype: :py:class:`int`
+        """
+        return self._depth[self.position(node)]
+
+    def is_ancestor(self, ancestor, node, inclusive=False):
+        """
+        Determine whether one Node is an ancestor of another by comparing their
+        pre-order intervals.
+
+        :arg ancestor: the candidate ancestor Node.
+        :type ancestor: :py:class:`Node`
+        :arg node: the Node whose ancestry is queried.
+        :type node: :py:class:`Node`
+        :kwarg inclusive: if ``True``, a Node is its own ancestor.
+        :type inclusive: :py:class:`bool`
+
+        :returns: ``True`` if ``ancestor`` is an ancestor of ``node``, else
+            ``False``.
+        :rtype: :py:class:`bool`
+        """
+        start = self.position(ancestor)
+        position = self.position(node)
+        if position == start:
+            return inclusive
+        return start < position <= self._end[start]
+
+    def _matching_classes(self, node_type):
+        """
+        Get the Node classes present in the tree which match a query type.
+
+        :arg node_type: the type(s) of node to search for.
+        :type node_type: :py:class:`type` or :py:class:`tuple`
+
+        :returns: the matching classes.
+        :rtype: :py:class:`list`
+        """
+        classes = self._classes.get(node_type)
+        if classes is None:
+            classes = [
+                cls for cls in self._buckets if issubclass(cls, node_type)
+            ]
+            self._classes[node_type] = classes
+        return classes
+
+    def descendents(
+        self, node, node_type=Node, inclusive=False, exclude=(), depth=None
+    ):
+        """
+        Get all descendents of a Node with a given type, in the same order as
+        :meth:`Node.walk`.
+
+        :arg node: the Node to search for descendents of.
+        :type node: :py:class:`Node`
+        :kwarg node_type: the type of node to search for.
+        :type node_type: :py:class:`type`
+        :kwarg inclusive: if ``True``, the current node is included.
+        :type inclusive: :py:class:`bool`
+        :kwarg exclude: type(s) of node to exclude.
+        :type exclude: :py:class:`bool`
+        :kwarg depth: specify a depth for the descendents to have.
+        :type depth: :py:class:`int`
+
+        :returns: list of descendents according to specifications.
+        :rtype: :py:class:`list`
+        """
+        start = self.position(node)
+        end = self._end[start]
+        if not inclusive:
+            start += 1
+        classes = self._matching_classes(node_type)
+        positions = []
+        for cls in classes:
+            bucket = self._buckets[cls]
+            first = bisect_left(bucket, start)
+            last = bisect_right(bucket, end)
+            positions.extend(bucket[first:last])
+        if len(classes) > 1:
+            positions.sort()
+        return [
+            self._nodes[position]
+            for position in positions
+            if (depth is None or self._depth[position] == depth)
+            and not isinstance(self._nodes[position], exclude)
+        ]
+
+    def ancestors(
+        self, node, node_type=Node, inclusive=False, exclude=(), depth=None
+    ):
+        """
+        Get all ancestors of a Node with a given type, nearest first.
+
+        :arg node: the Node to search for ancestors of.
+        :type node: :py:class:`Node`
+        :kwarg node_type: the type of node to search for.
+        :type node_type: :py:class:`type`
+        :kwarg inclusive: if ``True``, the current node is included.
+        :type inclusive: :py:class:`bool`
+        :kwarg exclude: type(s) of node to exclude.
+        :type exclude: :py:class:`bool`
+        :kwarg depth: specify a depth for the ancestors to have.
+        :type depth: :py:class:`int`
+
+        :returns: list of ancestors according to specifications.
+        :rtype: :py:class:`list`
+        """
+        position = self.position(node)
+        if not inclusive:
+            position = self._parent[position]
+        ancestors = []
+        while position >= 0:
+            ancestor = self._nodes[position]
+            if (
+                isinstance(ancestor, node_type)
+                and not isinstance(ancestor, exclude)
+                and (depth is None or self._depth[position] == depth)
+            ):
+                ancestors.append(ancestor)
+            position = self._parent[position]
+        if self.root.parent is not None:
+            # Continue above the indexed tree without the index
+            ancestor = self.root.ancestor(node_type, excluding=exclude)
+            while ancestor is not None:
+                if depth is None or ancestor.depth == depth:
+                    ancestors.append(ancestor)
+                ancestor = ancestor.ancestor(node_type, excluding=exclude)
+        return ancestors
+
+
+def _registered_index(node):
+    """
+    :returns: the index registered for the tree beneath a Node, if any.
+    :rtype: :py:class:`TraversalIndex` or :py:class:`NoneType`
+    """
+    index = vars(node).get("_psytran_index")
+    if index is not None and index.root is node and index in _indices:
+        return index
+    return None
+
+
+def build_index(root):
+    """
+    Build a :class:`TraversalIndex` for the tree beneath a Node and register it
+    so that the functions in :py:mod:`psytran.family` consult it.
+
+    If an index already exists for the Node then it is returned. The index is
+    stored on the Node, so it is released together with the tree.
+
+    :arg root: the root Node of the tree to index, e.g., a Schedule.
+    :type root: :py:class:`Node`
+
+    :returns: the index.
+    :rtype: :py:class:`TraversalIndex`
+    """
+    index = _registered_index(root)
+    if index is None:
+        index = TraversalIndex(root)
+        root._psytran_index = index
+        _indices.add(index)
+    return index
+
+
+def drop_index(root):
+    """
+    Deregister the :class:`TraversalIndex` for the tree beneath a Node, if one
+    exists.
+
+    :arg root: the root Node of the indexed tree.
+    :type root: :py:class:`Node`
+    """
+    index = _registered_index(root)
+    if index is not None:
+        _indices.discard(index)
+        del root._psytran_index
+
+
+def get_index(node):
+    """
+    Get a registered :class:`TraversalIndex` which contains a Node.
+
+    The index is found by following the ancestors of the Node, which are
+    checked for a registered index, nearest first.
+
+    :arg node: the Node to look up.
+    :type node: :py:class:`Node`
+
+    :returns: the index, or ``None`` if the Node has not been indexed.
+    :rtype: :py:class:`TraversalIndex` or :py:class:`NoneType`
+    """
+    if not _indices:
+        return None
+    while node is not None:
+        index = _registered_index(node)
+        if index is not None:
+            return index
+        node = node.parent
+    return None
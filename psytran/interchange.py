@@ -0,0 +1,246 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+r"""
+This module provides functions for analysing the order in which perfectly
+nested :py:class:`Loop`\s access memory and for interchanging them so that the
+contiguous dimension of arrays is traversed by the inner-most Loop.
+
+Fortran arrays are stored in column-major order, so consecutive iterations of
+the inner-most Loop access adjacent memory when they vary the first index.
+"""
+
+from psyclone.psyir import nodes
+from psyclone.psyir.transformations import LoopSwapTrans, TransformationError
+from psytran.loop import (
+    _check_loop,
+    get_perfectly_nested_loops,
+    is_parallelisable,
+    is_perfectly_nested,
+    loop2nest,
+)
+from psytran.profiling import profiled
+
+__all__ = [
+    "AccessOrder",
+    "analyse_access_order",
+    "make_innermost",
+    "fix_access_order",
+]
+
+
+class AccessOrder:
+    """
+    Record of the memory access order of a single perfectly nested Loop.
+
+    :ivar loop: the outer-most Loop of the perfect nest.
+    :ivar variables: the names of the Loop variables, from outer-most to
+        inner-most, before any interchange.
+    :ivar weights: the number of array accesses whose first index refers to
+        each Loop variable.
+    :ivar contiguous: the name of the Loop variable which indexes the
+        contiguous dimension of the dominant array accesses, if any.
+    :ivar interchanged: ``True`` if the Loops were interchanged.
+    :ivar reason: why the Loops could not be interchanged, if they could not.
+    """
+
+    __slots__ = (
+        "loop",
+        "variables",
+        "weights",
+        "contiguous",
+        "interchanged",
+        "reason",
+    )
+
+    def __init__(
+        self,
+        loop,
+        variables,
+        weights,
+        contiguous=None,
+        interchanged=False,
+        reason=None,
+    ):
+        """
+        :arg loop: the outer-most Loop of the perfect nest.
+        :type loop: :py:class:`Loop`
+        :arg variables: the names of the Loop variables, outer-most first.
+        :type variables: :py:class:`list`
+        :arg weights: the number of contiguous accesses per Loop variable.
+        :type weights: :py:class:`dict`
+        :kwarg contiguous: the Loop variable of the contiguous dimension.
+        :type contiguous: :py:class:`str`
+        :kwarg interchanged: whether the Loops were interchanged.
+        :type interchanged: :py:class:`bool`
+        :kwarg reason: why the Loops could not be interchanged.
+        :type reason: :py:class:`str`
+        """
+        self.loop = loop
+        self.variables = variables
+        self.weights = weights
+        self.contiguous = contiguous
+        self.interchanged = interchanged
+        self.reason = reason
+
+    @property
+    def is_contiguous(self):
+        """
+        :returns: ``True`` if the inner-most Loop of the nest indexes the
+            contiguous dimension of the dominant array accesses, or if there
+            are no such accesses, else ``False``.
+        :rtype: :py:class:`bool`
+        """
+        if self.contiguous is None:
+            return True
+        return loop2nest(self.loop)[-1].variable.name == self.contiguous
+
+    def __repr__(self):
+        return (
+            f"AccessOrder(loop={self.loop.variable.name!r},"
+            f" variables={self.variables!r},"
+            f" contiguous={self.contiguous!r},"
+            f" interchanged={self.interchanged}, reason={self.reason!r})"
+        )
+
+
+@profiled
+def analyse_access_order(loop):
+    """
+    Determine which variable of a perfectly nested Loop indexes the contiguous
+    dimension of the dominant array accesses in its body.
+
+    Each array access whose first index refers to a Loop variable of the nest
+    counts towards that variable. The variable with the most accesses is
+    dominant, with ties resolved in favour of the deeper Loop.
+
+    :arg loop: the outer-most Loop of the nest.
+    :type loop: :py:class:`Loop`
+
+    :returns: the access order of the nest.
+    :rtype: :py:class:`AccessOrder`
+
+    :raises TypeError: if the loop argument is not a Loop Node.
+    :raises ValueError: if the loop is not perfectly nested.
+    """
+    _check_loop(loop)
+    if not is_perfectly_nested(loop):
+        raise ValueError(
+            "analyse_access_order can only be applied to perfectly nested"
+            " loops."
+        )
+    nest = loop2nest(loop)
+    symbols = [inner.variable for inner in nest]
+    weights = {symbol.name: 0 for symbol in symbols}
+    for array in nest[-1].loop_body.walk(nodes.ArrayReference):
+        first = array.indices[0]
+        if isinstance(first, nodes.Range):
+            continue
+        referenced = {ref.symbol.name for ref in first.walk(nodes.Reference)}
+        for symbol in symbols:
+            if symbol.name in referenced:
+                weights[symbol.name] += 1
+
+    # Prefer deeper Loops in the event of a tie so that nests which are
+    # already in a suitable order are left unchanged
+    contiguous = None
+    for symbol in reversed(symbols):
+        count = weights[symbol.name]
+        if count > 0 and (contiguous is None or count > weights[contiguous]):
+            contiguous = symbol.name
+    return AccessOrder(
+        loop, [symbol.name for symbol in symbols], weights, contiguous
+    )
+
+
+@profiled
+def make_innermost(loop):
+    """
+    Interchange the Loops of a perfect nest so that a given Loop becomes the
+    inner-most, keeping the relative order of the others.
+
+    The interchange is only applied if it is legal, i.e., if the iterations of
+    the Loop are independent, in the sense of :func:`is_parallelisable`, and
+    if the bounds of the Loops nested within it do not depend on its variable.
+
+    :arg loop: the Loop to move.
+    :type loop: :py:class:`Loop`
+
+    :returns: the Loop which now lies in the original position of the given
+        Loop.
+    :rtype: :py:class:`Loop`
+
+    :raises TypeError: if the loop argument is not a Loop Node.
+    :raises ValueError: if the Loops nested within the given Loop are not
+        perfectly nested, or the interchange is not legal, in which case the
+        nest is left unchanged.
+    """
+    _check_loop(loop)
+    if not is_perfectly_nested(loop):
+        raise ValueError(
+            "make_innermost can only be applied to perfectly nested loops."
+        )
+    nest = loop2nest(loop)
+    if len(nest) == 1:
+        return loop
+    name = loop.variable.name
+    if not is_parallelisable(loop):
+        raise ValueError(f"Iterations of loop '{name}' are not independent.")
+    for inner in nest[1:]:
+        for bound in (inner.start_expr, inner.stop_expr, inner.step_expr):
+            for ref in bound.walk(nodes.Reference):
+                if ref.symbol is loop.variable:
+                    raise ValueError(
+                        f"Bounds of loop '{inner.variable.name}' depend on"
+                        f" loop '{name}'."
+                    )
+    # Each swap is validated as it is applied, since the Loop it is swapped
+    # with differs at each level, and any swaps made are undone on failure
+    trans = LoopSwapTrans()
+    swapped = 0
+    try:
+        for _ in nest[1:]:
+            trans.apply(loop)
+            swapped += 1
+    except TransformationError as err:
+        for _ in range(swapped):
+            trans.apply(loop.parent.parent)
+        raise ValueError(
+            f"Loop '{name}' cannot be interchanged: {err.value}"
+        ) from err
+    return nest[1]
+
+
+@profiled
+def fix_access_order(schedule):
+    """
+    Analyse the access order of each perfectly nested Loop in a Schedule and
+    interchange its Loops, where legal, so that the inner-most Loop indexes
+    the contiguous dimension of the dominant array accesses.
+
+    :arg schedule: the Schedule to transform.
+    :type schedule: :py:class:`Schedule`
+
+    :returns: the access order of each perfect nest, recording whether its
+        Loops were interchanged and why not, if they could not be.
+    :rtype: :py:class:`list`
+    """
+    orders = []
+    for loop in get_perfectly_nested_loops(schedule):
+        order = analyse_access_order(loop)
+        orders.append(order)
+        if order.is_contiguous:
+            continue
+        nest = loop2nest(loop)
+        target = nest[order.variables.index(order.contiguous)]
+        try:
+            replacement = make_innermost(target)
+        except ValueError as err:
+            order.reason = str(err)
+            continue
+        if target is loop:
+            order.loop = replacement
+        order.interchanged = True
+    return orders
@@ -11,7 +11,9 @@ nests.
 
 from collections.abc import Iterable
 from psyclone.psyir import nodes
-from psytran.family import get_children, get_descendents
+from psytran.dependency import get_dependency_cache
+from psytran.family import get_children, get_descendents, is_ancestor
+from psytran.profiling import profiled
 
 __all__ = [
     "is_outer_loop",
@@ -21,9 +23,22 @@ __all__ = [
     "is_simple_loop",
     "is_independent",
     "is_parallelisable",
+    "max_collapse",
+    "LoopNestInfo",
+    "LoopAnalysis",
+    "analyse_loops",
 ]
 
 
+# Node types which are ignored when checking whether a nest is perfect
+_non_nest_types = (
+    nodes.literal.Literal,
+    nodes.reference.Reference,
+    nodes.Loop,
+    nodes.IntrinsicCall,
+)
+
+
 def _check_loop(node):
     """
     Check that we do indeed have a Loop Node.
@@ -37,6 +52,7 @@ def _check_loop(node):
         raise TypeError(f"Expected a Loop, not '{type(node)}'.")
 
 
+@profiled
 def is_outer_loop(loop):
     """
     Determine whether a Loop is outer-most in its nest.
@@ -51,6 +67,7 @@ def is_outer_loop(loop):
     return loop.ancestor(nodes.Loop) is None
 
 
+@profiled
 def loop2nest(loop):
     """
     Given a Loop, obtain all of its descendent loops (inclusive).
@@ -65,6 +82,7 @@ def loop2nest(loop):
     return get_descendents(loop, node_type=nodes.Loop, inclusive=True)
 
 
+@profiled
 def nest2loop(loops):
     """
     Given a Loop nest, validate it and return its outer-most Loop.
@@ -76,13 +94,13 @@ def nest2loop(loops):
     :rtype: :py:class:`Loop`
     """
     outer_loop = loops[0]
-    descendents = loop2nest(outer_loop)
     for loop in loops:
         _check_loop(loop)
-        assert loop in descendents
+        assert is_ancestor(outer_loop, loop, inclusive=True)
     return outer_loop
 
 
+@profiled
 def is_perfectly_nested(outer_loop_or_subnest):
     r"""
     Determine whether a Loop (sub)nest is perfect, i.e., each level except the
@@ -100,12 +118,7 @@ def is_perfectly_nested(outer_loop_or_subnest):
     :returns: ``True`` if the Loop nest is perfect, else ``False``.
     :rtype: :py:class:`bool`
     """
-    exclude = (
-        nodes.literal.Literal,
-        nodes.reference.Reference,
-        nodes.Loop,
-        nodes.IntrinsicCall,
-    )
+    exclude = _non_nest_types
 
     # Switch for input type
     if isinstance(outer_loop_or_subnest, Iterable):
@@ -115,29 +128,18 @@ def is_perfectly_nested(outer_loop_or_subnest):
         outer_loop = outer_loop_or_subnest
         subnest = loop2nest(outer_loop)
 
-    def intersect(list1, list2):
-        r"""
-        Return the intersection of two lists. Note that we cannot use the
-        in-built set intersection functionality because PSyclone
-        :class:`Node`\s are not hashable.
-
-        :arg list1: the first list
-        :type list1: :py:class:`list`
-        :arg list2: the second list
-        :type list2: :py:class:`list`
-
-        :returns: the intersection.
-        :rtype: :py:class:`list`
-        """
-        return [item for item in list1 if item in list2]
+    # PSyclone Nodes are not hashable, so track subnest membership by identity
+    subnest_ids = {id(loop) for loop in subnest}
 
     # Check whether the subnest is perfect by checking each level in turn
     loops, non_loops = [outer_loop], []
     while len(loops) > 0:
         non_loops = get_children(loops[0], exclude=exclude)
-        loops = intersect(
-            get_children(loops[0], node_type=nodes.Loop), subnest
-        )
+        loops = [
+            loop
+            for loop in get_children(loops[0], node_type=nodes.Loop)
+            if id(loop) in subnest_ids
+        ]
 
         # Case of one loop and no non-loops: this nest level is okay
         if len(loops) == 1 and not non_loops:
@@ -147,7 +149,9 @@ def is_perfectly_nested(outer_loop_or_subnest):
         # subnest: this nest level is also okay
         if not loops:
             for node in non_loops:
-                if intersect(node.walk(nodes.Loop), subnest):
+                if any(
+                    id(loop) in subnest_ids for loop in node.walk(nodes.Loop)
+                ):
                     break
             else:
                 continue
@@ -157,6 +161,7 @@ def is_perfectly_nested(outer_loop_or_subnest):
     return True
 
 
+@profiled
 def is_simple_loop(loop):
     """
     Determine whether a Loop nest is simple, i.e., perfectly nested, with only
@@ -174,6 +179,7 @@ def is_simple_loop(loop):
     )
 
 
+@profiled
 def is_independent(loop):
     """
     Determine whether a perfectly nested Loop is independent.
@@ -203,11 +209,14 @@ def is_independent(loop):
     return True
 
 
+@profiled
 def is_parallelisable(loop):
     """
     Determine whether a Loop can be parallelised.
 
     Note: wraps the :meth:`independent_iterations` method of the Loop node.
+    Results are memoised until the Loop is modified; see
+    :func:`psytran.dependency.get_dependency_cache`.
 
     :arg loop: the Loop to query.
     :type loop: :py:class:`Loop`
@@ -215,7 +224,104 @@ def is_parallelisable(loop):
     :returns: ``True`` if the Loop nest is parallelisable, else ``False``.
     :rtype: :py:class:`bool`
     """
-    return loop.independent_iterations()
+    return get_dependency_cache().independent_iterations(loop)
+
+
+@profiled
+def max_collapse(loop):
+    """
+    Determine the largest number of Loops, starting from a given Loop, which
+    may legally be collapsed by a ``collapse`` clause.
+
+    Each collapsed Loop other than the deepest must contain only the next Loop,
+    each must be parallelisable, in the sense of :func:`is_parallelisable`,
+    and the bounds of each must not depend on the variables of the Loops
+    collapsed with it.
+
+    :arg loop: the outer-most Loop to collapse.
+    :type loop: :py:class:`Loop`
+
+    :returns: the number of Loops which may be collapsed, where a value of one
+        means that no ``collapse`` clause should be applied.
+    :rtype: :py:class:`int`
+
+    :raises TypeError: if the loop argument is not a Loop Node.
+    """
+    _check_loop(loop)
+    if not is_parallelisable(loop):
+        return 1
+    depth, variables = 1, [loop.variable]
+    while True:
+        children = loop.loop_body.children
+        if len(children) != 1 or not isinstance(children[0], nodes.Loop):
+            return depth
+        loop = children[0]
+        for bound in (loop.start_expr, loop.stop_expr, loop.step_expr):
+            for ref in bound.walk(nodes.Reference):
+                if ref.symbol in variables:
+                    return depth
+        if not is_parallelisable(loop):
+            return depth
+        depth += 1
+        variables.append(loop.variable)
+
+
+def _enclosing_loops(loops, root):
+    """
+    Find the nearest enclosing Loop of each Loop in a pre-ordered list of the
+    Loops beneath a root Node.
+
+    :arg loops: the Loops, in the order returned by :meth:`Node.walk`.
+    :type loops: :py:class:`list`
+    :arg root: the Node which the Loops were found beneath.
+    :type root: :py:class:`Node`
+
+    :returns: the position in ``loops`` of each Loop's nearest enclosing Loop,
+        or ``None`` if it is not enclosed by another Loop beneath ``root``.
+    :rtype: :py:class:`list`
+    """
+    positions = {id(loop): i for i, loop in enumerate(loops)}
+    enclosing = []
+    for loop in loops:
+        node, position = loop, None
+        while position is None and node is not root:
+            node = node.parent
+            position = positions.get(id(node))
+        enclosing.append(position)
+    return enclosing
+
+
+def _perfect_nesting(loops, enclosing):
+    """
+    Determine whether each Loop in a pre-ordered list is perfectly nested, in
+    the sense of :func:`is_perfectly_nested`, in a single bottom-up pass.
+
+    :arg loops: the Loops, in the order returned by :meth:`Node.walk`.
+    :type loops: :py:class:`list`
+    :arg enclosing: the output of :func:`_enclosing_loops` for ``loops``.
+    :type enclosing: :py:class:`list`
+
+    :returns: a flag for each Loop indicating whether it is perfectly nested.
+    :rtype: :py:class:`list`
+    """
+    has_inner = [False] * len(loops)
+    for position in enclosing:
+        if position is not None:
+            has_inner[position] = True
+    positions = {id(loop): i for i, loop in enumerate(loops)}
+    perfect = [False] * len(loops)
+
+    # Inner Loops appear after their enclosing Loops in pre-order
+    for i in range(len(loops) - 1, -1, -1):
+        inner = get_children(loops[i], node_type=nodes.Loop)
+        if not inner:
+            # Any Loops beneath must be inside a non-Loop, e.g., an IfBlock
+            perfect[i] = not has_inner[i]
+        elif len(inner) == 1 and not get_children(
+            loops[i], exclude=_non_nest_types
+        ):
+            perfect[i] = perfect[positions[id(inner[0])]]
+    return perfect
 
 
 def get_perfectly_nested_loops(schedule):
@@ -233,18 +339,285 @@ def get_perfectly_nested_loops(schedule):
                     structure.
     :rtype loops: list[:py:class:`Loop`]
     """
-    loops = []
+    loops = schedule.walk(nodes.Loop)
+    enclosing = _enclosing_loops(loops, schedule)
+    perfect = _perfect_nesting(loops, enclosing)
+
+    # Keep only those perfectly nested loops which do not lie within another
+    # perfectly nested loop
+    within_perfect = [False] * len(loops)
+    outermost = []
+    for i, loop in enumerate(loops):
+        outer = enclosing[i]
+        if outer is not None:
+            within_perfect[i] = perfect[outer] or within_perfect[outer]
+        if perfect[i] and not within_perfect[i]:
+            outermost.append(loop)
+    return outermost
+
+
+def _literal_value(expr):
+    """
+    Get the value of an integer literal expression, allowing for negation.
+
+    :arg expr: the expression to evaluate.
+    :type expr: :py:class:`Node`
+
+    :returns: the value, or ``None`` if the expression is not an integer
+        literal.
+    :rtype: :py:class:`int` or :py:class:`NoneType`
+    """
+    sign = 1
+    if (
+        isinstance(expr, nodes.UnaryOperation)
+        and expr.operator == nodes.UnaryOperation.Operator.MINUS
+    ):
+        sign, expr = -1, expr.children[0]
+    if not isinstance(expr, nodes.Literal):
+        return None
+    try:
+        return sign * int(expr.value)
+    except ValueError:
+        return None
+
+
+def _trip_count(loop):
+    """
+    Compute the number of iterations of a Loop with literal bounds.
+
+    :arg loop: the Loop to query.
+    :type loop: :py:class:`Loop`
 
-    # Test all loops in schedule to see if they are perfectly nested
-    for loop in schedule.walk(nodes.Loop):
-        if is_perfectly_nested(loop):
-            loops.append(loop)
+    :returns: the trip count, or ``None`` if any bound is not a literal.
+    :rtype: :py:class:`int` or :py:class:`NoneType`
+    """
+    start = _literal_value(loop.start_expr)
+    stop = _literal_value(loop.stop_expr)
+    step = _literal_value(loop.step_expr)
+    if None in (start, stop, step) or step == 0:
+        return None
+    return max((stop - start) // step + 1, 0)
 
-    # For each loop in the list check if loops below it are a descendent and
-    # remove them if they are
-    for top_loop in loops[:]:
-        for bottom_loop in get_descendents(top_loop):
-            if bottom_loop in loops:
-                loops.remove(bottom_loop)
 
-    return loops
+def _independence(loops, perfect):
+    """
+    Determine whether each perfectly nested Loop in a pre-ordered list is
+    independent, in the sense of :func:`is_independent`.
+
+    Each perfect nest is traversed once from its outer-most Loop, recording
+    the deepest enclosing Loop whose variable appears in the bounds of each
+    level.
+
+    :arg loops: the Loops, in the order returned by :meth:`Node.walk`.
+    :type loops: :py:class:`list`
+    :arg perfect: the output of :func:`_perfect_nesting` for ``loops``.
+    :type perfect: :py:class:`list`
+
+    :returns: a flag for each Loop indicating whether it is independent, or
+        ``None`` if it is not perfectly nested.
+    :rtype: :py:class:`list`
+    """
+    positions = {id(loop): i for i, loop in enumerate(loops)}
+    independent = [None] * len(loops)
+    for i, loop in enumerate(loops):
+        if not perfect[i] or independent[i] is not None:
+            continue
+
+        # Follow the same chain of Loops as is_independent
+        chain, variables, deepest = [], {}, []
+        while isinstance(loop, nodes.Loop):
+            references = (
+                ref
+                for bound in (loop.start_expr, loop.stop_expr, loop.step_expr)
+                for ref in bound.walk(nodes.Reference)
+            )
+            deepest.append(
+                max(
+                    (variables.get(id(ref.symbol), -1) for ref in references),
+                    default=-1,
+                )
+            )
+            variables[id(loop.variable)] = len(chain)
+            chain.append(positions[id(loop)])
+            loop = loop.loop_body.children[0]
+
+        # A Loop is dependent if a deeper level's bounds refer to its variable
+        # or to that of a Loop between them
+        referenced = -1
+        for level in range(len(chain) - 1, -1, -1):
+            independent[chain[level]] = referenced < level
+            referenced = max(referenced, deepest[level])
+    return independent
+
+
+class LoopNestInfo:
+    """
+    Record of the properties of a single Loop, as computed by
+    :func:`analyse_loops`.
+
+    :ivar loop: the Loop Node.
+    :ivar depth: the number of Loops enclosing the Loop.
+    :ivar nest: the number of the Loop nest containing the Loop, counting
+        outer-most Loops in order of appearance.
+    :ivar outer: see :func:`is_outer_loop`.
+    :ivar perfect: see :func:`is_perfectly_nested`.
+    :ivar simple: see :func:`is_simple_loop`.
+    :ivar independent: see :func:`is_independent`, or ``None`` if the Loop is
+        not perfectly nested.
+    :ivar parallelisable: see :func:`is_parallelisable`.
+    :ivar trip_count: the number of iterations if the Loop bounds are all
+        literals, else ``None``.
+    """
+
+    __slots__ = (
+        "loop",
+        "depth",
+        "nest",
+        "outer",
+        "perfect",
+        "simple",
+        "independent",
+        "parallelisable",
+        "trip_count",
+    )
+
+    def __init__(self, loop, depth, nest):
+        """
+        :arg loop: the Loop Node.
+        :type loop: :py:class:`Loop`
+        :arg depth: the number of Loops enclosing the Loop.
+        :type depth: :py:class:`int`
+        :arg nest: the number of the Loop nest containing the Loop.
+        :type nest: :py:class:`int`
+        """
+        self.loop = loop
+        self.depth = depth
+        self.nest = nest
+        self.outer = depth == 0
+        self.perfect = False
+        self.simple = False
+        self.independent = None
+        self.parallelisable = False
+        self.trip_count = None
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{name}={getattr(self, name)!r}"
+            for name in self.__slots__
+            if name != "loop"
+        )
+        return f"LoopNestInfo(loop={self.loop.variable.name!r}, {fields})"
+
+
+class LoopAnalysis:
+    """
+    Table of :class:`LoopNestInfo` records for all Loops in a Schedule, as
+    returned by :func:`analyse_loops`.
+
+    Records are iterated in the order returned by :meth:`Node.walk` and may be
+    looked up by Loop Node. The table is not updated if the Schedule is
+    subsequently modified.
+    """
+
+    def __init__(self, records):
+        """
+        :arg records: the records, in the order returned by
+            :meth:`Node.walk`.
+        :type records: :py:class:`list`
+        """
+        self._records = records
+        self._positions = {
+            id(record.loop): i for i, record in enumerate(records)
+        }
+
+    def __getitem__(self, loop):
+        """
+        :arg loop: the Loop to look up.
+        :type loop: :py:class:`Loop`
+
+        :returns: the record for the Loop.
+        :rtype: :py:class:`LoopNestInfo`
+
+        :raises KeyError: if the Loop was not analysed.
+        """
+        position = self._positions.get(id(loop))
+        if position is None or self._records[position].loop is not loop:
+            raise KeyError(f"Loop '{loop.variable.name}' was not analysed.")
+        return self._records[position]
+
+    def __contains__(self, loop):
+        position = self._positions.get(id(loop))
+        return position is not None and self._records[position].loop is loop
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def nest(self, nest):
+        """
+        Get the records for all Loops in a given nest.
+
+        :arg nest: the number of the nest.
+        :type nest: :py:class:`int`
+
+        :returns: the records, outer-most first.
+        :rtype: :py:class:`list`
+        """
+        return [record for record in self._records if record.nest == nest]
+
+
+@profiled
+def analyse_loops(schedule):
+    """
+    Compute the properties of every Loop in a Schedule in a single pass.
+
+    This gives the same results as calling :func:`is_outer_loop`,
+    :func:`is_perfectly_nested`, :func:`is_simple_loop`,
+    :func:`is_independent` and :func:`is_parallelisable` on each Loop, but
+    without re-walking each nest for every query.
+
+    :arg schedule: the Schedule to analyse.
+    :type schedule: :py:class:`Schedule`
+
+    :returns: the analysis table.
+    :rtype: :py:class:`LoopAnalysis`
+    """
+    loops = schedule.walk(nodes.Loop)
+    enclosing = _enclosing_loops(loops, schedule)
+    perfect = _perfect_nesting(loops, enclosing)
+    independent = _independence(loops, perfect)
+
+    records, num_nests = [], 0
+    inner = [None] * len(loops)
+    for i, loop in enumerate(loops):
+        outer = enclosing[i]
+        if outer is None:
+            record = LoopNestInfo(loop, 0, num_nests)
+            num_nests += 1
+        else:
+            record = LoopNestInfo(
+                loop, records[outer].depth + 1, records[outer].nest
+            )
+            inner[outer] = i
+        record.perfect = perfect[i]
+        record.independent = independent[i]
+        record.parallelisable = is_parallelisable(loop)
+        record.trip_count = _trip_count(loop)
+        records.append(record)
+
+    # A perfectly nested Loop is simple if its inner-most Loop contains only
+    # literal assignments. Note that a perfect Loop encloses at most one Loop.
+    for i in range(len(loops) - 1, -1, -1):
+        if not perfect[i]:
+            continue
+        if inner[i] is not None:
+            records[i].simple = records[inner[i]].simple
+        else:
+            records[i].simple = all(
+                isinstance(child, nodes.Assignment)
+                and child.walk(nodes.Literal)
+                for child in get_children(loops[i])
+            )
+    return LoopAnalysis(records)
@@ -0,0 +1,233 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+r"""
+This module provides an automatic parallelisation pass, which inserts OpenACC
+or OpenMP directives around the perfectly nested :py:class:`Loop`\s of a
+:py:class:`Schedule` using PSyTran's loop queries.
+"""
+
+from psyclone.psyir.transformations import ACCKernelsTrans
+from psyclone.transformations import (
+    ACCLoopTrans,
+    OMPLoopTrans,
+    OMPParallelTrans,
+)
+from psytran.cost import estimate_costs, is_worth_offloading
+from psytran.directives import (
+    apply_loop_directives,
+    apply_parallel_directives,
+)
+from psytran.loop import (
+    analyse_loops,
+    get_perfectly_nested_loops,
+    max_collapse,
+)
+from psytran.profiling import profiled
+
+__all__ = [
+    "NestDecision",
+    "ParallelisationSummary",
+    "auto_parallelise",
+]
+
+# Region and loop directives to apply for each target
+_targets = {
+    "acc": (ACCKernelsTrans, ACCLoopTrans, {}),
+    "omp": (OMPParallelTrans, OMPLoopTrans, {"omp_directive": "do"}),
+}
+
+
+def _remove_region(region):
+    """
+    Remove a region directive, putting its body back in its place.
+
+    :arg region: the region directive to remove.
+    :type region: :py:class:`RegionDirective`
+    """
+    parent, position = region.parent, region.position
+    region.detach()
+    for offset, child in enumerate(region.dir_body.pop_all_children()):
+        parent.children.insert(position + offset, child)
+
+
+class NestDecision:
+    """
+    Record of the decision made by :func:`auto_parallelise` for a single
+    perfectly nested Loop.
+
+    :ivar loop: the outer-most Loop of the perfect nest.
+    :ivar collapse: the number of Loops collapsed by the ``loop`` directive.
+    :ivar applied: ``True`` if directives were inserted for the nest.
+    :ivar reason: why directives were not inserted, if they were not.
+    """
+
+    __slots__ = ("loop", "collapse", "applied", "reason")
+
+    def __init__(self, loop, collapse=1, applied=False, reason=None):
+        """
+        :arg loop: the outer-most Loop of the perfect nest.
+        :type loop: :py:class:`Loop`
+        :kwarg collapse: the number of Loops to collapse.
+        :type collapse: :py:class:`int`
+        :kwarg applied: whether directives were inserted.
+        :type applied: :py:class:`bool`
+        :kwarg reason: why directives were not inserted.
+        :type reason: :py:class:`str`
+        """
+        self.loop = loop
+        self.collapse = collapse
+        self.applied = applied
+        self.reason = reason
+
+    def __repr__(self):
+        return (
+            f"NestDecision(loop={self.loop.variable.name!r},"
+            f" collapse={self.collapse}, applied={self.applied},"
+            f" reason={self.reason!r})"
+        )
+
+
+class ParallelisationSummary:
+    """
+    Summary of the directives inserted by :func:`auto_parallelise`.
+
+    :ivar target: the programming model targeted, ``"acc"`` or ``"omp"``.
+    :ivar decisions: a :class:`NestDecision` for each perfect nest considered,
+        in order of appearance.
+    """
+
+    def __init__(self, target, decisions):
+        """
+        :arg target: the programming model targeted.
+        :type target: :py:class:`str`
+        :arg decisions: the decision for each perfect nest considered.
+        :type decisions: :py:class:`list`
+        """
+        self.target = target
+        self.decisions = decisions
+
+    @property
+    def parallelised(self):
+        """
+        :returns: the decisions for nests which had directives inserted.
+        :rtype: :py:class:`list`
+        """
+        return [decision for decision in self.decisions if decision.applied]
+
+    @property
+    def skipped(self):
+        """
+        :returns: the decisions for nests which were left unchanged.
+        :rtype: :py:class:`list`
+        """
+        return [
+            decision for decision in self.decisions if not decision.applied
+        ]
+
+    def __repr__(self):
+        return (
+            f"ParallelisationSummary(target={self.target!r},"
+            f" parallelised={len(self.parallelised)},"
+            f" skipped={len(self.skipped)})"
+        )
+
+
+@profiled
+def auto_parallelise(
+    schedule, target="acc", collapse=True, options=None, min_work=None
+):
+    """
+    Insert directives around the outer-most perfectly nested Loops of a
+    Schedule whose iterations are independent.
+
+    For the ``"acc"`` target, each such nest is wrapped in a ``kernels``
+    region and given a ``loop`` directive. For the ``"omp"`` target, a
+    ``parallel`` region and a ``do`` directive are used instead. The Schedule
+    is analysed once, with :func:`psytran.loop.analyse_loops`, and all
+    decisions are made from that analysis before any directives are applied.
+    If a ``loop`` directive cannot be applied to a nest then its region is
+    removed again, so that the nest is not executed redundantly by every
+    thread, and the failure is recorded in the summary.
+
+    If a minimum amount of work is given then nests whose work, as estimated
+    by :func:`psytran.cost.estimate_costs`, falls below it are left unchanged,
+    since offloading them would not pay for the overhead of launching a
+    kernel. Nests whose trip counts cannot be determined statically are
+    always considered.
+
+    :arg schedule: the Schedule to transform.
+    :type schedule: :py:class:`Schedule`
+    :kwarg target: the programming model to target, ``"acc"`` or ``"omp"``.
+    :type target: :py:class:`str`
+    :kwarg collapse: if ``True``, collapse as many Loops of each nest as
+        possible, as determined by :func:`psytran.loop.max_collapse`.
+    :type collapse: :py:class:`bool`
+    :kwarg options: a dictionary of additional clause options for the
+        ``loop`` directives.
+    :type options: :py:class:`dict`
+    :kwarg min_work: the minimum estimated number of operations for a nest to
+        be parallelised, e.g.,
+        :data:`psytran.cost.default_launch_overhead`.
+    :type min_work: :py:class:`int`
+
+    :returns: a summary of the directives inserted.
+    :rtype: :py:class:`ParallelisationSummary`
+
+    :raises ValueError: if the target is not supported.
+    :raises TypeError: if the options argument is not a dictionary.
+    """
+    if target not in _targets:
+        raise ValueError(
+            f"Unsupported target '{target}', expected one of"
+            f" {sorted(_targets)}."
+        )
+    if options is None:
+        options = {}
+    if not isinstance(options, dict):
+        raise TypeError(f"Expected a dict, not '{type(options)}'.")
+    region_cls, loop_cls, loop_kwargs = _targets[target]
+
+    # Make all decisions before modifying the tree
+    analysis = analyse_loops(schedule)
+    costs = estimate_costs(schedule) if min_work is not None else None
+    decisions = []
+    for loop in get_perfectly_nested_loops(schedule):
+        decision = NestDecision(loop)
+        decisions.append(decision)
+        if not analysis[loop].parallelisable:
+            decision.reason = "loop iterations are not independent"
+        elif costs is not None and not is_worth_offloading(
+            costs[loop], launch_overhead=min_work
+        ):
+            decision.reason = "estimated work is below the minimum"
+        elif collapse:
+            decision.collapse = max_collapse(loop)
+    candidates = [decision for decision in decisions if not decision.reason]
+
+    # Insert the regions, then the loop directives, grouped by collapse depth
+    regions = apply_parallel_directives(
+        [decision.loop for decision in candidates], region_cls
+    )
+    batches = {}
+    for decision, region in zip(candidates, regions):
+        if region:
+            batches.setdefault(decision.collapse, []).append(decision)
+        else:
+            decision.reason = str(region.error)
+    directive = loop_cls(**loop_kwargs)
+    for depth, batch in batches.items():
+        loop_options = dict(options)
+        if depth > 1:
+            loop_options["collapse"] = depth
+        results = apply_loop_directives(
+            [decision.loop for decision in batch], directive, loop_options
+        )
+        for decision, result in zip(batch, results):
+            decision.applied = result.applied
+            if not result:
+                decision.reason = str(result.error)
+                _remove_region(decision.loop.parent.parent)
+    return ParallelisationSummary(target, decisions)
@@ -0,0 +1,380 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+r"""
+This module provides opt-in profiling of the public PSyTran API.
+
+While profiling is enabled, each call to a public PSyTran function records its
+wall-clock time, split into time spent in the function itself and in other
+profiled functions that it calls, together with the number of
+:py:class:`Node`\s visited. Nodes visited are counted by PSyTran's own
+traversals, i.e., the walkers in :py:mod:`psytran.family` and the building of
+a :class:`psytran.index.TraversalIndex` or
+:class:`psytran.directives.DirectiveMap`, so walks of the tree made by
+PSyclone itself are not included. PSyclone's classes are never modified. When
+profiling is disabled, each public function only pays for a single check of a
+module-level variable.
+
+For example:
+
+.. code-block:: python
+
+    with profile() as profiler:
+        apply_transformations(psyir)
+    print(profiler.report())
+    profiler.write_chrome_trace("trace.json")
+
+The resulting trace may be loaded into ``chrome://tracing`` or Perfetto.
+
+Note that for functions which return generators, such as
+:func:`psytran.family.iter_descendents`, only the creation of the generator
+is timed.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+
+__all__ = [
+    "FunctionStats",
+    "Profiler",
+    "enable_profiling",
+    "disable_profiling",
+    "get_profiler",
+    "profile",
+    "profiled",
+]
+
+# The active Profiler, or None if profiling is disabled
+_profiler = None
+
+
+def _count_visits(count):
+    """
+    Record visits of Nodes by a PSyTran traversal against the inner-most
+    profiled call in progress, if profiling is enabled.
+
+    :arg count: the number of Nodes visited.
+    :type count: :py:class:`int`
+    """
+    profiler = _profiler
+    if profiler is not None and profiler._stack and count:
+        if threading.get_ident() == profiler._thread:
+            profiler._stack[-1][3] += count
+
+
+class FunctionStats:
+    """
+    Statistics for a single profiled function.
+
+    :ivar name: the qualified name of the function.
+    :ivar calls: the number of calls.
+    :ivar total_time: the cumulative time in seconds, including calls to
+        other profiled functions.
+    :ivar self_time: the time in seconds spent in the function itself.
+    :ivar nodes: the cumulative number of Nodes visited.
+    :ivar self_nodes: the number of Nodes visited by the function itself.
+    """
+
+    __slots__ = (
+        "name",
+        "calls",
+        "total_time",
+        "self_time",
+        "nodes",
+        "self_nodes",
+    )
+
+    def __init__(self, name):
+        """
+        :arg name: the qualified name of the function.
+        :type name: :py:class:`str`
+        """
+        self.name = name
+        self.calls = 0
+        self.total_time = 0.0
+        self.self_time = 0.0
+        self.nodes = 0
+        self.self_nodes = 0
+
+    def as_dict(self):
+        """
+        :returns: the statistics as a dictionary, e.g., for JSON output.
+        :rtype: :py:class:`dict`
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return (
+            f"FunctionStats(name={self.name!r}, calls={self.calls},"
+            f" total_time={self.total_time:.6f},"
+            f" self_time={self.self_time:.6f}, nodes={self.nodes})"
+        )
+
+
+class Profiler:
+    """
+    Collector of statistics and trace events for profiled functions.
+
+    A Profiler is not thread-safe: only calls from the thread which enabled it
+    are recorded.
+    """
+
+    def __init__(self, trace=True, max_events=1000000):
+        """
+        :kwarg trace: if ``True``, record an event for each call, for export
+            in Chrome trace format.
+        :type trace: :py:class:`bool`
+        :kwarg max_events: the maximum number of trace events to record.
+            Further events are counted but dropped.
+        :type max_events: :py:class:`int`
+        """
+        self.trace = trace
+        self.max_events = max_events
+        self.stats = {}
+        self.events = []
+        self.dropped_events = 0
+        self._stack = []
+        self._active = {}
+        self._origin = time.perf_counter()
+        self._thread = threading.get_ident()
+
+    def call(self, name, func, args, kwargs):
+        """
+        Call a function, recording its statistics.
+
+        :arg name: the qualified name of the function.
+        :type name: :py:class:`str`
+        :arg func: the function.
+        :type func: :py:class:`function`
+        :arg args: its positional arguments.
+        :type args: :py:class:`tuple`
+        :arg kwargs: its keyword arguments.
+        :type kwargs: :py:class:`dict`
+
+        :returns: the return value of the function.
+        """
+        if threading.get_ident() != self._thread:
+            return func(*args, **kwargs)
+        # Each frame holds the name, start time, time in profiled callees,
+        # Nodes visited directly and Nodes visited by profiled callees
+        frame = [name, 0.0, 0.0, 0, 0]
+        self._stack.append(frame)
+        self._active[name] = self._active.get(name, 0) + 1
+        frame[1] = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            end = time.perf_counter()
+            self._stack.pop()
+            self._active[name] -= 1
+            self._record(frame, end)
+
+    def _record(self, frame, end):
+        """
+        Record the statistics for a completed call.
+        """
+        name, start, child_time, self_nodes, child_nodes = frame
+        elapsed = end - start
+        nodes = self_nodes + child_nodes
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = FunctionStats(name)
+        stats.calls += 1
+        stats.self_time += elapsed - child_time
+        stats.self_nodes += self_nodes
+        if not self._active[name]:
+            # Only count the outer-most of any recursive calls cumulatively
+            stats.total_time += elapsed
+            stats.nodes += nodes
+        if self._stack:
+            parent = self._stack[-1]
+            parent[2] += elapsed
+            parent[4] += nodes
+        if self.trace:
+            if len(self.events) < self.max_events:
+                self.events.append((name, start, elapsed, nodes))
+            else:
+                self.dropped_events += 1
+
+    def summary(self, sort="self_time"):
+        """
+        :kwarg sort: the statistic to sort by, in descending order.
+        :type sort: :py:class:`str`
+
+        :returns: the statistics for each profiled function.
+        :rtype: :py:class:`list` of :py:class:`FunctionStats`
+        """
+        return sorted(
+            self.stats.values(),
+            key=lambda stats: getattr(stats, sort),
+            reverse=True,
+        )
+
+    def report(self, sort="self_time", limit=None):
+        """
+        Format the statistics as a table.
+
+        :kwarg sort: the statistic to sort by, in descending order.
+        :type sort: :py:class:`str`
+        :kwarg limit: the maximum number of functions to include.
+        :type limit: :py:class:`int`
+
+        :returns: the table.
+        :rtype: :py:class:`str`
+        """
+        lines = [
+            f"{'function':<40s} {'calls':>8s} {'total [s]':>10s}"
+            f" {'self [s]':>10s} {'nodes':>10s}"
+        ]
+        for stats in self.summary(sort=sort)[:limit]:
+            lines.append(
+                f"{stats.name:<40s} {stats.calls:>8d}"
+                f" {stats.total_time:>10.4f} {stats.self_time:>10.4f}"
+                f" {stats.nodes:>10d}"
+            )
+        return "\n".join(lines)
+
+    def as_dict(self):
+        """
+        :returns: the statistics as a dictionary, e.g., for JSON output.
+        :rtype: :py:class:`dict`
+        """
+        return {
+            "functions": [stats.as_dict() for stats in self.summary()],
+            "events": len(self.events),
+            "dropped_events": self.dropped_events,
+        }
+
+    def write_json(self, filename):
+        """
+        Write the statistics to a JSON file.
+
+        :arg filename: the path of the file.
+        :type filename: :py:class:`str`
+        """
+        with open(filename, "w", encoding="utf-8") as json_file:
+            json.dump(self.as_dict(), json_file, indent=2)
+
+    def chrome_trace(self):
+        """
+        :returns: the recorded calls in Chrome trace event format.
+        :rtype: :py:class:`dict`
+        """
+        pid = os.getpid()
+        return {
+            "traceEvents": [
+                {
+                    "name": name.rsplit(".", 1)[-1],
+                    "cat": name.rsplit(".", 1)[0],
+                    "ph": "X",
+                    "ts": (start - self._origin) * 1e6,
+                    "dur": elapsed * 1e6,
+                    "pid": pid,
+                    "tid": self._thread,
+                    "args": {"nodes": nodes},
+                }
+                for name, start, elapsed, nodes in self.events
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def write_chrome_trace(self, filename):
+        """
+        Write the recorded calls to a file in Chrome trace event format.
+
+        :arg filename: the path of the file.
+        :type filename: :py:class:`str`
+        """
+        with open(filename, "w", encoding="utf-8") as trace_file:
+            json.dump(self.chrome_trace(), trace_file)
+
+
+def enable_profiling(profiler=None):
+    """
+    Start profiling calls to the public PSyTran API.
+
+    :kwarg profiler: the Profiler to record to. Defaults to a new one.
+    :type profiler: :py:class:`Profiler`
+
+    :returns: the active Profiler.
+    :rtype: :py:class:`Profiler`
+
+    :raises RuntimeError: if profiling is already enabled.
+    """
+    global _profiler  # pylint: disable=global-statement
+    if _profiler is not None:
+        raise RuntimeError("Profiling is already enabled.")
+    if profiler is None:
+        profiler = Profiler()
+    _profiler = profiler
+    return profiler
+
+
+def disable_profiling():
+    """
+    Stop profiling calls to the public PSyTran API.
+
+    :returns: the Profiler which was active, if any.
+    :rtype: :py:class:`Profiler` or :py:class:`NoneType`
+    """
+    global _profiler  # pylint: disable=global-statement
+    profiler = _profiler
+    _profiler = None
+    return profiler
+
+
+def get_profiler():
+    """
+    :returns: the active Profiler, or ``None`` if profiling is disabled.
+    :rtype: :py:class:`Profiler` or :py:class:`NoneType`
+    """
+    return _profiler
+
+
+class profile:  # pylint: disable=invalid-name
+    """
+    Context manager which profiles calls to the public PSyTran API within it.
+
+    Profiling is disabled on exit, even if an exception is raised. Contexts
+    may not be nested.
+    """
+
+    def __init__(self, profiler=None):
+        """
+        :kwarg profiler: the Profiler to record to. Defaults to a new one.
+        :type profiler: :py:class:`Profiler`
+        """
+        self.profiler = profiler or Profiler()
+
+    def __enter__(self):
+        return enable_profiling(self.profiler)
+
+    def __exit__(self, *exc_info):
+        disable_profiling()
+
+
+def profiled(func):
+    """
+    Decorator which records calls to a function while profiling is enabled.
+
+    :arg func: the function to profile.
+    :type func: :py:class:`function`
+
+    :returns: the wrapped function.
+    :rtype: :py:class:`function`
+    """
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = _profiler
+        if profiler is None:
+            return func(*args, **kwargs)
+        return profiler.call(name, func, args, kwargs)
+
+    return wrapper
@@ -0,0 +1,472 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+r"""
+This module provides an analysis of the dependencies between OpenACC
+``kernels`` regions, as determined by the variables they read and write, and
+the assignment of the regions to ``async`` queues, so that independent regions
+may overlap on the device.
+
+Regions are ordered with respect to one another by placing dependent regions
+on the same queue or by giving them ``wait`` clauses, which are resolved on
+the device. The host only waits, with a ``wait`` directive, before statements
+which access variables used by outstanding regions, before calls to routines
+and at the end of each block of statements, e.g., a Loop body, so that no
+asynchronous work crosses control flow.
+"""
+
+from collections import namedtuple
+from psyclone.core import VariablesAccessInfo
+from psyclone.psyir import nodes
+from psyclone.psyir.nodes import ACCKernelsDirective
+from psyclone.psyir.nodes.acc_directives import ACCStandaloneDirective
+from psytran.data import _is_array
+from psytran.profiling import profiled
+
+__all__ = [
+    "AsyncKernelsDirective",
+    "ACCWaitDirective",
+    "KernelsDependencies",
+    "default_max_queues",
+    "kernels_dependency_graph",
+    "assign_async_queues",
+]
+
+# Default number of async queues to distribute independent regions between
+default_max_queues = 4
+
+KernelsDependencies = namedtuple("KernelsDependencies", ["regions", "edges"])
+KernelsDependencies.__doc__ = """
+Dependency graph between kernels regions.
+
+:ivar regions: the kernels regions, in the order returned by
+    :meth:`Node.walk`.
+:ivar edges: pairs of indices ``(i, j)`` into the regions, with ``i < j``,
+    such that region ``j`` must not start before region ``i`` has finished.
+"""
+
+
+def _queue_list(queues):
+    """
+    Format a list of queues for a clause.
+    """
+    return ", ".join(str(queue) for queue in queues)
+
+
+class AsyncKernelsDirective(ACCKernelsDirective):
+    """
+    OpenACC ``kernels`` directive with optional ``async`` and ``wait`` clauses.
+    """
+
+    def __init__(
+        self,
+        children=None,
+        parent=None,
+        default_present=True,
+        async_queue=None,
+        wait_queues=None,
+    ):
+        """
+        :kwarg children: the Nodes to enclose in the region.
+        :type children: :py:class:`list` of :py:class:`Node`
+        :kwarg parent: the parent of the directive.
+        :type parent: :py:class:`Node`
+        :kwarg default_present: whether to add a ``default(present)`` clause.
+        :type default_present: :py:class:`bool`
+        :kwarg async_queue: the queue to launch the region on, or ``None`` for
+            it to be synchronous.
+        :type async_queue: :py:class:`int`
+        :kwarg wait_queues: the queues whose work must finish before the region
+            starts.
+        :type wait_queues: :py:class:`list` of :py:class:`int`
+        """
+        super().__init__(
+            children=children, parent=parent, default_present=default_present
+        )
+        self._async_queue = async_queue
+        self._wait_queues = sorted(wait_queues or [])
+
+    def __eq__(self, other):
+        is_eq = super().__eq__(other)
+        return (
+            is_eq
+            and self.async_queue == other.async_queue
+            and self.wait_queues == other.wait_queues
+        )
+
+    @property
+    def async_queue(self):
+        """
+        :returns: the queue the region is launched on, or ``None`` if it is
+            synchronous.
+        :rtype: :py:class:`int`
+        """
+        return self._async_queue
+
+    @property
+    def wait_queues(self):
+        """
+        :returns: the queues whose work must finish before the region starts.
+        :rtype: :py:class:`list` of :py:class:`int`
+        """
+        return list(self._wait_queues)
+
+    def begin_string(self):
+        """
+        :returns: the beginning of the directive, with its clauses.
+        :rtype: :py:class:`str`
+        """
+        result = super().begin_string()
+        if self._async_queue is not None:
+            result += f" async({self._async_queue})"
+        if self._wait_queues:
+            result += f" wait({_queue_list(self._wait_queues)})"
+        return result
+
+
+class ACCWaitDirective(ACCStandaloneDirective):
+    """
+    OpenACC ``wait`` directive, which blocks the host until the work on the
+    given queues has finished.
+    """
+
+    def __init__(self, queues=None, parent=None):
+        """
+        :kwarg queues: the queues to wait for, or ``None`` for all queues.
+        :type queues: :py:class:`list` of :py:class:`int`
+        :kwarg parent: the parent of the directive.
+        :type parent: :py:class:`Node`
+        """
+        super().__init__(parent=parent)
+        self._queues = sorted(queues or [])
+
+    def __eq__(self, other):
+        return super().__eq__(other) and self.queues == other.queues
+
+    @property
+    def queues(self):
+        """
+        :returns: the queues waited for, or an empty list for all queues.
+        :rtype: :py:class:`list` of :py:class:`int`
+        """
+        return list(self._queues)
+
+    def begin_string(self):
+        """
+        :returns: the text of the directive.
+        :rtype: :py:class:`str`
+        """
+        if self._queues:
+            return f"acc wait({_queue_list(self._queues)})"
+        return "acc wait"
+
+
+def _accesses(node):
+    """
+    Get the names of the variables read and written beneath a Node, other
+    than the variables of Loops beneath it, along with whether any scalar is
+    written.
+    """
+    loop_variables = {loop.variable.name for loop in node.walk(nodes.Loop)}
+    reads, writes, scalar_write = set(), set(), False
+    var_info = VariablesAccessInfo(node)
+    for sig in var_info.all_signatures:
+        info = var_info[sig]
+        name = sig.var_name
+        if not info.has_data_access() or name in loop_variables:
+            continue
+        if info.is_read():
+            reads.add(name)
+        if info.is_written():
+            writes.add(name)
+            access = info.all_accesses[0].node
+            if not sig.is_structure and not _is_array(
+                getattr(access, "symbol", None), access
+            ):
+                scalar_write = True
+    return reads, writes, scalar_write
+
+
+def _conflict(accesses1, accesses2):
+    """
+    Determine whether two sets of accesses conflict, i.e., whether either
+    writes a variable accessed by the other.
+    """
+    reads1, writes1 = accesses1[0], accesses1[1]
+    reads2, writes2 = accesses2[0], accesses2[1]
+    return bool(writes1 & (reads2 | writes2) or reads1 & writes2)
+
+
+@profiled
+def kernels_dependency_graph(node):
+    """
+    Build the dependency graph between the kernels regions beneath a Node.
+
+    One region depends on an earlier one if either writes a variable which
+    the other reads or writes, as determined by PSyclone's
+    :class:`VariablesAccessInfo`. The variables of Loops within the regions
+    are not counted, since they are private to each region.
+
+    :arg node: the Node to analyse, e.g., a Routine.
+    :type node: :py:class:`Node`
+
+    :returns: the regions and the dependencies between them.
+    :rtype: :py:class:`KernelsDependencies`
+    """
+    assert isinstance(
+        node, nodes.Node
+    ), f"Expected a Node, not '{type(node)}'."
+    return _dependency_graph(node)[0]
+
+
+def _dependency_graph(node):
+    """
+    Build the dependency graph between the kernels regions beneath a Node, as
+    for :func:`kernels_dependency_graph`, along with the accesses of each
+    region.
+    """
+    regions = node.walk(ACCKernelsDirective)
+    accesses = [_accesses(region) for region in regions]
+    edges = [
+        (i, j)
+        for j in range(len(regions))
+        for i in range(j)
+        if _conflict(accesses[i], accesses[j])
+    ]
+    return KernelsDependencies(regions, edges), accesses
+
+
+class _QueueState:
+    """
+    Outstanding asynchronous regions within a block of statements, and the
+    ordering between the queues they were launched on.
+    """
+
+    def __init__(self, max_queues):
+        self.max_queues = max_queues
+        # Outstanding regions, as (sequence number, queue, accesses, index in
+        # the dependency graph)
+        self.pending = []
+        # Sequence number of the last region launched on each queue
+        self.last = {}
+        # For each queue, the sequence number of the last region on each other
+        # queue which its later work is ordered after
+        self.after = {}
+        self.count = 0
+
+    def ordered(self, queue, region):
+        """
+        Whether later work on a queue is ordered after a pending region.
+        """
+        seq, other = region[:2]
+        return other == queue or self.after.get(queue, {}).get(other, 0) >= seq
+
+    def conflicts(self, accesses):
+        """
+        Get the pending regions which conflict with some accesses.
+        """
+        return [
+            region for region in self.pending if _conflict(region[2], accesses)
+        ]
+
+    def dependencies(self, predecessors):
+        """
+        Get the pending regions among the predecessors of a region in the
+        dependency graph.
+        """
+        return [region for region in self.pending if region[3] in predecessors]
+
+    def choose(self, dependencies):
+        """
+        Choose a queue for a region with some dependencies, returning the
+        queue and the queues it must wait for.
+        """
+        queues = sorted(self.last)
+        if len(queues) < self.max_queues:
+            queues.append(len(queues) + 1)
+        dependency_queues = {region[1] for region in dependencies}
+
+        def key(queue):
+            waits = {
+                region[1]
+                for region in dependencies
+                if not self.ordered(queue, region)
+            }
+            return (
+                len(waits),
+                queue not in dependency_queues,
+                self.last.get(queue, 0),
+                queue,
+            )
+
+        queue = min(queues, key=key)
+        waits = {
+            region[1]
+            for region in dependencies
+            if not self.ordered(queue, region)
+        }
+        return queue, sorted(waits)
+
+    def launch(self, queue, waits, accesses, index):
+        """
+        Record the launch of a region on a queue, after waiting for others.
+        """
+        self.count += 1
+        after = self.after.setdefault(queue, {})
+        for other in waits:
+            after[other] = max(after.get(other, 0), self.last[other])
+            for third, seq in self.after.get(other, {}).items():
+                after[third] = max(after.get(third, 0), seq)
+        self.last[queue] = self.count
+        self.pending.append((self.count, queue, accesses, index))
+
+    def finish(self, queues):
+        """
+        Record that the host has waited for some queues.
+        """
+        self.pending = [
+            region for region in self.pending if region[1] not in queues
+        ]
+
+    def outstanding(self):
+        """
+        Get the queues with outstanding regions.
+        """
+        return sorted({region[1] for region in self.pending})
+
+
+def _is_barrier(node):
+    """
+    Determine whether a Node must not be reached with outstanding regions,
+    since it may leave the block or access variables which are not visible to
+    the analysis.
+    """
+    for descendent in node.walk((nodes.Return, nodes.CodeBlock, nodes.Call)):
+        if not isinstance(descendent, nodes.IntrinsicCall):
+            return True
+    return False
+
+
+def _plan(schedule, graph, max_queues, launches, waits):
+    """
+    Decide the queue of each kernels region which is a child of a Schedule,
+    and of those within the Schedules of its children, along with the ``wait``
+    directives to insert.
+
+    :arg schedule: the Schedule to plan.
+    :arg graph: the index, predecessors in the dependency graph and accesses
+        of each region, keyed by the id of the region.
+    :arg max_queues: the number of queues to use.
+    :arg launches: list to append ``(region, queue, waits)`` tuples to.
+    :arg waits: list to append ``(schedule, position, queues)`` tuples to,
+        where the position is a Node to insert before or ``None`` for the end
+        of the Schedule.
+    """
+    state = _QueueState(max_queues)
+    for child in schedule.children:
+        if isinstance(child, ACCKernelsDirective):
+            index, predecessors, accesses = graph[id(child)]
+            dependencies = state.dependencies(predecessors)
+            if accesses[2]:
+                # Scalar results are needed on the host, so keep synchronous
+                queues = sorted({region[1] for region in dependencies})
+                launches.append((child, None, queues))
+                state.finish(queues)
+                continue
+            queue, queues = state.choose(dependencies)
+            launches.append((child, queue, queues))
+            state.launch(queue, queues, accesses, index)
+            continue
+
+        for sub in child.children:
+            if isinstance(sub, nodes.Schedule):
+                _plan(sub, graph, max_queues, launches, waits)
+        if _is_barrier(child):
+            queues = state.outstanding()
+        else:
+            conflicts = state.conflicts(_accesses(child))
+            queues = sorted({region[1] for region in conflicts})
+        if queues:
+            waits.append((schedule, child, queues))
+            state.finish(queues)
+    if state.outstanding():
+        waits.append((schedule, None, state.outstanding()))
+
+
+@profiled
+def assign_async_queues(node, max_queues=default_max_queues):
+    """
+    Launch the kernels regions beneath a Node asynchronously, distributing
+    independent regions between queues and inserting the ``wait`` clauses and
+    directives needed to respect the dependencies of
+    :func:`kernels_dependency_graph`.
+
+    Each region is placed on the queue which needs the fewest ``wait`` clauses
+    for it to follow the outstanding regions it depends on, according to the
+    edges of the graph, preferring the queue of one of those regions, then an
+    unused queue, then the least recently used queue.
+    Regions which write scalars are left synchronous, since their results are
+    needed on the host, but may still wait for queues on the device.
+
+    The host waits for the queues of outstanding regions before any statement
+    which accesses their variables, before calls to routines, ``RETURN``
+    statements and code blocks, and at the end of each block of statements.
+    Each kernels region is replaced by an :class:`AsyncKernelsDirective`.
+
+    :arg node: the Node to transform, e.g., a Routine.
+    :type node: :py:class:`Node`
+    :kwarg max_queues: the number of queues to use.
+    :type max_queues: :py:class:`int`
+
+    :returns: the kernels regions, in order.
+    :rtype: :py:class:`list` of :py:class:`AsyncKernelsDirective`
+
+    :raises ValueError: if the number of queues is not a positive integer.
+    """
+    assert isinstance(
+        node, nodes.Node
+    ), f"Expected a Node, not '{type(node)}'."
+    if not isinstance(max_queues, int) or max_queues < 1:
+        raise ValueError(
+            f"Expected a positive int for max_queues, not {max_queues!r}."
+        )
+    schedules = [node] if isinstance(node, nodes.Schedule) else []
+    if not schedules:
+        schedules = [
+            child
+            for child in node.children
+            if isinstance(child, nodes.Schedule)
+        ]
+
+    dependencies, accesses = _dependency_graph(node)
+    predecessors = [set() for _ in dependencies.regions]
+    for i, j in dependencies.edges:
+        predecessors[j].add(i)
+    graph = {
+        id(region): (index, predecessors[index], accesses[index])
+        for index, region in enumerate(dependencies.regions)
+    }
+
+    # Make all decisions before modifying the tree
+    launches, waits = [], []
+    for schedule in schedules:
+        _plan(schedule, graph, max_queues, launches, waits)
+
+    for schedule, child, queues in waits:
+        position = len(schedule.children) if child is None else child.position
+        schedule.children.insert(position, ACCWaitDirective(queues))
+    regions = []
+    for region, queue, queues in launches:
+        replacement = AsyncKernelsDirective(
+            default_present=region.default_present,
+            async_queue=queue,
+            wait_queues=queues,
+        )
+        replacement.dir_body.children.extend(
+            region.dir_body.pop_all_children()
+        )
+        region.replace_with(replacement)
+        regions.append(replacement)
+    return regions
@@ -0,0 +1,393 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+r"""
+This module provides a report of the directive coverage of the
+:py:class:`Loop`\s in a Schedule or in a tree of Fortran source files, e.g.,
+those generated by a porting run, which may be written as CSV or JSON.
+
+It may also be run from the command line, e.g.,
+
+.. code-block:: bash
+
+    psytran-coverage -o coverage.csv -j 64 outputs/
+"""
+
+import argparse
+import csv
+import json
+import re
+import sys
+from collections import namedtuple
+from psyclone.psyir import nodes
+from psyclone.psyir.frontend.fortran import FortranReader
+from psytran.batch import (
+    loop_directives,
+    map_sources,
+    region_directives,
+    scan_directives,
+)
+from psytran.directives import DirectiveMap, _omp_loop_directives
+from psytran.loop import analyse_loops
+from psytran.profiling import profiled
+
+__all__ = [
+    "LoopRecord",
+    "CoverageReport",
+    "coverage_report",
+    "coverage_report_files",
+]
+
+LoopRecord = namedtuple(
+    "LoopRecord",
+    [
+        "file",
+        "routine",
+        "line",
+        "variable",
+        "depth",
+        "nest",
+        "region",
+        "directive",
+        "sequential",
+        "gang",
+        "vector",
+        "collapse",
+        "collapsed",
+        "parallelisable",
+    ],
+)
+LoopRecord.__doc__ = """
+Directive coverage of a single Loop.
+
+Fields are the file and routine containing the Loop, the line number of its
+``DO`` statement (if known), its variable, its depth and nest number (as in
+:class:`psytran.loop.LoopNestInfo`), the types of its nearest enclosing
+region directive and of its ``loop`` directive (or empty strings), its
+``seq``, ``gang`` and ``vector`` clauses, its ``collapse`` clause (or
+``None``), whether it lies within a collapsed nest and whether its iterations
+are independent.
+"""
+
+
+def _line_number(loop):
+    """
+    Get the line number of the ``DO`` statement of a Loop, if it is known.
+
+    :arg loop: the Loop to query.
+    :type loop: :py:class:`Loop`
+
+    :returns: the line number, or ``None``.
+    :rtype: :py:class:`int` or :py:class:`NoneType`
+    """
+    try:
+        return loop.ast.content[0].item.span[0]
+    except (AttributeError, IndexError, TypeError):
+        return None
+
+
+def _region(regions):
+    """
+    Get the type of the nearest enclosing Directive which is not a ``loop``
+    directive.
+    """
+    for region in regions:
+        if not isinstance(
+            region, (nodes.ACCLoopDirective, *_omp_loop_directives)
+        ):
+            return type(region).__name__
+    return ""
+
+
+_collapse_clause = re.compile(r"\bcollapse\s*\(\s*(\d+)\s*\)")
+
+
+def _recover_directives(records, loops, lines):
+    """
+    Fill in the directive fields of the records for the Loops of a file from
+    the directives in its source, which are not represented in the PSyIR
+    created by the Fortran frontend.
+
+    :arg records: a record for each Loop.
+    :type records: :py:class:`list` of :py:class:`LoopRecord`
+    :arg loops: the corresponding Loops.
+    :type loops: :py:class:`list` of :py:class:`Loop`
+    :arg lines: the lines of the file.
+    :type lines: :py:class:`list` of :py:class:`str`
+
+    :returns: the updated records.
+    :rtype: :py:class:`list` of :py:class:`LoopRecord`
+    """
+    regions, directive_lines = scan_directives(lines)
+    clauses = {}
+    for loop in loops:
+        line = _line_number(loop)
+        if line is None:
+            # Directives cannot be matched to Loops without a line number
+            clauses[id(loop)] = ([], "", "", None)
+            continue
+        name, text = directive_lines.get(line, ("", ""))
+        # Enclosing regions, nearest first
+        enclosing = sorted(
+            (first, region)
+            for region, first, last, _ in regions
+            if first < line <= last
+        )
+        enclosing = [region for _, region in reversed(enclosing)]
+        if name == "acc loop" and "acc kernels" not in enclosing:
+            name, text = "", ""
+        collapse = _collapse_clause.search(text)
+        clauses[id(loop)] = (
+            enclosing,
+            name,
+            text,
+            int(collapse.group(1)) if collapse else None,
+        )
+
+    updated = []
+    for record, loop in zip(records, loops):
+        enclosing, name, text, collapse = clauses[id(loop)]
+        # Walk outwards to the nearest Loop with a collapse clause
+        collapsed, ancestor, position = False, loop, 0
+        while ancestor is not None:
+            outer = clauses.get(id(ancestor))
+            if outer is not None and outer[3] is not None:
+                collapsed = outer[3] > position
+                break
+            ancestor = ancestor.ancestor(nodes.Loop)
+            position += 1
+        acc = name == "acc loop"
+        updated.append(
+            record._replace(
+                region=region_directives[enclosing[0]] if enclosing else "",
+                directive=loop_directives.get(name, ""),
+                sequential=acc and re.search(r"\bseq\b", text) is not None,
+                gang=acc and re.search(r"\bgang\b", text) is not None,
+                vector=acc and re.search(r"\bvector\b", text) is not None,
+                collapse=collapse,
+                collapsed=collapsed,
+            )
+        )
+    return updated
+
+
+@profiled
+def coverage_report(node, filename=""):
+    """
+    Tabulate the directive coverage of all Loops beneath a Node.
+
+    :arg node: the Node to report on, e.g., a Schedule or a FileContainer.
+    :type node: :py:class:`Node`
+    :kwarg filename: the file to record the Loops as belonging to.
+    :type filename: :py:class:`str`
+
+    :returns: a record for each Loop, in the order returned by
+        :meth:`Node.walk`.
+    :rtype: :py:class:`list` of :py:class:`LoopRecord`
+    """
+    assert isinstance(
+        node, nodes.Node
+    ), f"Expected a Node, not '{type(node)}'."
+    return _coverage_records(node, analyse_loops(node), filename)
+
+
+def _coverage_records(node, analysis, filename):
+    """
+    Tabulate the directive coverage of all Loops beneath a Node from an
+    existing analysis of them.
+
+    :arg node: the Node to report on.
+    :type node: :py:class:`Node`
+    :arg analysis: the analysis of the Loops, as returned by
+        :func:`psytran.loop.analyse_loops`.
+    :type analysis: :py:class:`LoopAnalysis`
+    :arg filename: the file to record the Loops as belonging to.
+    :type filename: :py:class:`str`
+
+    :returns: a record for each Loop.
+    :rtype: :py:class:`list` of :py:class:`LoopRecord`
+    """
+    directive_map = DirectiveMap(node)
+    records = []
+    for info in analysis:
+        loop = info.loop
+        routine = loop.ancestor(nodes.Routine)
+        directives = directive_map[loop]
+        directive = directives.directive
+        records.append(
+            LoopRecord(
+                filename,
+                routine.name if routine is not None else "",
+                _line_number(loop),
+                loop.variable.name,
+                info.depth,
+                info.nest,
+                _region(directives.regions),
+                type(directive).__name__ if directive else "",
+                directives.sequential,
+                directives.gang,
+                directives.vector,
+                directives.collapse,
+                directives.collapsed,
+                info.parallelisable,
+            )
+        )
+    return records
+
+
+class CoverageReport:
+    """
+    Directive coverage of the Loops in a set of source files, as returned by
+    :func:`coverage_report_files`.
+
+    :ivar records: a :class:`LoopRecord` for each Loop.
+    :ivar errors: maps the path of each file which could not be parsed to the
+        error message.
+    """
+
+    def __init__(self, records, errors=None):
+        """
+        :arg records: a record for each Loop.
+        :type records: :py:class:`list` of :py:class:`LoopRecord`
+        :kwarg errors: the files which could not be parsed.
+        :type errors: :py:class:`dict`
+        """
+        self.records = records
+        self.errors = errors or {}
+
+    def summary(self):
+        """
+        :returns: the numbers of Loops in total, with ``loop`` directives,
+            within region directives and parallelisable but without ``loop``
+            directives, as well as the number of files which failed.
+        :rtype: :py:class:`dict`
+        """
+        return {
+            "loops": len(self.records),
+            "loop_directives": sum(bool(r.directive) for r in self.records),
+            "in_regions": sum(bool(r.region) for r in self.records),
+            "serial_parallelisable": sum(
+                r.parallelisable and not r.directive for r in self.records
+            ),
+            "failed_files": len(self.errors),
+        }
+
+    def write_csv(self, filename):
+        """
+        Write one row per Loop to a CSV file.
+
+        :arg filename: the path of the file.
+        :type filename: :py:class:`str`
+        """
+        with open(filename, "w", newline="", encoding="utf-8") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(LoopRecord._fields)
+            writer.writerows(self.records)
+
+    def write_json(self, filename):
+        """
+        Write the summary, the records and the errors to a JSON file.
+
+        :arg filename: the path of the file.
+        :type filename: :py:class:`str`
+        """
+        data = {
+            "summary": self.summary(),
+            "loops": [record._asdict() for record in self.records],
+            "errors": self.errors,
+        }
+        with open(filename, "w", encoding="utf-8") as json_file:
+            json.dump(data, json_file, indent=2)
+
+    def write(self, filename):
+        """
+        Write the report as JSON if the filename ends in ``.json``, otherwise
+        as CSV.
+
+        :arg filename: the path of the file.
+        :type filename: :py:class:`str`
+        """
+        if str(filename).endswith(".json"):
+            self.write_json(filename)
+        else:
+            self.write_csv(filename)
+
+
+def _file_report(source):
+    """
+    Parse a source file and tabulate its Loops, capturing any failure.
+
+    :returns: the records and the error message, if any.
+    """
+    try:
+        psyir = FortranReader().psyir_from_file(source)
+        analysis = analyse_loops(psyir)
+        records = _coverage_records(psyir, analysis, source)
+        if records and not psyir.walk(nodes.Directive):
+            with open(source, encoding="utf-8") as source_file:
+                lines = source_file.read().splitlines()
+            records = _recover_directives(
+                records, [info.loop for info in analysis], lines
+            )
+        return records, None
+    except Exception as error:  # pylint: disable=broad-except
+        return [], f"{type(error).__name__}: {error}"
+
+
+def coverage_report_files(paths, jobs=None):
+    """
+    Tabulate the directive coverage of all Loops in the Fortran source files
+    among a list of files and directories, parsing the files in a pool of
+    worker processes.
+
+    :arg paths: the files and directories to report on.
+    :type paths: :py:class:`list` of :py:class:`str`
+    :kwarg jobs: the number of worker processes. Defaults to the number of
+        CPUs. If ``1``, files are parsed in the current process.
+    :type jobs: :py:class:`int`
+
+    :returns: the report, with files in order of path.
+    :rtype: :py:class:`CoverageReport`
+    """
+    return CoverageReport(*map_sources(_file_report, paths, jobs=jobs))
+
+
+def main(arguments=None):
+    """
+    Command line interface for :func:`coverage_report_files`.
+
+    :kwarg arguments: the command line arguments. Defaults to ``sys.argv``.
+    :type arguments: :py:class:`list` of :py:class:`str`
+
+    :returns: the exit code, which is non-zero if any file failed to parse.
+    :rtype: :py:class:`int`
+    """
+    parser = argparse.ArgumentParser(
+        prog="psytran-coverage",
+        description="Report the directive coverage of Fortran loops.",
+    )
+    parser.add_argument("paths", nargs="+", help="files or directories")
+    parser.add_argument(
+        "-o", "--output", required=True, help="CSV or JSON output file"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="number of workers"
+    )
+    args = parser.parse_args(arguments)
+    report = coverage_report_files(args.paths, jobs=args.jobs)
+    report.write(args.output)
+    for source, error in report.errors.items():
+        print(f"failed: {source}\n{error}", file=sys.stderr)
+    summary = report.summary()
+    print(
+        f"{summary['loop_directives']}/{summary['loops']} loops have loop"
+        f" directives; {summary['serial_parallelisable']} parallelisable"
+        " loops do not."
+    )
+    return int(bool(report.errors))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
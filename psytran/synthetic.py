@@ -0,0 +1,249 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+r"""
+This module provides a generator of synthetic Fortran kernels, for stress
+testing and benchmarking transformation scripts on inputs of realistic size.
+
+The kernels are built from sequences of :py:class:`Loop` nests in the style of
+the snippets used in PSyTran's test suite, with features drawn at random from
+a seeded generator so that the same parameters always give the same source.
+"""
+
+import random
+
+__all__ = ["nest_structures", "generate_kernel"]
+
+# Supported structures for each Loop nest
+nest_structures = ("perfect", "before", "after", "if")
+
+
+def _check_probability(name, value):
+    """
+    Check that a keyword argument is a probability.
+
+    :arg name: the name of the keyword argument.
+    :type name: :py:class:`str`
+    :arg value: its value.
+    :type value: :py:class:`float`
+
+    :raises TypeError: if the value is not a number.
+    :raises ValueError: if the value does not lie in :math:`[0, 1]`.
+    """
+    if not isinstance(value, (int, float)):
+        raise TypeError(f"Expected a float for {name}, not '{type(value)}'.")
+    if not 0 <= value <= 1:
+        raise ValueError(f"Expected {name} to lie in [0, 1], not {value}.")
+
+
+def _check_count(name, value):
+    """
+    Check that a keyword argument is a positive integer.
+
+    :arg name: the name of the keyword argument.
+    :type name: :py:class:`str`
+    :arg value: its value.
+    :type value: :py:class:`int`
+
+    :raises TypeError: if the value is not an integer.
+    :raises ValueError: if the value is not positive.
+    """
+    if not isinstance(value, int):
+        raise TypeError(f"Expected an int for {name}, not '{type(value)}'.")
+    if value < 1:
+        raise ValueError(f"Expected {name} to be positive, not {value}.")
+
+
+class _KernelWriter:
+    """
+    Helper which writes the Loop nests of a kernel line by line.
+    """
+
+    def __init__(self, rng, depth, extent, probabilities):
+        self.rng = rng
+        self.depth = depth
+        self.extent = extent
+        self.probabilities = probabilities
+        self.lines = []
+
+    def _subscript(self, level=1):
+        """
+        Index the arrays at a given level of a nest, using the first entry
+        along each dimension corresponding to a deeper Loop.
+        """
+        return ", ".join(
+            f"i{i}" if i >= level else "1" for i in range(1, self.depth + 1)
+        )
+
+    def _chance(self, feature):
+        return self.rng.random() < self.probabilities[feature]
+
+    def _statement(self):
+        """
+        Write a statement for the body of the deepest Loop of a nest.
+        """
+        subscript = self._subscript()
+        coefficient = f"{self.rng.randint(1, 9)}.0"
+        if self._chance("calls"):
+            return f"CALL work(a({subscript}))"
+        if self._chance("array_notation"):
+            return f"c = c + {coefficient}"
+        if self._chance("index_arrays"):
+            indirect = subscript.replace("i1", "map(i1)", 1)
+            rhs = f"a({indirect}) + {coefficient} * b({subscript})"
+            return f"a({indirect}) = {rhs}"
+        rhs = f"a({subscript}) + {coefficient} * b({subscript})"
+        return f"a({subscript}) = {rhs}"
+
+    def _loop(self, level, indent, imperfect):
+        """
+        Write the Loop at a given level of a nest, where level one is deepest,
+        along with all of the Loops it contains.
+        """
+        pad = "  " * indent
+        start = "1"
+        if level < self.depth and self._chance("dependent_bounds"):
+            start = f"i{level + 1}"
+        self.lines.append(f"{pad}DO i{level} = {start}, {self.extent}")
+        structure, imperfect_level = imperfect
+        here = level == imperfect_level
+        if level == 1:
+            for _ in range(self.probabilities["body"]):
+                self.lines.append(f"{pad}  {self._statement()}")
+        elif here and structure == "if":
+            self.lines.append(f"{pad}  IF (i{level} > 1) THEN")
+            self._loop(level - 1, indent + 2, imperfect)
+            self.lines.append(f"{pad}  END IF")
+        else:
+            extra = f"{pad}  a({self._subscript(level)}) = 0.0"
+            if here and structure == "before":
+                self.lines.append(extra)
+            self._loop(level - 1, indent + 1, imperfect)
+            if here and structure == "after":
+                self.lines.append(extra)
+        self.lines.append(f"{pad}END DO")
+
+    def nest(self, structure):
+        """
+        Write a Loop nest with a given structure. The statement making the nest
+        imperfect is placed at a randomly chosen level.
+        """
+        imperfect_level = None
+        if structure != "perfect" and self.depth > 1:
+            imperfect_level = self.rng.randint(2, self.depth)
+        self._loop(self.depth, 1, (structure, imperfect_level))
+
+
+def generate_kernel(
+    num_loops=1,
+    depth=1,
+    body=1,
+    structures=("perfect",),
+    dependent_bounds=0.0,
+    index_arrays=0.0,
+    calls=0.0,
+    array_notation=0.0,
+    seed=0,
+    name="kernel",
+    extent=10,
+):
+    r"""
+    Generate the source of a Fortran subroutine containing a sequence of Loop
+    nests.
+
+    Each nest has the given depth and the given number of statements in the
+    body of its deepest Loop. Its structure is chosen at random from those
+    given, where ``"perfect"`` gives a perfect nest, ``"before"`` and
+    ``"after"`` add an assignment before or after a Loop within the nest and
+    ``"if"`` wraps a Loop within the nest in an ``IF`` block. The remaining
+    features are included at random with the given probabilities, per Loop for
+    dependent bounds and per statement otherwise.
+
+    For instance, the following gives a routine of around ten thousand lines,
+    with a mixture of perfect and imperfect nests:
+
+    .. code-block:: python
+
+        source = generate_kernel(
+            num_loops=1000, depth=3, body=4, structures=nest_structures
+        )
+
+    :kwarg num_loops: the number of Loop nests.
+    :type num_loops: :py:class:`int`
+    :kwarg depth: the depth of each nest.
+    :type depth: :py:class:`int`
+    :kwarg body: the number of statements in each deepest Loop.
+    :type body: :py:class:`int`
+    :kwarg structures: the nest structures to choose from.
+    :type structures: :py:class:`tuple` of :py:class:`str`
+    :kwarg dependent_bounds: the probability that the lower bound of a Loop
+        is the variable of its enclosing Loop.
+    :type dependent_bounds: :py:class:`float`
+    :kwarg index_arrays: the probability that an assignment is indexed
+        indirectly through an index array.
+    :type index_arrays: :py:class:`float`
+    :kwarg calls: the probability that a statement is a subroutine call.
+    :type calls: :py:class:`float`
+    :kwarg array_notation: the probability that an assignment uses implicit
+        array notation.
+    :type array_notation: :py:class:`float`
+    :kwarg seed: the seed for the random number generator.
+    :type seed: :py:class:`int`
+    :kwarg name: the name of the subroutine.
+    :type name: :py:class:`str`
+    :kwarg extent: the extent of each array dimension and the upper bound of
+        each Loop.
+    :type extent: :py:class:`int`
+
+    :returns: the Fortran source.
+    :rtype: :py:class:`str`
+
+    :raises TypeError: if an argument has the wrong type.
+    :raises ValueError: if an argument has an invalid value.
+    """
+    for key, value in (
+        ("num_loops", num_loops),
+        ("depth", depth),
+        ("body", body),
+        ("extent", extent),
+    ):
+        _check_count(key, value)
+    probabilities = {
+        "dependent_bounds": dependent_bounds,
+        "index_arrays": index_arrays,
+        "calls": calls,
+        "array_notation": array_notation,
+    }
+    for key, value in probabilities.items():
+        _check_probability(key, value)
+    probabilities["body"] = body
+    if isinstance(structures, str) or not structures:
+        raise TypeError(f"Expected a tuple of structures, not {structures!r}.")
+    for structure in structures:
+        if structure not in nest_structures:
+            raise ValueError(
+                f"Unsupported nest structure '{structure}', expected one of"
+                f" {list(nest_structures)}."
+            )
+
+    shape = ", ".join([str(extent)] * depth)
+    indices = ", ".join(f"i{level}" for level in range(1, depth + 1))
+    writer = _KernelWriter(random.Random(seed), depth, extent, probabilities)
+    writer.lines.extend(
+        [
+            f"SUBROUTINE {name}(a, b, c, map)",
+            "  USE work_mod, ONLY: work",
+            f"  REAL, INTENT(INOUT) :: a({shape})",
+            f"  REAL, INTENT(IN) :: b({shape})",
+            f"  REAL, INTENT(INOUT) :: c({extent})",
+            f"  INTEGER, INTENT(IN) :: map({extent})",
+            f"  INTEGER :: {indices}",
+            "",
+        ]
+    )
+    for _ in range(num_loops):
+        writer.nest(writer.rng.choice(structures))
+    writer.lines.append(f"END SUBROUTINE {name}")
+    return "\n".join(writer.lines) + "\n"
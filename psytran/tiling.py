@@ -0,0 +1,371 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+r"""
+This module provides loop tiling for cache blocking of perfectly nested
+:py:class:`Loop`\s, with tile sizes chosen so that the data touched by each
+tile fits within a given cache size.
+
+The outer-most Loops of a tiled nest iterate over the tiles and may be given a
+``loop`` directive as part of tiling, e.g.,
+
+.. code-block:: python
+
+    apply_parallel_directive(loop, OMPParallelTrans)
+    tile_loops(loop, levels=2, directive=OMPLoopTrans(omp_directive="do"))
+"""
+
+from psyclone.psyir import nodes
+from psyclone.psyir.symbols import INTEGER_TYPE, ArrayType, DataSymbol
+from psytran.cost import _evaluate, estimate_trip_count
+from psytran.directives import (
+    _check_directive,
+    _check_kernels,
+    apply_loop_directive,
+    has_parallel_directive,
+)
+from psytran.loop import (
+    _check_loop,
+    is_independent,
+    is_parallelisable,
+    is_perfectly_nested,
+)
+from psytran.profiling import profiled
+
+__all__ = ["default_cache_size", "choose_tile_sizes", "tile_loops"]
+
+# Default size of the cache to block for, in bytes, e.g., a per-core L2 cache
+default_cache_size = 256 * 1024
+
+# Size of a cache line, in bytes
+_cache_line = 64
+
+
+def _perfect_chain(loop, levels):
+    """
+    Get the outer-most Loops of a perfect nest, checking that they may be
+    tiled.
+
+    :arg loop: the outer-most Loop of the nest.
+    :type loop: :py:class:`Loop`
+    :arg levels: the number of Loops to tile, or ``None`` for all but the
+        inner-most Loop.
+    :type levels: :py:class:`int`
+
+    :returns: the Loops to tile, outer-most first, and all Loops of the nest.
+    :rtype: :py:class:`tuple` of :py:class:`list`
+
+    :raises ValueError: if the nest is not perfect, has dependent bounds, is
+        too shallow, or has a Loop which is not parallelisable or does not
+        have unit step.
+    """
+    _check_loop(loop)
+    if not is_perfectly_nested(loop):
+        raise ValueError("Can only tile perfectly nested loops.")
+    if not is_independent(loop):
+        raise ValueError(
+            "Cannot tile loops whose bounds depend on enclosing loops."
+        )
+    nest = []
+    while isinstance(loop, nodes.Loop):
+        nest.append(loop)
+        loop = loop.loop_body.children[0]
+    if levels is None:
+        levels = max(len(nest) - 1, 1)
+    if not isinstance(levels, int):
+        raise TypeError(f"Expected an int for levels, not '{type(levels)}'.")
+    if not 1 <= levels <= len(nest):
+        raise ValueError(
+            f"Cannot tile {levels} levels of a nest of depth {len(nest)}."
+        )
+    for level in nest[:levels]:
+        if not is_parallelisable(level):
+            raise ValueError(
+                f"Cannot tile loop '{level.variable.name}' since its"
+                " iterations are not independent."
+            )
+        if _evaluate(level.step_expr) != 1:
+            raise ValueError(
+                f"Cannot tile loop '{level.variable.name}' since its step is"
+                " not one."
+            )
+    return nest[:levels], nest
+
+
+def _array_extents(loop):
+    """
+    Get the extent of each array dimension indexed by the variable of each
+    Loop in a nest, where it can be determined statically.
+
+    :arg loop: the outer-most Loop of the nest.
+    :type loop: :py:class:`Loop`
+
+    :returns: the largest known extent indexed by each Loop variable, keyed
+        by the name of the variable, the number of arrays referenced and the
+        names of the variables which index the first, contiguous, dimension
+        of an array.
+    :rtype: :py:class:`tuple` of :py:class:`dict`, :py:class:`int` and
+        :py:class:`set`
+    """
+    extents, arrays, contiguous = {}, set(), set()
+    for ref in loop.walk(nodes.ArrayReference):
+        arrays.add(ref.name)
+        contiguous.update(
+            variable.name for variable in ref.indices[0].walk(nodes.Reference)
+        )
+        shape = getattr(ref.symbol.datatype, "shape", None)
+        if not isinstance(shape, list) or len(shape) != len(ref.indices):
+            continue
+        for index, dimension in zip(ref.indices, shape):
+            if not isinstance(dimension, ArrayType.ArrayBounds):
+                continue
+            lower = _evaluate(dimension.lower)
+            upper = _evaluate(dimension.upper)
+            if None in (lower, upper):
+                continue
+            for variable in index.walk(nodes.Reference):
+                name = variable.name
+                extents[name] = max(extents.get(name, 0), upper - lower + 1)
+    return extents, max(len(arrays), 1), contiguous
+
+
+@profiled
+def choose_tile_sizes(
+    loop,
+    levels=None,
+    cache_size=default_cache_size,
+    element_size=8,
+    default_trip_count=100,
+):
+    """
+    Choose tile sizes for the outer-most Loops of a perfect nest, such that
+    the data touched by each tile fits within a cache of a given size.
+
+    Each array referenced in the nest is assumed to contribute one element per
+    iteration of a tile, including the full extents of any Loops which are not
+    tiled. The budget is shared equally between the tiled Loops, except that a
+    Loop with fewer iterations than its share is not tiled beyond its extent.
+    The extent of each Loop is given by its trip count, or by the extents of
+    the array dimensions it indexes if its trip count is unknown. Loops which
+    are not tiled and whose extents are unknown are assumed to have a default
+    trip count, as in :func:`psytran.cost.estimate_costs`. The size of
+    a tiled Loop whose variable indexes the first dimension of an array,
+    which is contiguous in memory, is rounded down to a whole number of cache
+    lines.
+
+    :arg loop: the outer-most Loop of the nest.
+    :type loop: :py:class:`Loop`
+    :kwarg levels: the number of Loops to tile. Defaults to all but the
+        inner-most Loop of the nest.
+    :type levels: :py:class:`int`
+    :kwarg cache_size: the size of the cache to block for, in bytes.
+    :type cache_size: :py:class:`int`
+    :kwarg element_size: the size of an array element, in bytes.
+    :type element_size: :py:class:`int`
+    :kwarg default_trip_count: the number of iterations assumed for Loops
+        which are not tiled and whose extents are unknown.
+    :type default_trip_count: :py:class:`int`
+
+    :returns: the tile size for each tiled Loop, outer-most first.
+    :rtype: :py:class:`list` of :py:class:`int`
+
+    :raises TypeError: if the levels argument is not an integer.
+    :raises ValueError: if the nest may not be tiled.
+    """
+    for key, value in (
+        ("cache_size", cache_size),
+        ("element_size", element_size),
+        ("default_trip_count", default_trip_count),
+    ):
+        if not isinstance(value, int) or value < 1:
+            raise ValueError(
+                f"Expected a positive int for {key}, not {value!r}."
+            )
+    tiled, nest = _perfect_chain(loop, levels)
+    array_extents, num_arrays, contiguous = _array_extents(loop)
+    extents = []
+    for level in nest:
+        extent = estimate_trip_count(level)[0]
+        if extent is None:
+            extent = array_extents.get(level.variable.name)
+        extents.append(extent)
+
+    # Elements of each array which fit in cache for each tile
+    budget = cache_size // (element_size * num_arrays)
+    for i in range(len(tiled), len(nest)):
+        extent = extents[i] if extents[i] is not None else default_trip_count
+        budget //= max(extent, 1)
+    budget = max(budget, 1)
+
+    # Give Loops with small extents their full extent first
+    sizes = [None] * len(tiled)
+    order = sorted(
+        range(len(tiled)),
+        key=lambda i: float("inf") if extents[i] is None else extents[i],
+    )
+    for remaining, i in zip(range(len(tiled), 0, -1), order):
+        size = max(int(budget ** (1 / remaining)), 1)
+        # Guard against floating point error in the root
+        while (size + 1) ** remaining <= budget:
+            size += 1
+        if extents[i] is not None:
+            size = min(size, max(extents[i], 1))
+        sizes[i] = size
+        budget = max(budget // size, 1)
+
+    line = max(_cache_line // element_size, 1)
+    for i, level in enumerate(tiled):
+        if level.variable.name not in contiguous:
+            continue
+        if sizes[i] > line and sizes[i] != extents[i]:
+            sizes[i] -= sizes[i] % line
+    return sizes
+
+
+@profiled
+def tile_loops(
+    loop,
+    levels=None,
+    tile_sizes=None,
+    cache_size=default_cache_size,
+    element_size=8,
+    directive=None,
+    options=None,
+):
+    """
+    Tile the outer-most Loops of a perfect nest.
+
+    Each tiled Loop is split into a tile Loop, which steps over the range of
+    the original Loop in increments of the tile size, and an element Loop,
+    which iterates over a single tile. All of the tile Loops are placed
+    outside all of the element Loops.
+
+    A Loop whose tile size is at least its trip count is not tiled, since its
+    tile Loop would only have a single iteration. If no Loops remain to be
+    tiled then the nest is left unchanged, although any ``loop`` directive is
+    still applied, collapsing the Loops that would have been tiled.
+
+    The tile Loops form a perfect nest with independent iterations. However,
+    PSyclone's dependency analysis cannot show this through the bounds of the
+    element Loops, so a ``loop`` directive for the tile Loops should be
+    requested here, rather than applied afterwards. It is validated by
+    PSyclone against the nest before tiling, with a ``collapse`` clause
+    covering the Loops to be tiled, and then forced onto the tile Loops, with
+    a ``collapse`` clause covering all of them.
+
+    :arg loop: the outer-most Loop of the nest.
+    :type loop: :py:class:`Loop`
+    :kwarg levels: the number of Loops to tile. Defaults to all but the
+        inner-most Loop of the nest, or to the number of tile sizes given.
+    :type levels: :py:class:`int`
+    :kwarg tile_sizes: the tile size for each tiled Loop, outer-most first.
+        Defaults to those given by :func:`choose_tile_sizes`.
+    :type tile_sizes: :py:class:`list` of :py:class:`int`
+    :kwarg cache_size: the size of the cache to block for, in bytes, if tile
+        sizes are not given.
+    :type cache_size: :py:class:`int`
+    :kwarg element_size: the size of an array element, in bytes, if tile
+        sizes are not given.
+    :type element_size: :py:class:`int`
+    :kwarg directive: a ``loop`` directive to apply to the tile Loops, as in
+        :func:`psytran.directives.apply_loop_directive`.
+    :type directive: :py:class:`Directive`
+    :kwarg options: a dictionary of additional clause options for the
+        ``loop`` directive.
+    :type options: :py:class:`dict`
+
+    :returns: the outer-most tile Loop, which replaces the original Loop, or
+        the original Loop if no Loops were tiled.
+    :rtype: :py:class:`Loop`
+
+    :raises TypeError: if the levels argument is not an integer or the options
+        argument is not a dictionary.
+    :raises ValueError: if the nest may not be tiled, the tile sizes are
+        invalid or the ``loop`` directive may not be applied to the nest.
+    :raises TransformationError: if PSyclone's checks for the ``loop``
+        directive fail for the nest before tiling.
+    """
+    if options is None:
+        options = {}
+    if not isinstance(options, dict):
+        raise TypeError(f"Expected a dict, not '{type(options)}'.")
+    if tile_sizes is None:
+        tile_sizes = choose_tile_sizes(
+            loop,
+            levels=levels,
+            cache_size=cache_size,
+            element_size=element_size,
+        )
+    else:
+        tile_sizes = list(tile_sizes)
+        if levels is None:
+            levels = len(tile_sizes)
+    tiled, _ = _perfect_chain(loop, levels)
+    if len(tile_sizes) != len(tiled):
+        raise ValueError(
+            f"Expected {len(tiled)} tile sizes, not {len(tile_sizes)}."
+        )
+    for size in tile_sizes:
+        if not isinstance(size, int) or size < 1:
+            raise ValueError(f"Expected a positive tile size, not {size!r}.")
+    if directive is not None:
+        # Check the directive before modifying the tree
+        _check_directive(directive)
+        _check_kernels(
+            directive, has_parallel_directive(loop, nodes.ACCKernelsDirective)
+        )
+        options = dict(options)
+        if len(tiled) > 1:
+            options["collapse"] = len(tiled)
+        directive.validate(loop, options=options)
+
+    # Skip Loops which fit in a single tile
+    levels = []
+    for level, size in zip(tiled, tile_sizes):
+        count, _ = estimate_trip_count(level)
+        if count is None or size < count:
+            levels.append((level, size))
+
+    # Replace the bounds of each element Loop, recording those of its tile
+    symbol_table = loop.scope.symbol_table
+    tiles = []
+    for level, size in levels:
+        variable = symbol_table.new_symbol(
+            f"{level.variable.name}_tile",
+            symbol_type=DataSymbol,
+            datatype=INTEGER_TYPE,
+        )
+        start, stop = level.start_expr.copy(), level.stop_expr.copy()
+        tile_end = nodes.BinaryOperation.create(
+            nodes.BinaryOperation.Operator.ADD,
+            nodes.Reference(variable),
+            nodes.Literal(str(size - 1), INTEGER_TYPE),
+        )
+        level.start_expr.replace_with(nodes.Reference(variable))
+        level.stop_expr.replace_with(
+            nodes.IntrinsicCall.create(
+                nodes.IntrinsicCall.Intrinsic.MIN, [tile_end, stop.copy()]
+            )
+        )
+        step = nodes.Literal(str(size), INTEGER_TYPE)
+        tiles.append((variable, start, stop, step))
+
+    # Nest the tile Loops around the original outer-most Loop
+    parent, position = loop.parent, loop.position
+    inner = loop.detach()
+    for variable, start, stop, step in reversed(tiles):
+        inner = nodes.Loop.create(variable, start, stop, step, [inner])
+    parent.children.insert(position, inner)
+
+    if directive is not None:
+        if tiles:
+            # The directive was validated for the nest before tiling
+            options = {**options, "force": True}
+            if len(tiles) > 1:
+                options["collapse"] = len(tiles)
+            else:
+                options.pop("collapse", None)
+        apply_loop_directive(inner, directive, options)
+    return inner
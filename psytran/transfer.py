@@ -0,0 +1,666 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+r"""
+This module provides a static estimate of the volume of data moved between
+host and device by each OpenACC ``kernels``, ``parallel`` and ``data`` region
+and each OpenMP ``target`` region in a Schedule or in a tree of Fortran source
+files, aggregated per routine and per file.
+
+Arrays referenced by a compute region are assumed to be moved as compilers do
+for implicit data: those read are copied in and those written are copied out
+of OpenACC regions, while OpenMP ``target`` regions map them both ways. Arrays
+named in the clauses of an enclosing ``data`` region or in ``present``
+clauses, or all arrays if the region has a ``default(present)`` clause, are
+assumed to be present already. The volume of a ``data`` region is given by its
+clauses.
+"""
+
+import csv
+import json
+import re
+from collections import namedtuple
+from psyclone.psyir import nodes
+from psyclone.psyir.frontend.fortran import FortranReader
+from psyclone.psyir.nodes import (
+    ACCCopyClause,
+    ACCCopyInClause,
+    ACCCopyOutClause,
+    ACCDataDirective,
+    ACCKernelsDirective,
+    ACCParallelDirective,
+    Clause,
+    OMPTargetDirective,
+)
+from psyclone.psyir.symbols import ArrayType, DataSymbol, ScalarType
+from psytran.batch import map_sources, scan_directives
+from psytran.cost import _evaluate
+from psytran.data import (
+    ACCCreateClause,
+    DataRegionDirective,
+    get_array_accesses,
+)
+from psytran.family import iter_ancestors
+from psytran.profiling import profiled
+
+__all__ = [
+    "ACCPresentClause",
+    "ArrayTransfer",
+    "RegionTransfer",
+    "TransferReport",
+    "default_extent",
+    "default_element_size",
+    "estimate_transfers",
+    "estimate_transfers_files",
+]
+
+# Extent assumed for array dimensions which cannot be determined statically
+default_extent = 100
+
+# Size of an array element in bytes, if it cannot be determined statically
+default_element_size = 8
+
+ArrayTransfer = namedtuple(
+    "ArrayTransfer",
+    ["name", "shape", "elements", "element_size", "bytes_in", "bytes_out"],
+)
+ArrayTransfer.__doc__ = """
+Estimated data movement of a single array for a region.
+
+Fields are the name of the array, its declared shape as a tuple with the
+extent of each dimension as text (or ``None`` if its declaration is not
+available), its number of elements and element size in bytes (or ``None`` if
+they cannot be determined statically) and the estimated numbers of bytes
+copied to and from the device.
+"""
+
+RegionTransfer = namedtuple(
+    "RegionTransfer",
+    [
+        "file",
+        "routine",
+        "line",
+        "region",
+        "arrays",
+        "bytes_in",
+        "bytes_out",
+        "exact",
+    ],
+)
+RegionTransfer.__doc__ = """
+Estimated data movement for a single region.
+
+Fields are the file and routine containing the region, the line number of its
+first statement (if known), the type of the region directive, an
+:class:`ArrayTransfer` for each array referenced, the total estimated numbers
+of bytes copied to and from the device and whether all sizes were determined
+statically, rather than assuming :data:`default_extent` or
+:data:`default_element_size`.
+"""
+
+
+class ACCPresentClause(Clause):
+    """
+    OpenACC ``present`` clause. Specifies a list of arrays which are already
+    present on the device, so are neither allocated nor copied.
+    """
+
+    _children_valid_format = "Reference"
+    _clause_string = "present"
+
+    @staticmethod
+    def _validate_child(position, child):
+        """
+        Any number of children are allowed, all of type Reference.
+        """
+        return isinstance(child, nodes.Reference)
+
+
+# Compute regions, mapped to whether arrays are mapped both ways implicitly
+_compute_regions = {
+    ACCKernelsDirective: False,
+    ACCParallelDirective: False,
+    OMPTargetDirective: True,
+}
+
+# Directions of the data clauses, as (in, out)
+_clause_directions = {
+    ACCCopyInClause: (True, False),
+    ACCCopyOutClause: (False, True),
+    ACCCopyClause: (True, True),
+    ACCCreateClause: (False, False),
+    ACCPresentClause: (False, False),
+}
+
+# Default sizes of intrinsic types, in bytes
+_intrinsic_sizes = {
+    ScalarType.Intrinsic.REAL: 4,
+    ScalarType.Intrinsic.INTEGER: 4,
+    ScalarType.Intrinsic.BOOLEAN: 4,
+    ScalarType.Intrinsic.CHARACTER: 1,
+}
+
+
+def _datatype(symbol):
+    """
+    Get the datatype of a Symbol, or the part of it which is supported if it
+    is of a Fortran type which PSyclone does not support.
+    """
+    datatype = getattr(symbol, "datatype", None)
+    return getattr(datatype, "partial_datatype", None) or datatype
+
+
+def _element_size(datatype):
+    """
+    Get the size of an element of an array type in bytes, if it is known.
+    """
+    intrinsic = getattr(datatype, "intrinsic", None)
+    precision = getattr(datatype, "precision", None)
+    if precision == ScalarType.Precision.DOUBLE:
+        return 8
+    if precision == ScalarType.Precision.SINGLE:
+        return 4
+    if isinstance(precision, int):
+        return precision
+    if isinstance(precision, DataSymbol):
+        return _evaluate(nodes.Reference(precision))
+    if precision == ScalarType.Precision.UNDEFINED:
+        return _intrinsic_sizes.get(intrinsic)
+    return None
+
+
+def _shape(symbol):
+    """
+    Get the declared shape of an array, as text, and its number of elements,
+    if they are known.
+    """
+    shape = getattr(_datatype(symbol), "shape", None)
+    if not isinstance(shape, list):
+        return None, None
+    dimensions, elements = [], 1
+    for dimension in shape:
+        if not isinstance(dimension, ArrayType.ArrayBounds):
+            dimensions.append(":")
+            elements = None
+            continue
+        lower, upper = dimension.lower, dimension.upper
+        if _evaluate(lower) == 1:
+            dimensions.append(upper.debug_string())
+        else:
+            dimensions.append(f"{lower.debug_string()}:{upper.debug_string()}")
+        lower, upper = _evaluate(lower), _evaluate(upper)
+        if elements is not None and None not in (lower, upper):
+            elements *= max(upper - lower + 1, 0)
+        else:
+            elements = None
+    return tuple(dimensions), elements
+
+
+def _array_transfer(symbol, name, copy_in, copy_out):
+    """
+    Estimate the data movement of an array, returning the record and whether
+    its size was determined statically.
+    """
+    shape, elements = _shape(symbol)
+    element_size = _element_size(_datatype(symbol))
+    exact = elements is not None and element_size is not None
+    if elements is not None:
+        volume = elements
+    else:
+        volume = default_extent ** len(shape or (None,))
+    volume *= element_size or default_element_size
+    record = ArrayTransfer(
+        name,
+        shape,
+        elements,
+        element_size,
+        volume if copy_in else 0,
+        volume if copy_out else 0,
+    )
+    return record, exact
+
+
+def _lookup(node, name):
+    """
+    Look up the Symbol of a variable from a Node, if it is declared.
+    """
+    try:
+        return node.scope.symbol_table.lookup(name)
+    except KeyError:
+        return None
+
+
+def _clause_arrays(region):
+    """
+    Get the names of the arrays in the clauses of a data region, mapped to
+    their directions.
+    """
+    arrays = {}
+    for clause in region.clauses:
+        directions = _clause_directions.get(type(clause), (False, False))
+        for reference in clause.children:
+            arrays[reference.name] = directions
+    return arrays
+
+
+def _present_arrays(region):
+    """
+    Get the names of the arrays in the ``present`` clauses of a region.
+    """
+    return {
+        reference.name
+        for clause in region.clauses
+        if isinstance(clause, ACCPresentClause)
+        for reference in clause.children
+    }
+
+
+def _statement_line(node):
+    """
+    Get the line number of a statement in its source file, if it is known.
+    """
+    ast = node.ast
+    if getattr(ast, "item", None) is None and getattr(ast, "content", None):
+        ast = ast.content[0]
+    try:
+        return ast.item.span[0]
+    except (AttributeError, IndexError, TypeError):
+        return None
+
+
+def _region_transfer(region, filename):
+    """
+    Estimate the data movement for a single region.
+    """
+    present = set()
+    ancestor = region.ancestor(ACCDataDirective)
+    while ancestor is not None:
+        present.update(_clause_arrays(ancestor))
+        ancestor = ancestor.ancestor(ACCDataDirective)
+
+    if isinstance(region, ACCDataDirective):
+        directions = _clause_arrays(region)
+        present.update(_present_arrays(region))
+    else:
+        accesses = get_array_accesses(region)
+        both = any(
+            isinstance(region, region_type) and region_both
+            for region_type, region_both in _compute_regions.items()
+        )
+        directions = {
+            name: (
+                both or name in accesses.reads,
+                both or name in accesses.writes,
+            )
+            for name in accesses.reads | accesses.writes
+        }
+        if getattr(region, "default_present", False):
+            present.update(directions)
+
+    arrays, exact = [], True
+    for name in sorted(directions):
+        copy_in, copy_out = directions[name]
+        if name in present:
+            copy_in = copy_out = False
+        record, array_exact = _array_transfer(
+            _lookup(region, name), name, copy_in, copy_out
+        )
+        arrays.append(record)
+        exact = exact and (array_exact or not (copy_in or copy_out))
+
+    routine = region.ancestor(nodes.Routine)
+    lines = [
+        _statement_line(statement)
+        for statement in region.dir_body.walk(nodes.Statement)
+    ]
+    lines = [line for line in lines if line is not None]
+    return RegionTransfer(
+        filename,
+        routine.name if routine is not None else "",
+        lines[0] if lines else None,
+        type(region).__name__,
+        tuple(arrays),
+        sum(array.bytes_in for array in arrays),
+        sum(array.bytes_out for array in arrays),
+        exact,
+    )
+
+
+@profiled
+def estimate_transfers(node, filename=""):
+    """
+    Estimate the data movement between host and device for each OpenACC
+    ``kernels``, ``parallel`` and ``data`` region and each OpenMP ``target``
+    region beneath a Node.
+
+    The size of each array is determined from its declaration. Dimensions
+    whose extents cannot be determined statically are assumed to have
+    :data:`default_extent` elements, and elements whose kinds cannot be
+    determined are assumed to be of :data:`default_element_size` bytes.
+
+    :arg node: the Node to report on, e.g., a Routine or a FileContainer.
+    :type node: :py:class:`Node`
+    :kwarg filename: the file to record the regions as belonging to.
+    :type filename: :py:class:`str`
+
+    :returns: a record for each region, in the order returned by
+        :meth:`Node.walk`.
+    :rtype: :py:class:`list` of :py:class:`RegionTransfer`
+    """
+    assert isinstance(
+        node, nodes.Node
+    ), f"Expected a Node, not '{type(node)}'."
+    region_types = (ACCDataDirective, *_compute_regions)
+    return [
+        _region_transfer(region, filename)
+        for region in node.walk(region_types)
+    ]
+
+
+class TransferReport:
+    """
+    Estimated data movement for the regions in a set of source files, as
+    returned by :func:`estimate_transfers_files`.
+
+    :ivar records: a :class:`RegionTransfer` for each region.
+    :ivar errors: maps the path of each file which could not be parsed to the
+        error message.
+    """
+
+    def __init__(self, records, errors=None):
+        """
+        :arg records: a record for each region.
+        :type records: :py:class:`list` of :py:class:`RegionTransfer`
+        :kwarg errors: the files which could not be parsed.
+        :type errors: :py:class:`dict`
+        """
+        self.records = records
+        self.errors = errors or {}
+
+    @staticmethod
+    def _totals(records):
+        """
+        Sum the estimates for some records.
+        """
+        return {
+            "regions": len(records),
+            "bytes_in": sum(record.bytes_in for record in records),
+            "bytes_out": sum(record.bytes_out for record in records),
+            "exact": all(record.exact for record in records),
+        }
+
+    def _grouped(self, key):
+        """
+        Sum the estimates for the records in each group.
+        """
+        groups = {}
+        for record in self.records:
+            groups.setdefault(key(record), []).append(record)
+        return {name: self._totals(group) for name, group in groups.items()}
+
+    def by_routine(self):
+        """
+        :returns: the number of regions, estimated bytes in and out and
+            whether the estimates are exact, keyed by (file, routine) pairs.
+        :rtype: :py:class:`dict`
+        """
+        return self._grouped(lambda record: (record.file, record.routine))
+
+    def by_file(self):
+        """
+        :returns: the number of regions, estimated bytes in and out and
+            whether the estimates are exact, keyed by file.
+        :rtype: :py:class:`dict`
+        """
+        return self._grouped(lambda record: record.file)
+
+    def summary(self):
+        """
+        :returns: the number of regions, estimated bytes in and out and
+            whether the estimates are exact in total, as well as the number of
+            files which failed.
+        :rtype: :py:class:`dict`
+        """
+        return {
+            **self._totals(self.records),
+            "failed_files": len(self.errors),
+        }
+
+    def write_csv(self, filename):
+        """
+        Write one row per region to a CSV file, with the names of the arrays
+        separated by spaces.
+
+        :arg filename: the path of the file.
+        :type filename: :py:class:`str`
+        """
+        with open(filename, "w", newline="", encoding="utf-8") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(RegionTransfer._fields)
+            for record in self.records:
+                arrays = " ".join(array.name for array in record.arrays)
+                writer.writerow(record._replace(arrays=arrays))
+
+    def write_json(self, filename):
+        """
+        Write the summary, the totals per routine and per file, the records
+        and the errors to a JSON file.
+
+        :arg filename: the path of the file.
+        :type filename: :py:class:`str`
+        """
+        regions = []
+        for record in self.records:
+            data = record._asdict()
+            data["arrays"] = [array._asdict() for array in record.arrays]
+            regions.append(data)
+        routines = [
+            {"file": file, "routine": routine, **totals}
+            for (file, routine), totals in self.by_routine().items()
+        ]
+        data = {
+            "summary": self.summary(),
+            "files": self.by_file(),
+            "routines": routines,
+            "regions": regions,
+            "errors": self.errors,
+        }
+        with open(filename, "w", encoding="utf-8") as json_file:
+            json.dump(data, json_file, indent=2)
+
+    def write(self, filename):
+        """
+        Write the report as JSON if the filename ends in ``.json``, otherwise
+        as CSV.
+
+        :arg filename: the path of the file.
+        :type filename: :py:class:`str`
+        """
+        if str(filename).endswith(".json"):
+            self.write_json(filename)
+        else:
+            self.write_csv(filename)
+
+
+# Region directives which may be recovered from the source of a file
+_source_regions = {
+    "acc kernels": ACCKernelsDirective,
+    "acc parallel": ACCParallelDirective,
+    "acc data": DataRegionDirective,
+    "omp target": OMPTargetDirective,
+}
+_source_clauses = {
+    "copyin": ACCCopyInClause,
+    "copyout": ACCCopyOutClause,
+    "copy": ACCCopyClause,
+    "create": ACCCreateClause,
+    "present": ACCPresentClause,
+}
+_clause_start = re.compile(r"\b(copyin|copyout|copy|create|present)\s*\(")
+
+
+def _split_arguments(text):
+    """
+    Split the arguments of a clause at the commas which are not nested within
+    parentheses, e.g., those of array sections.
+    """
+    arguments, depth, start = [], 0, 0
+    for position, char in enumerate(text):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            arguments.append(text[start:position])
+            start = position + 1
+    arguments.append(text[start:])
+    return arguments
+
+
+def _source_data_clauses(text):
+    """
+    Get the data clauses in the text of a directive, with their arguments
+    reduced to array names, e.g., ``copyin(a(1:n), b)`` gives
+    ``("copyin", ["a", "b"])``.
+
+    :arg text: the text of the directive, with any continuation lines joined.
+    :type text: :py:class:`str`
+
+    :returns: the name and array names of each clause.
+    :rtype: :py:class:`list` of :py:class:`tuple`
+    """
+    clauses = []
+    for match in _clause_start.finditer(text):
+        start = end = match.end()
+        depth = 1
+        while end < len(text):
+            depth += {"(": 1, ")": -1}.get(text[end], 0)
+            if depth == 0:
+                break
+            end += 1
+        names = []
+        for argument in _split_arguments(text[start:end]):
+            # Drop any subscripts and modifiers, e.g., readonly:
+            name = argument.split("(")[0].split(":")[-1].strip()
+            if name:
+                names.append(name)
+        clauses.append((match.group(1), names))
+    return clauses
+
+
+def _clause_nodes(clauses, scope):
+    """
+    Create the data clauses recovered from the source of a file, ignoring
+    arrays which are not declared.
+
+    :returns: the clauses.
+    :rtype: :py:class:`list` of :py:class:`Clause`
+    """
+    clause_nodes = []
+    for clause, names in clauses:
+        references = []
+        for name in names:
+            symbol = _lookup(scope, name)
+            if symbol is not None:
+                references.append(nodes.Reference(symbol))
+        if references:
+            clause_nodes.append(_source_clauses[clause](children=references))
+    return clause_nodes
+
+
+def _recover_regions(psyir, lines):
+    """
+    Insert the region directives found in the source of a file, which are
+    not represented in the PSyIR created by the Fortran frontend, around the
+    statements they enclose.
+
+    :arg psyir: the PSyIR of the file.
+    :type psyir: :py:class:`Node`
+    :arg lines: the lines of the file.
+    :type lines: :py:class:`list` of :py:class:`str`
+    """
+    regions, _ = scan_directives(lines)
+    # Outer regions first, so that inner ones are found within them
+    regions = sorted(
+        (region for region in regions if region[0] in _source_regions),
+        key=lambda region: (region[1], -region[2]),
+    )
+    for name, first, last, text in regions:
+        inside = [
+            statement
+            for statement in psyir.walk(nodes.Statement)
+            if first < (_statement_line(statement) or 0) < last
+        ]
+        ids = {id(statement) for statement in inside}
+        outer = [
+            statement
+            for statement in inside
+            if not any(
+                id(ancestor) in ids
+                for ancestor in iter_ancestors(statement, node_type=nodes.Node)
+            )
+        ]
+        if not outer or any(
+            statement.parent is not outer[0].parent
+            or statement.position != outer[0].position + i
+            for i, statement in enumerate(outer)
+        ):
+            continue
+        parent, position = outer[0].parent, outer[0].position
+        children = [statement.detach() for statement in outer]
+        region_type = _source_regions[name]
+        clauses = _clause_nodes(_source_data_clauses(text), parent)
+        if region_type is OMPTargetDirective:
+            region = region_type(children=children)
+        elif region_type is DataRegionDirective:
+            region = region_type(children=children)
+            region.children.extend(clauses)
+        else:
+            region = region_type(
+                children=children,
+                default_present="default(present)" in text.replace(" ", ""),
+            )
+            if clauses:
+                # PSyclone does not support data clauses on compute regions,
+                # so represent them by an equivalent enclosing data region
+                region = DataRegionDirective(children=[region])
+                region.children.extend(clauses)
+        parent.children.insert(position, region)
+
+
+def _file_transfers(source):
+    """
+    Parse a source file and estimate the data movement of its regions,
+    capturing any failure.
+
+    :returns: the records and the error message, if any.
+    """
+    try:
+        psyir = FortranReader().psyir_from_file(source)
+        if not psyir.walk(nodes.Directive):
+            with open(source, encoding="utf-8") as source_file:
+                lines = source_file.read().splitlines()
+            _recover_regions(psyir, lines)
+        return estimate_transfers(psyir, filename=source), None
+    except Exception as error:  # pylint: disable=broad-except
+        return [], f"{type(error).__name__}: {error}"
+
+
+def estimate_transfers_files(paths, jobs=None):
+    """
+    Estimate the data movement of the regions in the Fortran source files
+    among a list of files and directories, parsing the files in a pool of
+    worker processes.
+
+    :arg paths: the files and directories to report on.
+    :type paths: :py:class:`list` of :py:class:`str`
+    :kwarg jobs: the number of worker processes. Defaults to the number of
+        CPUs. If ``1``, files are parsed in the current process.
+    :type jobs: :py:class:`int`
+
+    :returns: the report, with files in order of path.
+    :rtype: :py:class:`TransferReport`
+    """
+    return TransferReport(*map_sources(_file_transfers, paths, jobs=jobs))
@@ -510,4 +510,249 @@ subroutine_call = """
     END PROGRAM test
     """
 
+loop_with_recurrence = """
+    PROGRAM test
+      REAL :: a(10)
+      INTEGER :: i
+
+      DO i = 2, 10
+        a(i) = a(i-1)
+      END DO
+    END PROGRAM test
+    """
+
+pointer_assignment = """
+    PROGRAM test
+      REAL, TARGET :: a(10)
+      REAL, POINTER :: p(:)
+
+      a = 0.0
+      p => a
+    END PROGRAM test
+    """
+
+loop_with_parameter_bounds = """
+    SUBROUTINE test(a, n)
+      INTEGER, PARAMETER :: m = 4
+      INTEGER, PARAMETER :: k = m * 2 + 1
+      INTEGER, INTENT(IN) :: n
+      REAL, INTENT(INOUT) :: a(n,k)
+      INTEGER :: i
+      INTEGER :: j
+
+      DO j = 1, k
+        DO i = 2, n, 2
+          a(i,j) = 2.0 * a(i,j) + 1.0
+        END DO
+        a(1,j) = -a(2,j)
+      END DO
+    END SUBROUTINE test
+    """
+
+triple_loop_with_parameter_extents = """
+    SUBROUTINE test(a, b, n)
+      INTEGER, PARAMETER :: m = 512
+      INTEGER, INTENT(IN) :: n
+      REAL, INTENT(INOUT) :: a(m,m,n)
+      REAL, INTENT(IN) :: b(m,m,n)
+      INTEGER :: i
+      INTEGER :: j
+      INTEGER :: k
+
+      DO k = 1, n
+        DO j = 1, m
+          DO i = 1, m
+            a(i,j,k) = a(i,j,k) + b(i,j,k)
+          END DO
+        END DO
+      END DO
+    END SUBROUTINE test
+    """
+
+pure_triple_loop = """
+    PURE SUBROUTINE test(a, n)
+      INTEGER, INTENT(IN) :: n
+      REAL, INTENT(INOUT) :: a(n,n,n)
+      INTEGER :: i
+      INTEGER :: j
+      INTEGER :: k
+
+      DO k = 1, n
+        DO j = 1, n
+          DO i = 1, n
+            a(i,j,k) = 2.0 * a(i,j,k)
+          END DO
+        END DO
+      END DO
+    END SUBROUTINE test
+    """
+
+sibling_double_loops = """
+    PROGRAM test
+      REAL :: a(10,10)
+      REAL :: b(10,10)
+      REAL :: c(10,10)
+      INTEGER :: i
+      INTEGER :: j
+
+      DO j = 1, 10
+        DO i = 1, 10
+          a(i,j) = 1.0
+        END DO
+      END DO
+      DO j = 1, 10
+        DO i = 1, 10
+          b(i,j) = a(i,j)
+        END DO
+      END DO
+      DO j = 1, 10
+        DO i = 2, 10
+          c(i,j) = b(i-1,j)
+        END DO
+      END DO
+      DO j = 1, 10
+        DO i = 1, 9
+          c(i,j) = a(i,j+1)
+        END DO
+      END DO
+    END PROGRAM test
+    """
+
 # pylint: enable=C0103
+
+loops_with_intervening_statements = """
+    PROGRAM test
+      USE my_mod, ONLY: my_subroutine
+      REAL :: a(10)
+      REAL :: b(10)
+      REAL :: s
+      INTEGER :: i
+
+      DO i = 1, 10
+        a(i) = 1.0
+      END DO
+      s = 2.0
+      DO i = 1, 10
+        b(i) = s * a(i)
+      END DO
+      CALL my_subroutine(b)
+      DO i = 1, 10
+        a(i) = b(i)
+      END DO
+    END PROGRAM test
+    """
+
+time_loop_with_work_array = """
+    SUBROUTINE test(a, b, c, n, nt)
+      INTEGER, INTENT(IN) :: n
+      INTEGER, INTENT(IN) :: nt
+      REAL, INTENT(IN) :: a(n)
+      REAL, INTENT(INOUT) :: b(n)
+      REAL, INTENT(OUT) :: c(n)
+      REAL :: work(n)
+      REAL :: total
+      INTEGER :: i
+      INTEGER :: t
+
+      DO t = 1, nt
+        DO i = 1, n
+          work(i) = a(i) * b(i)
+        END DO
+        DO i = 1, n
+          b(i) = b(i) + work(i)
+        END DO
+      END DO
+      DO i = 1, n
+        c(i) = b(i)
+      END DO
+      total = SUM(c)
+    END SUBROUTINE test
+    """
+
+time_loop_with_host_access = """
+    SUBROUTINE test(a, b, c, n, nt)
+      INTEGER, INTENT(IN) :: n
+      INTEGER, INTENT(IN) :: nt
+      REAL, INTENT(IN) :: a(n)
+      REAL, INTENT(INOUT) :: b(n)
+      REAL, INTENT(OUT) :: c(n)
+      REAL :: work(n)
+      REAL :: total
+      INTEGER :: i
+      INTEGER :: t
+
+      DO t = 1, nt
+        DO i = 1, n
+          work(i) = a(i) * b(i)
+        END DO
+        DO i = 1, n
+          b(i) = b(i) + work(i)
+        END DO
+        b(1) = 0.0
+      END DO
+      DO i = 1, n
+        c(i) = b(i)
+      END DO
+      total = SUM(c)
+    END SUBROUTINE test
+    """
+
+independent_and_dependent_loops = """
+    SUBROUTINE test(a, b, c, d, n, total)
+      INTEGER, INTENT(IN) :: n
+      REAL, INTENT(INOUT) :: a(n)
+      REAL, INTENT(INOUT) :: b(n)
+      REAL, INTENT(INOUT) :: c(n)
+      REAL, INTENT(OUT) :: d(n)
+      REAL, INTENT(OUT) :: total
+      INTEGER :: i
+
+      DO i = 1, n
+        a(i) = 2.0 * a(i)
+      END DO
+      DO i = 1, n
+        b(i) = 2.0 * b(i)
+      END DO
+      DO i = 1, n
+        c(i) = a(i) + c(i)
+      END DO
+      DO i = 1, n
+        d(i) = b(i) + c(i)
+      END DO
+      total = 0.0
+      DO i = 1, n
+        total = total + a(i)
+      END DO
+      b(1) = 0.0
+    END SUBROUTINE test
+    """
+
+first_index_outer_loops = """
+    SUBROUTINE test(a, b, c, d)
+      REAL, INTENT(OUT) :: a(10,10)
+      REAL, INTENT(IN) :: b(10,10)
+      REAL, INTENT(INOUT) :: c(10,10)
+      REAL, INTENT(IN) :: d(10,10,10)
+      INTEGER :: i
+      INTEGER :: j
+      INTEGER :: k
+
+      DO i = 1, 10
+        DO j = 1, 10
+          a(i,j) = b(i,j) + b(j,i)
+        END DO
+      END DO
+      DO i = 2, 10
+        DO j = 1, 10
+          c(i,j) = c(i-1,j)
+        END DO
+      END DO
+      DO k = 1, 10
+        DO j = 1, 10
+          DO i = 1, 10
+            a(j,k) = a(j,k) + d(j,i,k)
+          END DO
+        END DO
+      END DO
+    END SUBROUTINE test
+    """
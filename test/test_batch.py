@@ -0,0 +1,267 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+"""
+Unit tests for PSyTran's `batch` module.
+"""
+
+import json
+import shutil
+
+import pytest
+from psyclone.configuration import Config
+from utils import simple_loop_code
+
+import code_snippets as cs
+import psytran.batch
+from psytran.batch import (
+    find_sources,
+    main,
+    map_sources,
+    scan_directives,
+    summarise_output,
+    transform_files,
+)
+
+_script = """
+from psyclone.psyir import nodes
+from psyclone.psyir.transformations import ACCKernelsTrans
+
+
+def trans(psyir):
+    for loop in psyir.walk(nodes.Loop):
+        if not loop.ancestor(nodes.Loop):
+            ACCKernelsTrans().apply(loop)
+"""
+
+# Script which kills the worker process for sources with sibling Loops
+_crash_script = """
+import os
+
+from psyclone.psyir import nodes
+
+
+def trans(psyir):
+    for loop in psyir.walk(nodes.Loop):
+        if len(loop.loop_body.children) > 1:
+            os._exit(1)
+"""
+
+
+@pytest.fixture(name="source_tree")
+def fixture_source_tree(tmp_path):
+    """
+    Write a tree of Fortran sources, one of which is invalid, together with a
+    transformation script.
+    """
+    src = tmp_path / "src"
+    (src / "sub").mkdir(parents=True)
+    (src / "a.F90").write_text(simple_loop_code(1))
+    (src / "sub" / "b.f90").write_text(simple_loop_code(2))
+    (src / "sub" / "c.f90").write_text(cs.double_loop_with_2_loops)
+    (src / "broken.f90").write_text("subroutine broken\n  x = = 1\n")
+    (src / "notes.txt").write_text("Not Fortran.")
+    script = tmp_path / "trans.py"
+    script.write_text(_script)
+    return src, script
+
+
+def test_find_sources(source_tree):
+    """
+    Test that :func:`find_sources` finds Fortran files recursively.
+    """
+    src, script = source_tree
+    sources = find_sources([str(src), str(script)])
+    relative = [path for _, path in sources]
+    assert sorted(relative) == [
+        "a.F90",
+        "broken.f90",
+        "sub/b.f90",
+        "sub/c.f90",
+        "trans.py",
+    ]
+    with pytest.raises(FileNotFoundError):
+        find_sources([str(src / "missing")])
+
+
+def test_find_sources_duplicates(source_tree):
+    """
+    Test that :func:`find_sources` ignores a source found more than once, but
+    raises an error for different sources with the same relative path.
+    """
+    src, _ = source_tree
+    sources = find_sources([str(src), str(src / "a.F90")])
+    assert [path for _, path in sources].count("a.F90") == 1
+    (src / "sub" / "a.F90").write_text(simple_loop_code(1))
+    with pytest.raises(ValueError, match="would both be written to 'a.F90'"):
+        find_sources([str(src / "a.F90"), str(src / "sub" / "a.F90")])
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_transform_files(source_tree, tmp_path, jobs):
+    """
+    Test that :func:`transform_files` writes an output for each valid source
+    and isolates the failure of the invalid one.
+    """
+    src, script = source_tree
+    output_dir = tmp_path / "out"
+    report = tmp_path / "report.json"
+    results = transform_files(
+        [str(src)], str(script), str(output_dir), jobs=jobs, report=report
+    )
+    status = {result.source: result.status for result in results}
+    assert status.pop(str(src / "broken.f90")) == "failed"
+    assert set(status.values()) == {"ok"}
+    assert len(status) == 3
+    for relative in ("a.F90", "sub/b.f90", "sub/c.f90"):
+        assert "!$acc kernels" in (output_dir / relative).read_text()
+    assert not (output_dir / "broken.f90").exists()
+    with open(report, encoding="utf-8") as report_file:
+        summary = json.load(report_file)
+    assert summary["files"] == 4
+    assert summary["ok"] == 3
+    assert [entry["source"] for entry in summary["results"]] == [
+        result.source for result in results
+    ]
+
+
+def test_main(source_tree, tmp_path, capsys):
+    """
+    Test that the command line interface reports failures in its exit code.
+    """
+    src, script = source_tree
+    output_dir = tmp_path / "out"
+    arguments = ["-s", str(script), "-o", str(output_dir), "-j", "1"]
+    assert main([*arguments, str(src / "a.F90")]) == 0
+    assert (output_dir / "report.json").exists()
+    assert main([*arguments, str(src)]) == 1
+    assert "broken.f90" in capsys.readouterr().err
+    config = tmp_path / "config dir" / "psyclone.cfg"
+    config.parent.mkdir()
+    shutil.copy(Config.get().filename, config)
+    psyclone_args = f"--psyclone-args=--config '{config}'"
+    assert main([*arguments, psyclone_args, str(src / "a.F90")]) == 0
+
+
+def test_transform_files_script_changed(source_tree, tmp_path):
+    """
+    Test that in-process runs pick up a changed transformation script with the
+    same name.
+    """
+    src, script = source_tree
+    sources = [str(src / "a.F90")]
+    transform_files(sources, str(script), str(tmp_path / "out1"), jobs=1)
+    assert "!$acc kernels" in (tmp_path / "out1" / "a.F90").read_text()
+    script.write_text("def trans(psyir):\n    pass\n")
+    transform_files(sources, str(script), str(tmp_path / "out2"), jobs=1)
+    assert "!$acc kernels" not in (tmp_path / "out2" / "a.F90").read_text()
+
+
+def test_transform_files_crash(source_tree, tmp_path, monkeypatch):
+    """
+    Test that :func:`transform_files` only reports the file whose worker
+    process died as crashed, rather than every file outstanding at the time,
+    and only runs files which were in flight during two crashes on their own.
+    """
+    src, script = source_tree
+    script.write_text(_crash_script)
+    (src / "0.f90").write_text(cs.double_loop_with_2_loops)
+    for index in range(6):
+        (src / f"d{index}.f90").write_text(simple_loop_code(1))
+    isolate = psytran.batch._isolated_transform_jobs
+    isolated = []
+
+    def isolate_and_record(job_list):
+        isolated.extend(job[0] for job in job_list)
+        return isolate(job_list)
+
+    monkeypatch.setattr(
+        psytran.batch, "_isolated_transform_jobs", isolate_and_record
+    )
+    results = transform_files(
+        [str(src)], str(script), str(tmp_path / "out"), jobs=2
+    )
+    assert str(src / "0.f90") in isolated
+    assert str(src / "sub" / "c.f90") in isolated
+    assert len(isolated) <= 4
+    status = {result.source: result.status for result in results}
+    assert status.pop(str(src / "0.f90")) == "crashed"
+    assert status.pop(str(src / "sub" / "c.f90")) == "crashed"
+    assert status.pop(str(src / "broken.f90")) == "failed"
+    assert set(status.values()) == {"ok"}
+    assert len(status) == 8
+
+
+def test_summarise_output():
+    """
+    Test that :func:`summarise_output` counts the directives in generated
+    Fortran, ignoring closing and continuation lines.
+    """
+    output = (
+        "program test\n"
+        "  !$acc kernels\n"
+        "  !$acc loop independent &\n"
+        "  !$acc& collapse(2)\n"
+        "  !$acc end kernels\n"
+        "  !$omp parallel default(shared)\n"
+        "  !$omp end parallel\n"
+        "end program test\n"
+    )
+    assert summarise_output(output) == {
+        "lines": 8,
+        "directives": {"acc kernels": 1, "acc loop": 1, "omp parallel": 1},
+    }
+
+
+def _count_lines(source):
+    """
+    Count the lines of a source file, failing for invalid sources.
+    """
+    with open(source, encoding="utf-8") as source_file:
+        lines = source_file.read().splitlines()
+    if "broken" in source:
+        return [], "Invalid source."
+    return [(source, len(lines))], None
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_map_sources(source_tree, jobs):
+    """
+    Test that :func:`map_sources` combines the records of each file in order
+    of path and collects the errors.
+    """
+    src, _ = source_tree
+    records, errors = map_sources(_count_lines, [str(src)], jobs=jobs)
+    assert [source for source, _ in records] == [
+        str(src / "a.F90"),
+        str(src / "sub" / "b.f90"),
+        str(src / "sub" / "c.f90"),
+    ]
+    assert errors == {str(src / "broken.f90"): "Invalid source."}
+
+
+def test_scan_directives():
+    """
+    Test that :func:`scan_directives` finds region and loop directives,
+    joining continuation lines.
+    """
+    lines = [
+        "program test",
+        "  !$acc kernels &",
+        "  !$acc& copyin(a)",
+        "  !$acc loop independent",
+        "  do i = 1, 10",
+        "    a(i) = 0.0",
+        "  end do",
+        "  !$acc end kernels",
+        "  !$omp target",
+        "end program test",
+    ]
+    regions, loops = scan_directives(lines)
+    assert regions == [
+        ("acc kernels", 3, 8, "acc kernels copyin(a)"),
+        ("omp target", 9, 10, "omp target"),
+    ]
+    assert loops == {5: ("acc loop", "acc loop independent")}
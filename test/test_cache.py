@@ -0,0 +1,181 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+"""
+Unit tests for PSyTran's `cache` module.
+"""
+
+import os
+
+import pytest
+
+import code_snippets as cs
+from psytran.batch import transform_files
+from psytran.cache import TransformCache, cache_key
+
+_script = """
+from psyclone.psyir import nodes
+from psyclone.psyir.transformations import ACCKernelsTrans
+
+
+def trans(psyir):
+    for loop in psyir.walk(nodes.Loop):
+        if not loop.ancestor(nodes.Loop):
+            ACCKernelsTrans().apply(loop)
+"""
+
+
+@pytest.fixture(name="sources")
+def fixture_sources(tmp_path):
+    """
+    Write two Fortran sources and a transformation script.
+    """
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "a.f90").write_text(cs.loop_with_1_assignment)
+    (src / "b.f90").write_text(cs.double_loop_with_1_assignment)
+    script = tmp_path / "trans.py"
+    script.write_text(_script)
+    return src, script
+
+
+def test_cache_key(sources):
+    """
+    Test that the cache key depends on the source, the script and the PSyclone
+    arguments.
+    """
+    src, script = sources
+    source = str(src / "a.f90")
+    key = cache_key(source, str(script))
+    assert cache_key(source, str(script)) == key
+    assert cache_key(str(src / "b.f90"), str(script)) != key
+    assert cache_key(source, str(script), ("-l", "output")) != key
+    script.write_text(_script + "\n# Changed\n")
+    assert cache_key(source, str(script)) != key
+
+
+def test_cache_key_imports(sources, tmp_path):
+    """
+    Test that the cache key depends on the modules imported by the script
+    from its own directory, but not on other files in that directory.
+    """
+    src, script = sources
+    source = str(src / "a.f90")
+    (tmp_path / "helpers").mkdir()
+    (tmp_path / "helpers" / "__init__.py").write_text("")
+    (tmp_path / "helpers" / "kernels.py").write_text("from common import x\n")
+    (tmp_path / "common.py").write_text("x = 1\n")
+    script.write_text("from helpers.kernels import x\n" + _script)
+    key = cache_key(source, str(script))
+    (tmp_path / "unused.py").write_text("x = 1\n")
+    assert cache_key(source, str(script)) == key
+    (tmp_path / "common.py").write_text("x = 2\n")
+    assert cache_key(source, str(script)) != key
+
+
+@pytest.mark.parametrize("form", ["separate", "joined"])
+def test_cache_key_config(sources, tmp_path, form):
+    """
+    Test that the cache key depends on the PSyclone configuration file given
+    on the command line, in either of its forms.
+    """
+    src, script = sources
+    config = tmp_path / "psyclone.cfg"
+    config.write_text("[DEFAULT]\n")
+    if form == "separate":
+        psyclone_args = ("--config", str(config))
+    else:
+        psyclone_args = (f"--config={config}",)
+    key = cache_key(str(src / "a.f90"), str(script), psyclone_args)
+    config.write_text("[DEFAULT]\nREPRODUCIBLE_REDUCTIONS = true\n")
+    assert cache_key(str(src / "a.f90"), str(script), psyclone_args) != key
+
+
+def test_get_put(tmp_path):
+    """
+    Test that entries are stored and retrieved.
+    """
+    cache = TransformCache(tmp_path / "cache")
+    assert cache.get("ab" * 32) is None
+    cache.put("ab" * 32, "PROGRAM test\nEND PROGRAM test\n", {"seconds": 1.0})
+    cache.put("ab" * 32, "PROGRAM test\nEND PROGRAM test\n", {"seconds": 2.0})
+    output, summary = cache.get("ab" * 32)
+    assert output == "PROGRAM test\nEND PROGRAM test\n"
+    assert summary == {"seconds": 2.0}
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert len(cache) == 1
+    assert not any(
+        name.endswith(".tmp")
+        for _, _, files in os.walk(cache.directory)
+        for name in files
+    )
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_temporaries(tmp_path):
+    """
+    Test that temporary files left behind by interrupted writes are removed
+    on eviction when they are stale, or when the cache is cleared, but not
+    when the cache is opened.
+    """
+    cache = TransformCache(tmp_path / "cache")
+    stale = tmp_path / "cache" / "ab" / "stale.tmp"
+    fresh = tmp_path / "cache" / "ab" / "fresh.tmp"
+    stale.parent.mkdir()
+    stale.write_text("{")
+    fresh.write_text("{")
+    os.utime(stale, (0, 0))
+    cache = TransformCache(tmp_path / "cache")
+    assert stale.exists()
+    assert cache.evict() == 0
+    assert not stale.exists()
+    assert fresh.exists()
+    cache.clear()
+    assert not fresh.exists()
+
+
+def test_evict(tmp_path):
+    """
+    Test that the least recently used entries are evicted first.
+    """
+    cache = TransformCache(tmp_path / "cache", max_bytes=None)
+    keys = [f"{i:064x}" for i in range(4)]
+    for i, key in enumerate(keys):
+        cache.put(key, "x" * 100)
+        path = cache._path(key)
+        os.utime(path, (i, i))
+    os.utime(cache._path(keys[0]), (10, 10))
+    size = cache.size() // 4
+    assert cache.evict() == 0
+    cache.max_bytes = 2 * size
+    assert cache.evict() == 2
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[3]) is not None
+    with pytest.raises(ValueError):
+        TransformCache(tmp_path / "cache", max_bytes=-1)
+
+
+def test_transform_files_cached(sources, tmp_path):
+    """
+    Test that :func:`transform_files` serves unchanged files from the cache.
+    """
+    src, script = sources
+    cache = TransformCache(tmp_path / "cache")
+    kwargs = {"jobs": 1, "cache": cache}
+    first = transform_files([str(src)], str(script), tmp_path / "1", **kwargs)
+    assert [result.cached for result in first] == [False, False]
+    (src / "b.f90").write_text(cs.double_loop_with_3_assignments)
+    second = transform_files([str(src)], str(script), tmp_path / "2", **kwargs)
+    assert [result.cached for result in second] == [True, False]
+    assert all(result.ok for result in second)
+    assert second[0].summary == first[0].summary
+    assert second[0].summary["directives"] == {"acc kernels": 1}
+    expected = (tmp_path / "1" / "a.f90").read_text()
+    assert (tmp_path / "2" / "a.f90").read_text() == expected
+    assert "!$acc kernels" in (tmp_path / "2" / "b.f90").read_text()
+    assert len(cache) == 3
@@ -53,3 +53,33 @@ def test_avoid_array_notation_subroutine(fortran_reader):
     convert_array_notation(schedule)
     assert len(schedule.walk(nodes.Call)) == 1
     assert len(schedule.walk(nodes.Range)) == 0
+
+
+def test_convert_array_notation_counts(fortran_reader):
+    """
+    Test that :func:`convert_array_notation` reports the numbers of References
+    converted and skipped.
+    """
+    schedule = get_schedule(fortran_reader, cs.pointer_assignment)
+    counts = convert_array_notation(schedule)
+    assert counts.converted == 1
+    assert counts.skipped == 2
+    assert convert_array_notation(schedule) == (0, 2)
+
+
+def test_convert_array_notation_multiple(fortran_reader):
+    """
+    Test that :func:`convert_array_notation` converts several Schedules, or a
+    whole Container, at once.
+    """
+    schedules = [
+        get_schedule(fortran_reader, implied_array_assignment[dim])
+        for dim in (1, 2, 3)
+    ]
+    assert convert_array_notation(schedules).converted == 3
+    assert [len(s.walk(nodes.Range)) for s in schedules] == [1, 2, 3]
+    container = fortran_reader.psyir_from_source(
+        cs.implied_array_assignment_2d
+    )
+    assert convert_array_notation(container).converted == 1
+    assert len(container.walk(nodes.Range)) == 2
@@ -0,0 +1,116 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+"""
+Unit tests for PSyTran's `cost` module.
+"""
+
+import pytest
+from psyclone.psyir import nodes
+from utils import get_schedule, simple_loop_code
+
+import code_snippets as cs
+from psytran.cost import (
+    estimate_cost,
+    estimate_costs,
+    estimate_trip_count,
+    is_worth_offloading,
+    rank_nests,
+)
+
+
+def test_estimate_trip_count_typeerror(fortran_reader):
+    """
+    Test that a :class:`TypeError` is raised when :func:`estimate_trip_count`
+    is called with a non-Loop.
+    """
+    schedule = get_schedule(fortran_reader, cs.loop_with_1_assignment)
+    with pytest.raises(TypeError, match="Expected a Loop"):
+        estimate_trip_count(schedule)
+
+
+def test_estimate_trip_count(fortran_reader):
+    """
+    Test that :func:`estimate_trip_count` evaluates literal and ``PARAMETER``
+    bounds and gives symbolic expressions otherwise.
+    """
+    schedule = get_schedule(fortran_reader, cs.loop_with_parameter_bounds)
+    outer, inner = schedule.walk(nodes.Loop)
+    assert estimate_trip_count(outer) == (9, "9")
+    assert estimate_trip_count(inner) == (None, "(n - 2) / 2 + 1")
+    schedule = get_schedule(fortran_reader, cs.loop_with_recurrence)
+    assert estimate_trip_count(schedule.walk(nodes.Loop)[0]) == (9, "9")
+
+
+@pytest.mark.parametrize("default_trip_count", [0, 100])
+def test_estimate_costs(fortran_reader, default_trip_count):
+    """
+    Test that :func:`estimate_costs` accumulates the work of inner Loops and
+    uses the default trip count for unknown bounds.
+    """
+    schedule = get_schedule(fortran_reader, cs.loop_with_parameter_bounds)
+    costs = estimate_costs(schedule, default_trip_count=default_trip_count)
+    outer, inner = (costs[loop] for loop in schedule.walk(nodes.Loop))
+    assert (outer.depth, inner.depth) == (0, 1)
+    assert (outer.nest_depth, inner.nest_depth) == (2, 1)
+    assert (outer.operations, inner.operations) == (2, 3)
+    assert inner.work == 3 * default_trip_count
+    assert outer.work == 9 * (2 + inner.work)
+    assert not outer.exact and not inner.exact
+
+
+def test_estimate_costs_valueerror(fortran_reader):
+    """
+    Test that errors are raised for invalid default trip counts.
+    """
+    schedule = get_schedule(fortran_reader, cs.loop_with_1_assignment)
+    with pytest.raises(TypeError, match="Expected an int"):
+        estimate_costs(schedule, default_trip_count=1.5)
+    with pytest.raises(ValueError, match="non-negative"):
+        estimate_costs(schedule, default_trip_count=-1)
+
+
+def test_estimate_cost(fortran_reader, nest_depth):
+    """
+    Test that :func:`estimate_cost` agrees with :func:`estimate_costs`.
+    """
+    schedule = get_schedule(fortran_reader, simple_loop_code(nest_depth))
+    costs = estimate_costs(schedule)
+    for loop in schedule.walk(nodes.Loop):
+        cost = estimate_cost(loop)
+        assert cost.exact
+        assert cost.work == costs[loop].work
+        assert cost.depth == costs[loop].depth
+    assert costs[schedule.walk(nodes.Loop)[0]].work == 10**nest_depth
+
+
+def test_rank_nests(fortran_reader):
+    """
+    Test that :func:`rank_nests` orders outer Loops by decreasing work.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_2_loops)
+    ranked = rank_nests(schedule)
+    assert [cost.depth for cost in ranked] == [0]
+    schedule = get_schedule(fortran_reader, cs.loop_with_parameter_bounds)
+    schedule.addchild(schedule.walk(nodes.Loop)[1].copy())
+    ranked = rank_nests(schedule)
+    assert [cost.loop.variable.name for cost in ranked] == ["j", "i"]
+    assert ranked[0].work > ranked[1].work
+
+
+def test_is_worth_offloading(fortran_reader):
+    """
+    Test that :func:`is_worth_offloading` compares the estimated work against
+    the launch overhead.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_1_assignment)
+    loop = schedule.walk(nodes.Loop)[0]
+    assert not is_worth_offloading(loop)
+    assert is_worth_offloading(loop, launch_overhead=100)
+    assert not is_worth_offloading(estimate_cost(loop), launch_overhead=101)
+    schedule = get_schedule(fortran_reader, cs.loop_with_parameter_bounds)
+    loop = schedule.walk(nodes.Loop)[0]
+    assert is_worth_offloading(loop)
+    assert not is_worth_offloading(loop, assume_large=False)
@@ -0,0 +1,164 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+"""
+Unit tests for PSyTran's `data` module.
+"""
+
+import pytest
+from psyclone.psyir import nodes
+from psyclone.psyir.backend.fortran import FortranWriter
+from psyclone.psyir.nodes import ACCKernelsDirective
+from utils import get_kernels_schedule, get_schedule
+
+import code_snippets as cs
+from psytran.data import (
+    DataRegionDirective,
+    data_clauses,
+    get_array_accesses,
+    insert_data_regions,
+)
+
+
+def test_get_array_accesses(fortran_reader):
+    """
+    Test that :func:`get_array_accesses` finds the arrays read and written,
+    but not scalars.
+    """
+    schedule = get_schedule(fortran_reader, cs.time_loop_with_work_array)
+    loops = schedule.walk(nodes.Loop)
+    accesses = get_array_accesses(loops[1])
+    assert accesses.reads == {"a", "b"}
+    assert accesses.writes == {"work"}
+    accesses = get_array_accesses(loops[0])
+    assert accesses.reads == {"a", "b", "work"}
+    assert accesses.writes == {"b", "work"}
+
+
+def test_data_clauses(fortran_reader):
+    """
+    Test that :func:`data_clauses` chooses clauses from the accesses before
+    and after a span of Nodes.
+    """
+    schedule = get_kernels_schedule(
+        fortran_reader, cs.time_loop_with_work_array
+    )
+    clauses = data_clauses(schedule.children[:2])
+    assert clauses == {
+        "copyin": ["a"],
+        "copyout": ["c"],
+        "copy": ["b"],
+        "create": ["work"],
+    }
+    clauses = data_clauses(schedule.children[1:2])
+    assert clauses == {
+        "copyin": ["b"],
+        "copyout": ["c"],
+        "copy": [],
+        "create": [],
+    }
+
+
+def test_data_clauses_loop(fortran_reader):
+    """
+    Test that :func:`data_clauses` accounts for accesses in an enclosing Loop.
+    """
+    schedule = get_kernels_schedule(
+        fortran_reader, cs.time_loop_with_work_array
+    )
+    clauses = data_clauses(schedule.children[0].loop_body.children[:1])
+    assert clauses == {
+        "copyin": ["a", "b"],
+        "copyout": [],
+        "copy": ["work"],
+        "create": [],
+    }
+
+
+@pytest.mark.parametrize("span", [[], "not adjacent", "no routine"])
+def test_data_clauses_valueerror(fortran_reader, span):
+    """
+    Test that a :class:`ValueError` is raised when :func:`data_clauses` is
+    given an invalid span.
+    """
+    schedule = get_kernels_schedule(
+        fortran_reader, cs.time_loop_with_work_array
+    )
+    if span == "not adjacent":
+        span = [schedule.children[0], schedule.children[2]]
+        expected = "Expected adjacent sibling nodes."
+    elif span == "no routine":
+        span = [schedule.children[0].detach()]
+        expected = "Expected nodes within a Routine."
+    else:
+        expected = "Expected at least one node."
+    with pytest.raises(ValueError, match=expected):
+        data_clauses(span)
+
+
+def test_insert_data_regions(fortran_reader):
+    """
+    Test that :func:`insert_data_regions` places a single data region around
+    all kernels regions whose arrays are not accessed on the host.
+    """
+    schedule = get_kernels_schedule(
+        fortran_reader, cs.time_loop_with_work_array
+    )
+    regions = insert_data_regions(schedule)
+    assert len(regions) == 1
+    assert isinstance(regions[0], DataRegionDirective)
+    assert regions[0].parent is schedule
+    assert len(regions[0].walk(ACCKernelsDirective)) == 3
+    assert isinstance(schedule.children[1], nodes.Assignment)
+    code = FortranWriter()(schedule)
+    expected = "!$acc data copyin(a), copyout(c), copy(b), create(work)"
+    assert expected in code
+    assert "!$acc end data" in code
+
+
+def test_insert_data_regions_host_access(fortran_reader):
+    """
+    Test that :func:`insert_data_regions` places data regions within a Loop
+    if an array accessed on the device is accessed on the host within it.
+    """
+    schedule = get_kernels_schedule(
+        fortran_reader, cs.time_loop_with_host_access
+    )
+    regions = insert_data_regions(schedule)
+    assert len(regions) == 2
+    assert regions[0].parent is schedule.children[0].loop_body
+    assert regions[1].parent is schedule
+    code = FortranWriter()(schedule)
+    assert "!$acc data copyin(a), copy(b), create(work)" in code
+    assert "!$acc data copyin(b), copyout(c)" in code
+
+
+def test_insert_data_regions_call(fortran_reader):
+    """
+    Test that :func:`insert_data_regions` does not place data regions around
+    calls to routines.
+    """
+    schedule = get_kernels_schedule(
+        fortran_reader, cs.loops_with_intervening_statements
+    )
+    regions = insert_data_regions(schedule)
+    assert len(regions) == 2
+    assert len(regions[0].walk(ACCKernelsDirective)) == 2
+    assert isinstance(regions[0].dir_body.children[1], nodes.Assignment)
+    assert isinstance(schedule.children[1], nodes.Call)
+
+
+def test_insert_data_regions_nested(fortran_reader):
+    """
+    Test that :func:`insert_data_regions` leaves kernels regions which are
+    already within data regions unchanged.
+    """
+    schedule = get_kernels_schedule(
+        fortran_reader, cs.time_loop_with_work_array
+    )
+    insert_data_regions(schedule)
+    assert insert_data_regions(schedule) == []
+    assert insert_data_regions(schedule.children[0]) == []
+    assert len(schedule.walk(DataRegionDirective)) == 1
@@ -0,0 +1,150 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+"""
+Unit tests for PSyTran's `dependency` module.
+"""
+
+import gc
+
+import pytest
+
+from psyclone.psyir import nodes
+from psyclone.psyir.symbols import REAL_TYPE, ArrayType, DataSymbol
+from utils import get_schedule
+
+import code_snippets as cs
+from psytran.dependency import DependencyCache, get_dependency_cache
+from psytran.loop import is_parallelisable
+
+
+def test_dependency_cache_typeerror(fortran_reader):
+    """
+    Test that a :class:`TypeError` is raised when the dependency cache is
+    queried with something other than a :class:`Loop`.
+    """
+    schedule = get_schedule(fortran_reader, cs.loop_with_1_assignment)
+    assignment = schedule.walk(nodes.Assignment)[0]
+    expected = (
+        "Expected a Loop, not"
+        " '<class 'psyclone.psyir.nodes.assignment.Assignment'>'."
+    )
+    with pytest.raises(TypeError, match=expected):
+        DependencyCache().independent_iterations(assignment)
+
+
+def test_dependency_cache_resize_valueerror():
+    """
+    Test that a :class:`ValueError` is raised when the dependency cache is
+    given a negative size.
+    """
+    with pytest.raises(ValueError, match="Expected a non-negative size"):
+        DependencyCache(maxsize=-1)
+
+
+def test_dependency_cache_hits(fortran_reader):
+    """
+    Test that repeated queries of an unmodified loop are served from the
+    dependency cache.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_1_assignment)
+    loops = schedule.walk(nodes.Loop)
+    cache = DependencyCache()
+    for _ in range(3):
+        for loop in loops:
+            assert cache.independent_iterations(loop)
+    info = cache.info()
+    assert info.misses == 2
+    assert info.hits == 4
+    assert info.currsize == 2
+    cache.clear()
+    assert cache.info().currsize == 0
+    assert cache.info().hits == 0
+
+
+def test_dependency_cache_invalidation(fortran_reader):
+    """
+    Test that modifying a loop body invalidates its dependency cache entry.
+    """
+    schedule = get_schedule(fortran_reader, cs.loop_with_1_assignment)
+    loop = schedule.walk(nodes.Loop)[0]
+    cache = DependencyCache()
+    assert cache.independent_iterations(loop)
+
+    # Make the loop body read a value written in a different iteration
+    dependent = get_schedule(fortran_reader, cs.loop_with_recurrence)
+    assignment = dependent.walk(nodes.Assignment)[0]
+    loop.loop_body.children[0].replace_with(assignment.detach())
+    assert not cache.independent_iterations(loop)
+    info = cache.info()
+    assert info.misses == 2
+    assert info.invalidations == 1
+    assert info.hits == 0
+
+
+def test_dependency_cache_symbol_invalidation(fortran_reader):
+    """
+    Test that changing a Symbol referred to by a loop invalidates its
+    dependency cache entry, even though the tree itself is unchanged.
+    """
+    schedule = get_schedule(fortran_reader, cs.loop_with_1_assignment)
+    loop = schedule.walk(nodes.Loop)[0]
+    symbol = schedule.symbol_table.lookup("a")
+    cache = DependencyCache()
+    assert cache.independent_iterations(loop)
+    symbol.datatype = ArrayType(REAL_TYPE, [20])
+    assert cache.independent_iterations(loop)
+    reference = loop.walk(nodes.ArrayReference)[0]
+    reference.symbol = DataSymbol("b", ArrayType(REAL_TYPE, [10]))
+    assert cache.independent_iterations(loop)
+    assert cache.independent_iterations(loop)
+    info = cache.info()
+    assert info.invalidations == 2
+    assert info.hits == 1
+
+
+def test_dependency_cache_weak(fortran_reader):
+    """
+    Test that the dependency cache does not keep loops alive.
+    """
+    schedule = get_schedule(fortran_reader, cs.loop_with_1_assignment)
+    copy = schedule.copy()
+    cache = DependencyCache()
+    assert cache.independent_iterations(copy.walk(nodes.Loop)[0])
+    assert cache.info().currsize == 1
+    del copy
+    gc.collect()
+    assert cache.info().currsize == 0
+
+
+def test_dependency_cache_eviction(fortran_reader):
+    """
+    Test that the least recently used entry is evicted when the dependency
+    cache is full.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_2_loops)
+    loops = schedule.walk(nodes.Loop)
+    cache = DependencyCache(maxsize=2)
+    for loop in loops:
+        cache.independent_iterations(loop)
+    assert cache.info().evictions == 1
+    cache.independent_iterations(loops[2])
+    assert cache.info().hits == 1
+    cache.independent_iterations(loops[0])
+    assert cache.info().misses == 4
+    cache.resize(0)
+    assert cache.info().currsize == 0
+
+
+def test_is_parallelisable_cached(fortran_reader):
+    """
+    Test that :func:`is_parallelisable` uses the shared dependency cache.
+    """
+    schedule = get_schedule(fortran_reader, cs.loop_with_1_assignment)
+    loop = schedule.walk(nodes.Loop)[0]
+    hits = get_dependency_cache().info().hits
+    assert is_parallelisable(loop)
+    assert is_parallelisable(loop)
+    assert get_dependency_cache().info().hits == hits + 1
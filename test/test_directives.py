@@ -24,17 +24,29 @@ from psyclone.transformations import (
     ACCLoopTrans,
     OMPLoopTrans,
 )
-from utils import get_schedule, has_clause
+from utils import get_kernels_schedule, get_schedule, has_clause
 
 import code_snippets as cs
-from psytran.clauses import has_gang_clause, has_seq_clause, has_vector_clause
+from psytran.clauses import (
+    has_collapse_clause,
+    has_gang_clause,
+    has_seq_clause,
+    has_vector_clause,
+)
 from psytran.directives import (
     apply_parallel_directive,
+    apply_parallel_directives,
     apply_loop_directive,
+    apply_loop_directives,
+    build_directive_map,
+    drop_directive_map,
+    get_directive_map,
     has_parallel_directive,
     has_loop_directive,
+    merge_kernels_regions,
     _check_directive,
 )
+from psytran.queues import assign_async_queues
 
 
 def test_apply_directive_typeerror(fortran_reader, trans_directive):
@@ -285,3 +297,253 @@ def test_has_no_loop_directive(fortran_reader):
     schedule = get_schedule(fortran_reader, cs.loop_with_1_assignment)
     loops = schedule.walk(nodes.Loop)
     assert not has_loop_directive(loops[0])
+
+
+def test_apply_loop_directives(fortran_reader):
+    """
+    Test that :func:`apply_loop_directives` applies ``loop`` directives to a
+    batch of loops and records a result for each.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_2_loops)
+    loops = schedule.walk(nodes.Loop)
+    apply_parallel_directive(loops[0], ACCKernelsTrans)
+    results = apply_loop_directives(loops[::-1], ACCLoopTrans())
+    assert len(results) == 3
+    for loop, result in zip(loops[::-1], results):
+        assert result.node is loop
+        assert result.applied
+        assert result.error is None
+        assert isinstance(loop.parent.parent, ACCLoopDirective)
+
+
+def test_apply_loop_directives_failures(fortran_reader):
+    """
+    Test that :func:`apply_loop_directives` records failures for individual
+    loops rather than raising.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_2_loops)
+    loops = schedule.walk(nodes.Loop)
+    assignment = schedule.walk(nodes.Assignment)[0]
+    apply_parallel_directive(loops[1], ACCKernelsTrans)
+    batch = [loops[0], loops[1], assignment]
+    results = apply_loop_directives(batch, ACCLoopTrans())
+    assert not results[0]
+    assert isinstance(results[0].error, ValueError)
+    assert results[1]
+    assert isinstance(loops[1].parent.parent, ACCLoopDirective)
+    assert not results[2]
+    assert isinstance(results[2].error, TypeError)
+    assert not isinstance(loops[0].parent.parent, ACCLoopDirective)
+
+
+def test_apply_loop_directives_collapse(fortran_reader):
+    """
+    Test that :func:`apply_loop_directives` applies a ``collapse`` clause to
+    an outer loop before attempting the loops it covers.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_1_assignment)
+    loops = schedule.walk(nodes.Loop)
+    apply_parallel_directive(loops[0], ACCKernelsTrans)
+    options = {"collapse": 2}
+    results = apply_loop_directives(loops[::-1], ACCLoopTrans(), options)
+    assert results[1]
+    assert has_clause["collapse"](loops[1])
+
+
+@pytest.mark.parametrize(
+    "code, collapse",
+    [
+        (cs.triple_loop_with_1_assignment, 3),
+        (cs.dependent_triple_subloop, 2),
+        (cs.loop_with_1_assignment, None),
+    ],
+)
+def test_apply_loop_directive_auto_collapse(fortran_reader, code, collapse):
+    """
+    Test that :func:`apply_loop_directive` and :func:`apply_loop_directives`
+    collapse as many loops as is legal when asked to.
+    """
+    for apply in (apply_loop_directive, apply_loop_directives):
+        schedule = get_schedule(fortran_reader, code)
+        loop = schedule.walk(nodes.Loop)[0]
+        apply_parallel_directive(loop, ACCKernelsTrans)
+        options = {"collapse": 1}
+        if apply is apply_loop_directive:
+            apply(loop, ACCLoopTrans(), options, auto_collapse=True)
+        else:
+            apply([loop], ACCLoopTrans(), options, auto_collapse=True)
+        assert loop.parent.parent.collapse == collapse
+        assert options == {"collapse": 1}
+
+
+def test_apply_parallel_directives(fortran_reader, trans_directive):
+    """
+    Test that :func:`apply_parallel_directives` applies directives to a
+    batch of blocks and records a result for each.
+    """
+    trans, directive = trans_directive
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_2_loops)
+    loops = schedule.walk(nodes.Loop)
+    results = apply_parallel_directives([loops[1], loops[2]], trans)
+    assert all(results)
+    assert isinstance(loops[1].parent.parent, directive)
+    assert isinstance(loops[2].parent.parent, directive)
+    with pytest.raises(TypeError, match="Expected a dict"):
+        apply_parallel_directives([loops[0]], trans, options=0)
+
+
+def _directive_queries(schedule):
+    """
+    Evaluate every directive and clause query for every Loop in a Schedule.
+    """
+    return [
+        (
+            has_parallel_directive(loop, nodes.ACCKernelsDirective),
+            has_parallel_directive(loop, nodes.OMPParallelDirective),
+            has_loop_directive(loop),
+            has_seq_clause(loop),
+            has_gang_clause(loop),
+            has_vector_clause(loop),
+            has_collapse_clause(loop),
+        )
+        for loop in schedule.walk(nodes.Loop)
+    ]
+
+
+@pytest.mark.parametrize(
+    "code, options",
+    [
+        (cs.quadruple_loop_with_1_assignment, [{"collapse": 2}, {}, {}, {}]),
+        (cs.quadruple_loop_with_1_assignment, [{}, {"collapse": 3}, {}, {}]),
+        (cs.triple_loop_with_1_assignment, [{"gang": True}, {}, {}]),
+        (
+            cs.double_loop_with_2_loops,
+            [{"sequential": True}, {"vector": True}],
+        ),
+        (cs.imperfectly_nested_triple_loop1_before, [{"collapse": 2}, {}, {}]),
+    ],
+)
+def test_directive_map(fortran_reader, code, options):
+    """
+    Test that the queries give the same answers with and without a
+    :class:`DirectiveMap`.
+    """
+    schedule = get_schedule(fortran_reader, code)
+    loops = schedule.walk(nodes.Loop)
+    apply_parallel_directive(loops[0], ACCKernelsTrans)
+    for loop, loop_options in zip(loops, options):
+        apply_loop_directive(loop, ACCLoopTrans(), options=loop_options)
+    expected = _directive_queries(schedule)
+    directive_map = build_directive_map(schedule)
+    try:
+        assert build_directive_map(schedule) is directive_map
+        assert get_directive_map(loops[-1]) is directive_map
+        assert len(directive_map) == len(loops)
+        assert _directive_queries(schedule) == expected
+        info = directive_map[loops[0]]
+        assert isinstance(info.directive, ACCLoopDirective)
+        assert isinstance(info.regions[-1], ACCKernelsDirective)
+    finally:
+        drop_directive_map(schedule)
+    assert get_directive_map(loops[0]) is None
+
+
+def test_directive_map_stale(fortran_reader, loop_trans):
+    """
+    Test that a :class:`DirectiveMap` is rebuilt when the tree is modified.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_1_assignment)
+    loops = schedule.walk(nodes.Loop)
+    directive_map = build_directive_map(schedule)
+    try:
+        assert not has_loop_directive(loops[0])
+        if isinstance(loop_trans, ACCLoopTrans):
+            apply_parallel_directive(loops[0], ACCKernelsTrans)
+        apply_loop_directive(loops[0], loop_trans)
+        assert directive_map.stale
+        assert has_loop_directive(loops[0])
+        assert not directive_map.stale
+        assert not has_loop_directive(loops[1])
+        with pytest.raises(KeyError):
+            directive_map[schedule.copy().walk(nodes.Loop)[0]]
+    finally:
+        drop_directive_map(schedule)
+
+
+def test_merge_kernels_regions_adjacent(fortran_reader):
+    """
+    Test that :func:`merge_kernels_regions` merges adjacent kernels regions,
+    preserving the loop directives within them.
+    """
+    schedule = get_kernels_schedule(
+        fortran_reader, cs.sibling_double_loops, outer=True
+    )
+    for loop in schedule.walk(nodes.Loop):
+        if loop.ancestor(nodes.Loop) is None:
+            apply_loop_directive(loop, ACCLoopTrans())
+    assert len(schedule.walk(ACCKernelsDirective)) == 4
+    merged = merge_kernels_regions(schedule)
+    assert len(merged) == 1
+    assert schedule.walk(ACCKernelsDirective) == merged
+    assert len(merged[0].dir_body.children) == 4
+    assert len(schedule.walk(ACCLoopDirective)) == 4
+
+
+def test_merge_kernels_regions_statements(fortran_reader):
+    """
+    Test that :func:`merge_kernels_regions` includes statements between
+    kernels regions, but not those which cannot be offloaded.
+    """
+    schedule = get_kernels_schedule(
+        fortran_reader, cs.loops_with_intervening_statements, outer=True
+    )
+    merged = merge_kernels_regions(schedule)
+    assert len(merged) == 1
+    body = merged[0].dir_body.children
+    assert [type(child) for child in body] == [
+        nodes.Loop,
+        nodes.Assignment,
+        nodes.Loop,
+    ]
+    assert isinstance(merged[0].parent.children[1], nodes.Call)
+    assert len(schedule.walk(ACCKernelsDirective)) == 2
+
+
+def test_merge_kernels_regions_no_statements(fortran_reader):
+    """
+    Test that :func:`merge_kernels_regions` does not merge kernels regions
+    separated by statements if asked not to.
+    """
+    schedule = get_kernels_schedule(
+        fortran_reader, cs.loops_with_intervening_statements, outer=True
+    )
+    assert not merge_kernels_regions(schedule, include_statements=False)
+    assert len(schedule.walk(ACCKernelsDirective)) == 3
+
+
+def test_merge_kernels_regions_default_present(fortran_reader):
+    """
+    Test that :func:`merge_kernels_regions` does not merge kernels regions
+    with different ``default(present)`` clauses.
+    """
+    schedule = get_schedule(fortran_reader, cs.sibling_double_loops)
+    for i, loop in enumerate(schedule.children):
+        options = {"default_present": i >= 2}
+        apply_parallel_directive(loop, ACCKernelsTrans, options=options)
+    regions = schedule.walk(ACCKernelsDirective)
+    merged = merge_kernels_regions(schedule)
+    assert merged == [regions[0], regions[2]]
+    assert [region.default_present for region in merged] == [False, True]
+
+
+def test_merge_kernels_regions_async(fortran_reader):
+    """
+    Test that :func:`merge_kernels_regions` does not merge kernels regions
+    with ``async`` clauses, which would be lost.
+    """
+    schedule = get_schedule(fortran_reader, cs.sibling_double_loops)
+    for loop in schedule.children:
+        apply_parallel_directive(loop, ACCKernelsTrans)
+    regions = assign_async_queues(schedule)
+    assert not merge_kernels_regions(schedule)
+    assert schedule.walk(ACCKernelsDirective) == regions
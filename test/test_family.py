@@ -19,6 +19,10 @@ from psytran.family import (
     get_descendents,
     has_ancestor,
     has_descendent,
+    is_ancestor,
+    is_descendent,
+    iter_ancestors,
+    iter_descendents,
 )
 
 get_relative = {
@@ -26,6 +30,11 @@ get_relative = {
     "ancestor": get_ancestors,
 }
 
+iter_relative = {
+    "descendent": iter_descendents,
+    "ancestor": iter_ancestors,
+}
+
 
 def test_get_relatives_typeerror1(fortran_reader, relative):
     """
@@ -52,6 +61,52 @@ def test_get_relatives_typeerror2(fortran_reader, relative):
         get_relative[relative](loops[0], depth=2.0)
 
 
+def test_iter_relatives_typeerror(fortran_reader, relative):
+    """
+    Test that an :class:`AssertionError` is raised as soon as
+    :func:`iter_descendents` or :func:`iter_ancestors` is called with invalid
+    arguments, rather than when iteration begins.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_1_assignment)
+    loops = schedule.walk(nodes.Loop)
+    expected = "Expected a bool, not '<class 'int'>'."
+    with pytest.raises(AssertionError, match=expected):
+        iter_relative[relative](loops[0], inclusive=0)
+
+
+def test_iter_relatives(fortran_reader, nest_depth, inclusive, relative):
+    """
+    Test that :func:`iter_descendents` and :func:`iter_ancestors` generate the
+    same nodes as :func:`get_descendents` and :func:`get_ancestors`.
+    """
+    schedule = get_schedule(fortran_reader, simple_loop_code(nest_depth))
+    for node in schedule.walk(nodes.Node):
+        for depth in (None, node.depth - 2, node.depth + 2):
+            kwargs = {
+                "node_type": nodes.Node,
+                "inclusive": inclusive,
+                "depth": depth,
+            }
+            expected = get_relative[relative](node, **kwargs)
+            result = list(iter_relative[relative](node, **kwargs))
+            assert len(result) == len(expected)
+            assert all(a is b for a, b in zip(result, expected))
+
+
+def test_iter_descendents_lazy(fortran_reader):
+    """
+    Test that :func:`iter_descendents` generates descendents lazily, in the
+    same order as :meth:`Node.walk`.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_2_loops)
+    loops = schedule.walk(nodes.Loop)
+    descendents = iter_descendents(schedule, node_type=nodes.Loop)
+    assert next(descendents) is loops[0]
+    assert next(descendents) is loops[1]
+    assert next(descendents) is loops[2]
+    assert next(descendents, None) is None
+
+
 def test_get_descendents_loop(fortran_reader, nest_depth, inclusive):
     """
     Test that :func:`get_descendents` correctly finds the right number of
@@ -183,3 +238,36 @@ def test_has_ancestor_name(fortran_reader):
     assignment = schedule.walk(nodes.Assignment)[0]
     assert has_ancestor(assignment, nodes.Loop, name="i")
     assert not has_ancestor(assignment, nodes.Loop, name="j")
+
+
+def test_is_ancestor_descendent(fortran_reader, nest_depth, inclusive):
+    """
+    Test that :func:`is_ancestor` and :func:`is_descendent` correctly determine
+    whether one node is an ancestor or descendent of another.
+    """
+    schedule = get_schedule(fortran_reader, simple_loop_code(nest_depth))
+    loops = schedule.walk(nodes.Loop)
+    assignment = schedule.walk(nodes.Assignment)[0]
+    for i, loop in enumerate(loops):
+        assert is_ancestor(loop, assignment, inclusive=inclusive)
+        assert is_descendent(assignment, loop, inclusive=inclusive)
+        assert not is_ancestor(assignment, loop, inclusive=inclusive)
+        assert is_ancestor(loop, loop, inclusive=inclusive) == inclusive
+        for j, other in enumerate(loops):
+            if i != j:
+                assert is_ancestor(loop, other) == (i < j)
+                assert is_descendent(loop, other) == (i > j)
+
+
+def test_is_ancestor_siblings(fortran_reader):
+    """
+    Test that :func:`is_ancestor` distinguishes between sibling loops which
+    are structurally identical.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_2_loops)
+    loops = schedule.walk(nodes.Loop)
+    assignments = schedule.walk(nodes.Assignment)
+    assert is_ancestor(loops[1], assignments[0])
+    assert not is_ancestor(loops[1], assignments[1])
+    assert is_ancestor(loops[2], assignments[1])
+    assert not is_ancestor(loops[2], assignments[0])
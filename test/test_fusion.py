@@ -0,0 +1,109 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+"""
+Unit tests for PSyTran's `fusion` module.
+"""
+
+import pytest
+from psyclone.psyir import nodes
+from utils import get_schedule
+
+import code_snippets as cs
+from psytran.fusion import (
+    can_fuse,
+    find_fusible_loops,
+    fuse_adjacent_loops,
+    fuse_loops,
+)
+from psytran.loop import is_perfectly_nested
+
+
+def _outer_loops(schedule):
+    """
+    Get the Loops which are children of a Schedule.
+    """
+    return [node for node in schedule.children if isinstance(node, nodes.Loop)]
+
+
+def test_can_fuse(fortran_reader):
+    """
+    Test that :func:`can_fuse` checks the bounds of Loops and the
+    dependencies between them.
+    """
+    schedule = get_schedule(fortran_reader, cs.sibling_double_loops)
+    loops = _outer_loops(schedule)
+    assert can_fuse(loops[0], loops[1])
+    assert can_fuse(loops[1], loops[2])
+    assert not can_fuse(loops[0], loops[3])
+    inner = [loop.loop_body.children[0] for loop in loops]
+    assert not can_fuse(inner[1], inner[2])
+    with pytest.raises(TypeError, match="Expected a Loop"):
+        can_fuse(schedule, loops[0])
+
+
+def test_find_fusible_loops(fortran_reader):
+    """
+    Test that :func:`find_fusible_loops` finds maximal runs of adjacent Loops
+    which may all be fused together.
+    """
+    schedule = get_schedule(fortran_reader, cs.sibling_double_loops)
+    loops = _outer_loops(schedule)
+    runs = find_fusible_loops(schedule)
+    assert len(runs) == 1
+    assert len(runs[0]) == 3
+    assert all(a is b for a, b in zip(runs[0], loops))
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_2_loops)
+    (run,) = find_fusible_loops(schedule)
+    assert [loop.variable.name for loop in run] == ["i", "i"]
+    schedule = get_schedule(fortran_reader, cs.loop_with_1_assignment)
+    assert not find_fusible_loops(schedule)
+
+
+@pytest.mark.parametrize("nests", [True, False])
+def test_fuse_adjacent_loops(fortran_reader, nests):
+    """
+    Test that :func:`fuse_adjacent_loops` fuses runs of Loops and, if asked
+    to, the inner Loops which become adjacent.
+    """
+    schedule = get_schedule(fortran_reader, cs.sibling_double_loops)
+    loops = _outer_loops(schedule)
+    fused = fuse_adjacent_loops(schedule, nests=nests)
+    assert len(fused) == 1 and fused[0] is loops[0]
+    assert len(_outer_loops(schedule)) == 2
+    inner = _outer_loops(loops[0].loop_body)
+    assert len(inner) == (2 if nests else 3)
+    assert len(inner[0].loop_body.children) == (2 if nests else 1)
+    assert bool(find_fusible_loops(schedule)) != nests
+
+
+def test_fuse_loops_perfect(fortran_reader):
+    """
+    Test that fusing the two halves of a nest gives a perfect nest.
+    """
+    schedule = get_schedule(fortran_reader, cs.sibling_double_loops)
+    loops = _outer_loops(schedule)
+    fused = fuse_loops(loops[:2])
+    assert is_perfectly_nested(fused)
+    assert len(fused.walk(nodes.Assignment)) == 2
+
+
+def test_fuse_loops_valueerror(fortran_reader):
+    """
+    Test that :func:`fuse_loops` refuses Loops which may not be fused, without
+    modifying the tree.
+    """
+    schedule = get_schedule(fortran_reader, cs.sibling_double_loops)
+    loops = _outer_loops(schedule)
+    before = schedule.debug_string()
+    with pytest.raises(ValueError, match="at least two"):
+        fuse_loops(loops[:1])
+    with pytest.raises(ValueError, match="adjacent"):
+        fuse_loops([loops[0], loops[2]])
+    with pytest.raises(ValueError, match="same parent"):
+        fuse_loops([loops[0], loops[1].loop_body.children[0]])
+    with pytest.raises(ValueError, match="Cannot fuse loop 'j'"):
+        fuse_loops(loops)
+    assert schedule.debug_string() == before
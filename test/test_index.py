@@ -0,0 +1,198 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+"""
+Unit tests for PSyTran's `index` module.
+"""
+
+import gc
+import weakref
+
+import pytest
+from psyclone.psyir import nodes
+from psyclone.psyir.transformations import ACCKernelsTrans
+from psyclone.transformations import ACCLoopTrans
+from utils import get_schedule, simple_loop_code
+
+import code_snippets as cs
+from psytran.directives import apply_loop_directive, apply_parallel_directive
+from psytran.family import get_ancestors, get_descendents, is_ancestor
+from psytran.index import (
+    TraversalIndex,
+    build_index,
+    drop_index,
+    get_index,
+    tree_version,
+)
+
+
+def test_build_drop_index(fortran_reader):
+    """
+    Test that :func:`build_index` registers an index which is found by
+    :func:`get_index` and that :func:`drop_index` deregisters it.
+    """
+    schedule = get_schedule(fortran_reader, cs.loop_with_1_assignment)
+    assignment = schedule.walk(nodes.Assignment)[0]
+    assert get_index(assignment) is None
+    index = build_index(schedule)
+    assert build_index(schedule) is index
+    assert get_index(assignment) is index
+    assert len(index) == len(schedule.walk(nodes.Node))
+    drop_index(schedule)
+    assert get_index(assignment) is None
+
+
+def test_index_released(fortran_reader):
+    """
+    Test that a registered index does not keep its tree alive, and that the
+    nearest indexed ancestor of a Node is found.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_1_assignment)
+    outer, inner = schedule.walk(nodes.Loop)
+    assignment = schedule.walk(nodes.Assignment)[0]
+    build_index(schedule)
+    index = build_index(inner)
+    assert get_index(assignment) is index
+    assert get_index(outer) is not index
+    drop_index(schedule)
+    drop_index(inner)
+    copy = outer.copy()
+    index = weakref.ref(build_index(copy))
+    assert get_index(copy.walk(nodes.Assignment)[0]) is index()
+    del copy
+    gc.collect()
+    assert index() is None
+
+
+def test_index_descendents(fortran_reader, nest_depth, inclusive):
+    """
+    Test that the index gives the same descendents as walking the tree.
+    """
+    schedule = get_schedule(fortran_reader, simple_loop_code(nest_depth))
+    loops = schedule.walk(nodes.Loop)
+    node_types = (nodes.Node, nodes.Loop, (nodes.Loop, nodes.Reference))
+    expected = {
+        (i, j): get_descendents(loop, node_type=node_type, inclusive=inclusive)
+        for i, loop in enumerate(loops)
+        for j, node_type in enumerate(node_types)
+    }
+    index = build_index(schedule)
+    try:
+        for i, loop in enumerate(loops):
+            for j, node_type in enumerate(node_types):
+                kwargs = {"node_type": node_type, "inclusive": inclusive}
+                result = index.descendents(loop, **kwargs)
+                assert len(result) == len(expected[(i, j)])
+                assert all(a is b for a, b in zip(result, expected[(i, j)]))
+            depth = loop.depth + 2
+            kwargs = {"node_type": nodes.Loop, "depth": depth}
+            assert index.descendents(loop, **kwargs) == loop.walk(
+                nodes.Loop, depth=depth
+            )
+    finally:
+        drop_index(schedule)
+
+
+def test_index_ancestors(fortran_reader, nest_depth, inclusive):
+    """
+    Test that the index gives the same ancestors as walking the tree.
+    """
+    schedule = get_schedule(fortran_reader, simple_loop_code(nest_depth))
+    assignment = schedule.walk(nodes.Assignment)[0]
+    expected = get_ancestors(
+        assignment, node_type=nodes.Node, inclusive=inclusive
+    )
+    index = build_index(schedule)
+    try:
+        result = get_ancestors(
+            assignment, node_type=nodes.Node, inclusive=inclusive
+        )
+        assert len(result) == len(expected)
+        assert all(a is b for a, b in zip(result, expected))
+        assert result[-1] is schedule.root
+    finally:
+        drop_index(schedule)
+
+
+def test_index_stale(fortran_reader):
+    """
+    Test that the index is rebuilt when the tree is modified.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_1_assignment)
+    loops = schedule.walk(nodes.Loop)
+    index = build_index(schedule)
+    try:
+        assert not index.stale
+        assert get_ancestors(loops[1], node_type=nodes.Directive) == []
+        apply_parallel_directive(loops[0], ACCKernelsTrans)
+        apply_loop_directive(loops[1], ACCLoopTrans())
+        assert index.stale
+        ancestors = get_ancestors(loops[1], node_type=nodes.Directive)
+        assert not index.stale
+        assert len(ancestors) == 2
+        assert isinstance(ancestors[0], nodes.ACCLoopDirective)
+        assert isinstance(ancestors[1], nodes.ACCKernelsDirective)
+        assert len(get_descendents(schedule, node_type=nodes.Directive)) == 2
+    finally:
+        drop_index(schedule)
+
+
+def test_index_is_ancestor(fortran_reader):
+    """
+    Test that the interval-based ancestry check agrees with walking the tree.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_2_loops)
+    all_nodes = schedule.walk(nodes.Node)
+    expected = [
+        [is_ancestor(a, b, inclusive=True) for b in all_nodes]
+        for a in all_nodes
+    ]
+    index = build_index(schedule)
+    try:
+        for i, a in enumerate(all_nodes):
+            for j, b in enumerate(all_nodes):
+                assert (
+                    index.is_ancestor(a, b, inclusive=True) == expected[i][j]
+                )
+                assert is_ancestor(a, b) == (expected[i][j] and i != j)
+    finally:
+        drop_index(schedule)
+
+
+def test_tree_version(fortran_reader):
+    """
+    Test that :func:`tree_version` changes when the tree beneath a node is
+    modified, and that copies of a node keep their own version stamps.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_1_assignment)
+    loops = schedule.walk(nodes.Loop)
+    index = TraversalIndex(schedule)
+    outer, inner = tree_version(loops[0]), tree_version(loops[1])
+    copy = loops[0].copy()
+    copy_version = tree_version(copy)
+    copy.loop_body.children[0].detach()
+    assert tree_version(copy) != copy_version
+    assert tree_version(loops[0]) == outer
+    apply_parallel_directive(loops[1], ACCKernelsTrans)
+    assert tree_version(loops[0]) != outer
+    assert tree_version(loops[1]) == inner
+    assert index.stale
+
+
+def test_tree_version_unwatched(fortran_reader):
+    """
+    Test that :meth:`Node.update_signal` is only wrapped while a
+    :class:`TraversalIndex` is alive, and that :func:`tree_version` refuses to
+    give version stamps otherwise.
+    """
+    update_signal = nodes.Node.update_signal
+    schedule = get_schedule(fortran_reader, cs.loop_with_1_assignment)
+    index = TraversalIndex(schedule)
+    assert nodes.Node.update_signal is not update_signal
+    del index
+    gc.collect()
+    assert nodes.Node.update_signal is update_signal
+    with pytest.raises(RuntimeError, match="only tracked while"):
+        tree_version(schedule)
@@ -0,0 +1,171 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+"""
+Unit tests for PSyTran's `interchange` module.
+"""
+
+import pytest
+from psyclone.psyir import nodes
+from utils import get_schedule
+
+import code_snippets as cs
+from psytran.interchange import (
+    analyse_access_order,
+    fix_access_order,
+    make_innermost,
+)
+from psytran.loop import loop2nest
+
+
+def _variables(loop):
+    """
+    Get the names of the variables of a Loop nest, outer-most first.
+    """
+    return [inner.variable.name for inner in loop2nest(loop)]
+
+
+def test_analyse_access_order(fortran_reader):
+    """
+    Test that :func:`analyse_access_order` finds the Loop variable which
+    indexes the first dimension of most array accesses.
+    """
+    schedule = get_schedule(fortran_reader, cs.first_index_outer_loops)
+    loops = schedule.children
+    order = analyse_access_order(loops[0])
+    assert order.variables == ["i", "j"]
+    assert order.weights == {"i": 2, "j": 1}
+    assert order.contiguous == "i"
+    assert not order.is_contiguous
+    order = analyse_access_order(loops[2])
+    assert order.weights == {"k": 0, "j": 3, "i": 0}
+    assert order.contiguous == "j"
+
+
+def test_analyse_access_order_contiguous(fortran_reader):
+    """
+    Test that :func:`analyse_access_order` identifies nests which already
+    access memory contiguously, as well as nests without array accesses.
+    """
+    schedule = get_schedule(fortran_reader, cs.triple_loop_with_1_assignment)
+    order = analyse_access_order(schedule.children[0])
+    assert order.contiguous == "i"
+    assert order.is_contiguous
+
+    code = cs.double_loop_with_1_assignment.replace("a(i,j)", "a(1,1)")
+    schedule = get_schedule(fortran_reader, code)
+    order = analyse_access_order(schedule.children[0])
+    assert order.contiguous is None
+    assert order.is_contiguous
+
+
+def test_analyse_access_order_valueerror(fortran_reader):
+    """
+    Test that a :class:`ValueError` is raised when
+    :func:`analyse_access_order` is applied to an imperfect Loop nest.
+    """
+    schedule = get_schedule(
+        fortran_reader, cs.imperfectly_nested_double_loop_before
+    )
+    expected = "analyse_access_order can only be applied to perfectly nested"
+    with pytest.raises(ValueError, match=expected):
+        analyse_access_order(schedule.children[0])
+
+
+def test_make_innermost(fortran_reader):
+    """
+    Test that :func:`make_innermost` moves a Loop to the deepest level of its
+    nest, keeping the order of the other Loops.
+    """
+    schedule = get_schedule(
+        fortran_reader, cs.quadruple_loop_with_1_assignment
+    )
+    outer = schedule.children[0]
+    variables = _variables(outer)
+    target = outer.loop_body.children[0]
+    assert make_innermost(target) is outer.loop_body.children[0]
+    assert _variables(outer) == (
+        variables[:1] + variables[2:] + variables[1:2]
+    )
+    assert target.variable.name == variables[1]
+    assert not target.loop_body.walk(nodes.Loop)
+
+
+@pytest.mark.parametrize(
+    "code, expected",
+    [
+        (cs.dependent_double_loop, "Bounds of loop 'j' depend on loop 'i'."),
+        (cs.first_index_outer_loops, "Iterations of loop 'i' are not"),
+        (cs.imperfectly_nested_double_loop_before, "can only be applied"),
+    ],
+)
+def test_make_innermost_valueerror(fortran_reader, code, expected):
+    """
+    Test that a :class:`ValueError` is raised when :func:`make_innermost`
+    cannot legally interchange a Loop nest, leaving it unchanged.
+    """
+    schedule = get_schedule(fortran_reader, code)
+    loop = schedule.walk(nodes.Loop)[0]
+    if code == cs.first_index_outer_loops:
+        loop = schedule.children[1]
+    variables = _variables(loop)
+    with pytest.raises(ValueError, match=expected):
+        make_innermost(loop)
+    assert _variables(loop) == variables
+
+
+def test_fix_access_order(fortran_reader):
+    """
+    Test that :func:`fix_access_order` interchanges Loops so that the
+    inner-most Loop indexes the contiguous dimension, where legal, and reports
+    the nests it could not fix.
+    """
+    schedule = get_schedule(fortran_reader, cs.first_index_outer_loops)
+    orders = fix_access_order(schedule)
+    assert [order.interchanged for order in orders] == [True, False, True]
+    assert [order.reason for order in orders] == [
+        None,
+        "Iterations of loop 'i' are not independent.",
+        None,
+    ]
+    assert all(
+        order.loop is loop for order, loop in zip(orders, schedule.children)
+    )
+    assert [_variables(loop) for loop in schedule.children] == [
+        ["j", "i"],
+        ["i", "j"],
+        ["k", "i", "j"],
+    ]
+    assert all(order.is_contiguous for order in orders[::2])
+
+
+def test_fix_access_order_unchanged(fortran_reader):
+    """
+    Test that :func:`fix_access_order` leaves nests which already access
+    memory contiguously unchanged.
+    """
+    schedule = get_schedule(fortran_reader, cs.triple_loop_with_1_assignment)
+    orders = fix_access_order(schedule)
+    assert len(orders) == 1
+    assert not orders[0].interchanged
+    assert orders[0].reason is None
+    assert _variables(schedule.children[0]) == ["k", "j", "i"]
+
+
+def test_make_innermost_rollback(fortran_reader):
+    """
+    Test that :func:`make_innermost` validates each swap and undoes the swaps
+    already made if a deeper one is not valid.
+    """
+    code = cs.triple_loop_with_1_assignment.replace(
+        "      DO k = 1, 10\n        DO j = 1, 10\n          DO i = 1, 10",
+        "      DO j = 1, i\n        DO k = 1, 10\n          DO i = 1, 10",
+    )
+    schedule = get_schedule(fortran_reader, code)
+    loop = schedule.children[0]
+    with pytest.raises(ValueError, match="cannot be interchanged"):
+        make_innermost(loop)
+    assert schedule.children[0] is loop
+    assert _variables(loop) == ["j", "k", "i"]
@@ -15,13 +15,16 @@ from utils import get_schedule, simple_loop_code
 import code_snippets as cs
 from psytran.loop import (
     _check_loop,
+    analyse_loops,
     is_independent,
     is_outer_loop,
     is_parallelisable,
     is_perfectly_nested,
     is_simple_loop,
     get_perfectly_nested_loops,
+    max_collapse,
 )
+from psytran.synthetic import generate_kernel, nest_structures
 
 perfectly_nested_loop = {
     "1_assign": cs.loop_with_1_assignment,
@@ -260,6 +263,27 @@ def test_is_not_independent_triple_subloop(fortran_reader):
     assert is_independent(loops[2])
 
 
+@pytest.mark.parametrize(
+    "code, expected",
+    [
+        (cs.triple_loop_with_1_assignment, [3, 2, 1]),
+        (cs.dependent_triple_loop, [1, 2, 1]),
+        (cs.dependent_triple_subloop, [2, 1, 1]),
+        (cs.imperfectly_nested_triple_loop1_after_with_if, [1, 2, 1]),
+        (cs.conditional_imperfectly_nested_triple_loop1, [1, 2, 1]),
+        (cs.loop_with_recurrence, [1]),
+    ],
+)
+def test_max_collapse(fortran_reader, code, expected):
+    """
+    Test that :func:`max_collapse` stops at imperfect nesting, at dependent
+    bounds and at Loops which are not parallelisable.
+    """
+    schedule = get_schedule(fortran_reader, code)
+    loops = schedule.walk(nodes.Loop)
+    assert [max_collapse(loop) for loop in loops] == expected
+
+
 def test_get_perfectly_nested_sibling_loops(fortran_reader):
     """
     Test that :func:`get_perfectly_nested_loops` correctly identifies perfectly
@@ -306,3 +330,72 @@ def test_get_perfectly_nested_loop_with_conditional(fortran_reader):
     # In this case, this should return an outer loop
     assert not is_outer_loop(loops[0])
     assert loops[0].variable.name == "j"
+
+
+def test_get_perfectly_nested_loops_imperfect(fortran_reader, imperfection):
+    """
+    Test that :func:`get_perfectly_nested_loops` returns the outer-most
+    perfectly nested sub-nest of an imperfectly nested triple loop.
+    """
+    schedule = get_schedule(
+        fortran_reader, imperfectly_nested_triple_loop[imperfection]
+    )
+    loops = schedule.walk(nodes.Loop)
+    perfect_loops = get_perfectly_nested_loops(schedule)
+    assert len(perfect_loops) == 1
+    assert perfect_loops[0] is loops[1]
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        cs.quadruple_loop_with_1_assignment,
+        cs.double_loop_with_2_loops,
+        cs.double_loop_with_index_array,
+        cs.dependent_triple_subloop,
+        cs.imperfectly_nested_triple_loop1_before_with_if,
+        cs.conditional_imperfectly_nested_triple_loop1,
+        generate_kernel(
+            num_loops=8,
+            depth=3,
+            body=2,
+            structures=nest_structures,
+            dependent_bounds=0.3,
+            index_arrays=0.3,
+            calls=0.2,
+        ),
+    ],
+)
+def test_analyse_loops(fortran_reader, code):
+    """
+    Test that :func:`analyse_loops` agrees with the individual loop queries.
+    """
+    schedule = get_schedule(fortran_reader, code)
+    loops = schedule.walk(nodes.Loop)
+    analysis = analyse_loops(schedule)
+    assert len(analysis) == len(loops)
+    for loop, info in zip(loops, analysis):
+        assert analysis[loop] is info
+        assert info.loop is loop
+        assert info.outer == is_outer_loop(loop)
+        assert info.perfect == is_perfectly_nested(loop)
+        assert info.simple == is_simple_loop(loop)
+        if info.perfect:
+            assert info.independent == is_independent(loop)
+        else:
+            assert info.independent is None
+        assert info.parallelisable == is_parallelisable(loop)
+
+
+def test_analyse_loops_nests(fortran_reader):
+    """
+    Test that :func:`analyse_loops` correctly records nest depths, nest
+    numbers and literal trip counts.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_2_loops)
+    analysis = analyse_loops(schedule)
+    assert [info.depth for info in analysis] == [0, 1, 1]
+    assert [info.nest for info in analysis] == [0, 0, 0]
+    assert [info.trip_count for info in analysis] == [10, 10, 10]
+    assert len(analysis.nest(0)) == 3
+    assert analysis.nest(1) == []
@@ -0,0 +1,149 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+"""
+Unit tests for PSyTran's `parallelise` module.
+"""
+
+import pytest
+
+from psyclone.psyir import nodes
+from psyclone.psyir.transformations import TransformationError
+from psyclone.transformations import ACCLoopTrans, OMPLoopTrans
+from utils import get_schedule, simple_loop_code
+
+import code_snippets as cs
+from psytran.clauses import has_collapse_clause
+from psytran.directives import has_loop_directive
+from psytran.parallelise import auto_parallelise
+
+region_directive = {
+    "acc": nodes.ACCKernelsDirective,
+    "omp": nodes.OMPParallelDirective,
+}
+
+loop_directive = {"acc": ACCLoopTrans, "omp": OMPLoopTrans}
+
+
+@pytest.fixture(name="target", params=["acc", "omp"], scope="module")
+def fixture_target(request):
+    """Pytest fixture for the programming model targeted."""
+    return request.param
+
+
+def test_auto_parallelise_valueerror(fortran_reader):
+    """
+    Test that a :class:`ValueError` is raised when :func:`auto_parallelise` is
+    called with an unsupported target.
+    """
+    schedule = get_schedule(fortran_reader, cs.loop_with_1_assignment)
+    with pytest.raises(ValueError, match="Unsupported target 'cuda'"):
+        auto_parallelise(schedule, target="cuda")
+
+
+def test_auto_parallelise_typeerror(fortran_reader):
+    """
+    Test that a :class:`TypeError` is raised when :func:`auto_parallelise` is
+    called with options that aren't a :class:`dict`.
+    """
+    schedule = get_schedule(fortran_reader, cs.loop_with_1_assignment)
+    with pytest.raises(TypeError, match="Expected a dict"):
+        auto_parallelise(schedule, options=0)
+
+
+def test_auto_parallelise_collapse(fortran_reader, target, nest_depth):
+    """
+    Test that :func:`auto_parallelise` inserts directives around a simple loop
+    nest, collapsing all of its loops.
+    """
+    schedule = get_schedule(fortran_reader, simple_loop_code(nest_depth))
+    loops = schedule.walk(nodes.Loop)
+    summary = auto_parallelise(schedule, target=target)
+    assert len(summary.parallelised) == 1
+    assert not summary.skipped
+    decision = summary.decisions[0]
+    assert decision.loop is loops[0]
+    assert decision.collapse == nest_depth
+    assert isinstance(schedule[0], region_directive[target])
+    assert has_loop_directive(loops[0])
+    for loop in loops[1:]:
+        assert not has_loop_directive(loop)
+        assert has_collapse_clause(loop)
+
+
+def test_auto_parallelise_no_collapse(fortran_reader, target):
+    """
+    Test that :func:`auto_parallelise` does not collapse loops when asked not
+    to.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_1_assignment)
+    loops = schedule.walk(nodes.Loop)
+    summary = auto_parallelise(schedule, target=target, collapse=False)
+    assert summary.decisions[0].collapse == 1
+    assert has_loop_directive(loops[0])
+    assert not has_collapse_clause(loops[1])
+
+
+def test_auto_parallelise_dependent_bounds(fortran_reader, target):
+    """
+    Test that :func:`auto_parallelise` does not collapse loops whose bounds
+    depend on an enclosing loop.
+    """
+    schedule = get_schedule(fortran_reader, cs.dependent_double_loop)
+    summary = auto_parallelise(schedule, target=target)
+    assert len(summary.parallelised) == 1
+    assert summary.decisions[0].collapse == 1
+
+
+def test_auto_parallelise_skipped(fortran_reader, target):
+    """
+    Test that :func:`auto_parallelise` skips loops whose iterations are not
+    independent.
+    """
+    schedule = get_schedule(fortran_reader, cs.loop_with_recurrence)
+    loops = schedule.walk(nodes.Loop)
+    summary = auto_parallelise(schedule, target=target)
+    assert not summary.parallelised
+    assert len(summary.skipped) == 1
+    assert summary.skipped[0].reason is not None
+    assert not has_loop_directive(loops[0])
+    assert not schedule.walk(nodes.Directive)
+
+
+def test_auto_parallelise_min_work(fortran_reader, target):
+    """
+    Test that :func:`auto_parallelise` skips nests whose estimated work is
+    below the minimum, but not those whose trip counts are unknown.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_1_assignment)
+    summary = auto_parallelise(schedule, target=target, min_work=101)
+    assert not summary.parallelised
+    assert summary.decisions[0].reason.startswith("estimated work")
+    summary = auto_parallelise(schedule, target=target, min_work=100)
+    assert len(summary.parallelised) == 1
+    schedule = get_schedule(fortran_reader, cs.loop_with_parameter_bounds)
+    summary = auto_parallelise(schedule, target=target, min_work=10**9)
+    assert len(summary.parallelised) == 1
+
+
+def test_auto_parallelise_loop_directive_failure(
+    fortran_reader, target, monkeypatch
+):
+    """
+    Test that :func:`auto_parallelise` removes the region it inserted around a
+    nest if the ``loop`` directive cannot be applied to it.
+    """
+
+    def apply(self, node, options=None):
+        raise TransformationError("cannot apply loop directive")
+
+    monkeypatch.setattr(loop_directive[target], "apply", apply)
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_1_assignment)
+    summary = auto_parallelise(schedule, target=target)
+    assert not summary.parallelised
+    assert "cannot apply loop directive" in summary.decisions[0].reason
+    assert not schedule.walk(nodes.Directive)
+    assert isinstance(schedule.children[0], nodes.Loop)
+    assert len(schedule.children) == 1
@@ -0,0 +1,122 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+"""
+Unit tests for PSyTran's `profiling` module.
+"""
+
+import json
+
+import pytest
+from psyclone.psyir import nodes
+from utils import get_schedule
+
+import code_snippets as cs
+from psytran.family import get_descendents
+from psytran.loop import is_perfectly_nested
+from psytran.profiling import (
+    Profiler,
+    disable_profiling,
+    enable_profiling,
+    get_profiler,
+    profile,
+    profiled,
+)
+
+
+def test_profiling_disabled(fortran_reader):
+    """
+    Test that nothing is recorded while profiling is disabled and that the
+    Node class is never modified.
+    """
+    children = nodes.Node.children
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_1_assignment)
+    with profile() as profiler:
+        assert nodes.Node.children is children
+        assert get_profiler() is profiler
+    assert get_profiler() is None
+    get_descendents(schedule, node_type=nodes.Loop)
+    assert not profiler.stats
+
+
+def test_profiling_nested():
+    """
+    Test that profiling cannot be enabled twice, and that it is disabled on
+    leaving a :class:`profile` context because of an exception.
+    """
+    with pytest.raises(ValueError, match="Expected failure."):
+        with profile():
+            with pytest.raises(RuntimeError, match="already enabled"):
+                enable_profiling()
+            with pytest.raises(RuntimeError, match="already enabled"):
+                with profile():
+                    pass
+            raise ValueError("Expected failure.")
+    assert get_profiler() is None
+
+
+def test_profile_stats(fortran_reader):
+    """
+    Test that calls, nested calls and Node visits are recorded.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_1_assignment)
+    loop = schedule.walk(nodes.Loop)[0]
+    with profile() as profiler:
+        get_descendents(schedule, node_type=nodes.Loop)
+        get_descendents(schedule, node_type=nodes.Loop)
+        is_perfectly_nested(loop)
+    stats = profiler.stats["psytran.family.get_descendents"]
+    assert stats.calls > 2
+    assert stats.nodes > 0
+    assert 0 <= stats.self_time <= stats.total_time
+    outer = profiler.stats["psytran.loop.is_perfectly_nested"]
+    assert outer.calls == 1
+    assert outer.self_nodes < outer.nodes
+    assert outer.self_time < outer.total_time
+    assert "is_perfectly_nested" in profiler.report()
+
+
+def test_profile_exception():
+    """
+    Test that calls which raise are recorded and do not corrupt the stack.
+    """
+
+    @profiled
+    def fail():
+        raise ValueError("Expected failure.")
+
+    profiler = enable_profiling(Profiler())
+    try:
+        with pytest.raises(ValueError):
+            fail()
+    finally:
+        assert disable_profiling() is profiler
+    assert profiler.stats[f"{fail.__module__}.{fail.__qualname__}"].calls == 1
+    assert not profiler._stack
+
+
+def test_profile_export(fortran_reader, tmp_path):
+    """
+    Test that the statistics are exported as JSON and in Chrome trace format.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_1_assignment)
+    with profile(Profiler(max_events=2)) as profiler:
+        for loop in schedule.walk(nodes.Loop):
+            is_perfectly_nested(loop)
+    profiler.write_json(tmp_path / "profile.json")
+    profiler.write_chrome_trace(tmp_path / "trace.json")
+    with open(tmp_path / "profile.json", encoding="utf-8") as json_file:
+        data = json.load(json_file)
+    names = [entry["name"] for entry in data["functions"]]
+    assert "psytran.loop.is_perfectly_nested" in names
+    assert data["events"] == 2
+    assert data["dropped_events"] > 0
+    with open(tmp_path / "trace.json", encoding="utf-8") as trace_file:
+        trace = json.load(trace_file)
+    assert len(trace["traceEvents"]) == 2
+    for event in trace["traceEvents"]:
+        assert event["ph"] == "X"
+        assert event["dur"] >= 0
+        assert event["cat"].startswith("psytran.")
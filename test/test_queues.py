@@ -0,0 +1,146 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+"""
+Unit tests for PSyTran's `queues` module.
+"""
+
+import pytest
+from psyclone.psyir import nodes
+from psyclone.psyir.backend.fortran import FortranWriter
+from psyclone.psyir.nodes import ACCKernelsDirective
+from utils import get_kernels_schedule
+
+import code_snippets as cs
+from psytran import queues
+from psytran.queues import (
+    ACCWaitDirective,
+    AsyncKernelsDirective,
+    assign_async_queues,
+    kernels_dependency_graph,
+)
+
+
+def _clauses(regions):
+    """
+    Get the queue and waited queues of each region.
+    """
+    return [(region.async_queue, region.wait_queues) for region in regions]
+
+
+def test_kernels_dependency_graph(fortran_reader):
+    """
+    Test that :func:`kernels_dependency_graph` finds the dependencies between
+    kernels regions, ignoring Loop variables.
+    """
+    schedule = get_kernels_schedule(
+        fortran_reader, cs.independent_and_dependent_loops
+    )
+    graph = kernels_dependency_graph(schedule)
+    assert graph.regions == schedule.walk(ACCKernelsDirective)
+    assert graph.edges == [(0, 2), (1, 3), (2, 3), (0, 4)]
+
+
+def test_assign_async_queues(fortran_reader):
+    """
+    Test that :func:`assign_async_queues` places independent kernels regions
+    on different queues and orders dependent regions on the device.
+    """
+    schedule = get_kernels_schedule(
+        fortran_reader, cs.independent_and_dependent_loops
+    )
+    regions = assign_async_queues(schedule)
+    assert all(isinstance(region, AsyncKernelsDirective) for region in regions)
+    assert regions == schedule.walk(ACCKernelsDirective)
+    assert _clauses(regions) == [
+        (1, []),
+        (2, []),
+        (1, []),
+        (2, [1]),
+        (None, [1]),
+    ]
+    waits = schedule.walk(ACCWaitDirective)
+    assert len(waits) == 1
+    assert waits[0].queues == [2]
+    assert isinstance(
+        schedule.children[waits[0].position + 1], nodes.Assignment
+    )
+    code = FortranWriter()(schedule)
+    assert "!$acc kernels async(2) wait(1)\n" in code
+    assert "!$acc kernels wait(1)\n" in code
+    assert "!$acc wait(2)\n  b(1) = 0.0" in code
+
+
+def test_assign_async_queues_graph(fortran_reader, monkeypatch):
+    """
+    Test that :func:`assign_async_queues` only orders kernels regions joined
+    by an edge of the dependency graph.
+    """
+    dependency_graph = queues._dependency_graph
+
+    def without_edges(node):
+        graph, accesses = dependency_graph(node)
+        return graph._replace(edges=[]), accesses
+
+    monkeypatch.setattr(queues, "_dependency_graph", without_edges)
+    schedule = get_kernels_schedule(
+        fortran_reader, cs.independent_and_dependent_loops
+    )
+    regions = assign_async_queues(schedule)
+    assert all(not waited for _, waited in _clauses(regions))
+
+
+def test_assign_async_queues_max_queues(fortran_reader):
+    """
+    Test that :func:`assign_async_queues` respects the number of queues.
+    """
+    schedule = get_kernels_schedule(
+        fortran_reader, cs.independent_and_dependent_loops
+    )
+    regions = assign_async_queues(schedule, max_queues=1)
+    assert _clauses(regions) == [
+        (1, []),
+        (1, []),
+        (1, []),
+        (1, []),
+        (None, [1]),
+    ]
+    assert not schedule.walk(ACCWaitDirective)
+
+
+def test_assign_async_queues_end_of_block(fortran_reader):
+    """
+    Test that :func:`assign_async_queues` waits for outstanding regions at the
+    end of a Loop body and before calls to routines.
+    """
+    schedule = get_kernels_schedule(
+        fortran_reader, cs.time_loop_with_work_array
+    )
+    regions = assign_async_queues(schedule)
+    assert _clauses(regions) == [(1, []), (1, []), (1, [])]
+    body = schedule.children[0].loop_body
+    assert isinstance(body.children[-1], ACCWaitDirective)
+    assert body.children[-1].queues == [1]
+    assert isinstance(schedule.children[2], ACCWaitDirective)
+
+    schedule = get_kernels_schedule(
+        fortran_reader, cs.loops_with_intervening_statements
+    )
+    assign_async_queues(schedule)
+    waits = schedule.walk(ACCWaitDirective)
+    assert len(waits) == 2
+    assert isinstance(schedule.children[waits[0].position + 1], nodes.Call)
+    assert waits[1] is schedule.children[-1]
+
+
+def test_assign_async_queues_valueerror(fortran_reader):
+    """
+    Test that a :class:`ValueError` is raised when :func:`assign_async_queues`
+    is given an invalid number of queues.
+    """
+    schedule = get_kernels_schedule(fortran_reader, cs.loop_with_1_assignment)
+    expected = "Expected a positive int for max_queues, not 0."
+    with pytest.raises(ValueError, match=expected):
+        assign_async_queues(schedule, max_queues=0)
@@ -0,0 +1,188 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+"""
+Unit tests for PSyTran's `report` module.
+"""
+
+import csv
+import json
+
+import pytest
+from psyclone.psyir import nodes
+from psyclone.psyir.transformations import ACCKernelsTrans
+from psyclone.transformations import ACCLoopTrans
+from utils import get_schedule
+
+import code_snippets as cs
+from psytran.batch import transform_files
+from psytran.directives import apply_loop_directive, apply_parallel_directive
+from psytran.report import (
+    _recover_directives,
+    coverage_report,
+    coverage_report_files,
+    main,
+)
+
+_script = """
+from psyclone.psyir import nodes
+from psyclone.psyir.transformations import ACCKernelsTrans
+from psyclone.transformations import ACCLoopTrans
+
+
+def trans(psyir):
+    loops = psyir.walk(nodes.Loop)
+    ACCKernelsTrans().apply(loops[0])
+    ACCLoopTrans().apply(loops[0], options={"collapse": 2})
+"""
+
+
+def test_coverage_report(fortran_reader):
+    """
+    Test that :func:`coverage_report` records the directives and clauses of
+    each Loop.
+    """
+    schedule = get_schedule(fortran_reader, cs.triple_loop_with_1_assignment)
+    loops = schedule.walk(nodes.Loop)
+    apply_parallel_directive(loops[0], ACCKernelsTrans)
+    apply_loop_directive(loops[0], ACCLoopTrans(), {"collapse": 2})
+    apply_loop_directive(loops[2], ACCLoopTrans(), {"sequential": True})
+    records = coverage_report(schedule, filename="test.f90")
+    assert [record.variable for record in records] == ["k", "j", "i"]
+    assert [record.depth for record in records] == [0, 1, 2]
+    assert all(record.file == "test.f90" for record in records)
+    assert all(record.routine == "test" for record in records)
+    assert all(record.region == "ACCKernelsDirective" for record in records)
+    directives = [record.directive for record in records]
+    assert directives == ["ACCLoopDirective", "", "ACCLoopDirective"]
+    assert [record.collapse for record in records] == [2, None, None]
+    assert [record.collapsed for record in records] == [True, True, False]
+    assert [record.sequential for record in records] == [False, False, True]
+    assert all(record.parallelisable for record in records)
+
+
+def test_coverage_report_serial(fortran_reader):
+    """
+    Test that Loops without directives are reported, with line numbers.
+    """
+    schedule = get_schedule(fortran_reader, cs.loop_with_recurrence)
+    (record,) = coverage_report(schedule)
+    assert record.line == 6
+    assert record.region == ""
+    assert record.directive == ""
+    assert not record.parallelisable
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_coverage_report_files(tmp_path, jobs):
+    """
+    Test that :func:`coverage_report_files` reports on the outputs of a
+    porting run and records files which cannot be parsed.
+    """
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "a.f90").write_text(cs.double_loop_with_1_assignment)
+    (src / "b.f90").write_text(cs.triple_loop_with_1_assignment)
+    script = tmp_path / "trans.py"
+    script.write_text(_script)
+    output_dir = tmp_path / "out"
+    transform_files([str(src)], str(script), str(output_dir), jobs=1)
+    (output_dir / "broken.f90").write_text("subroutine broken\n  x = = 1\n")
+    report = coverage_report_files([str(output_dir)], jobs=jobs)
+    assert len(report.records) == 5
+    assert list(report.errors) == [str(output_dir / "broken.f90")]
+    summary = report.summary()
+    assert summary["loop_directives"] == 2
+    assert summary["in_regions"] == 5
+    assert summary["serial_parallelisable"] == 3
+    assert sum(record.collapsed for record in report.records) == 4
+
+
+def test_coverage_report_output(tmp_path, capsys):
+    """
+    Test that the command line interface writes CSV and JSON reports.
+    """
+    (tmp_path / "a.f90").write_text(cs.double_loop_with_2_loops)
+    assert main([str(tmp_path / "a.f90"), "-o", str(tmp_path / "c.csv")]) == 0
+    with open(tmp_path / "c.csv", encoding="utf-8") as csv_file:
+        rows = list(csv.DictReader(csv_file))
+    assert [row["variable"] for row in rows] == ["j", "i", "i"]
+    assert "0/3 loops" in capsys.readouterr().out
+    main([str(tmp_path), "-o", str(tmp_path / "c.json"), "-j", "1"])
+    with open(tmp_path / "c.json", encoding="utf-8") as json_file:
+        data = json.load(json_file)
+    assert data["summary"]["loops"] == 3
+    assert data["loops"][0]["nest"] == 0
+
+
+def test_coverage_report_files_directives(tmp_path):
+    """
+    Test that :func:`coverage_report_files` recovers directives and clauses
+    from the source of each file.
+    """
+    (tmp_path / "a.f90").write_text("""subroutine a(x)
+  real, intent(inout) :: x(10, 10)
+  integer :: i, j
+  !$omp parallel do
+  do j = 1, 10
+    do i = 1, 10
+      x(i, j) = 0.0
+    end do
+  end do
+  !$omp end parallel do
+  !$acc kernels
+  !$acc loop gang &
+  !$acc& vector
+  do j = 1, 10
+    !$acc loop seq
+    do i = 1, 10
+      x(i, j) = 1.0
+    end do
+  end do
+  !$acc end kernels
+  !$acc loop seq
+  do i = 1, 10
+    x(i, 1) = 2.0
+  end do
+end subroutine a
+""")
+    records = coverage_report_files([str(tmp_path)], jobs=1).records
+    directives = [record.directive for record in records]
+    assert directives == [
+        "OMPParallelDoDirective",
+        "",
+        "ACCLoopDirective",
+        "ACCLoopDirective",
+        "",
+    ]
+    regions = [record.region for record in records]
+    assert regions == ["", "", *["ACCKernelsDirective"] * 2, ""]
+    assert [record.gang for record in records] == [0, 0, 1, 0, 0]
+    assert [record.vector for record in records] == [0, 0, 1, 0, 0]
+    assert [record.sequential for record in records] == [0, 0, 0, 1, 0]
+    assert not any(record.collapsed for record in records)
+
+
+def test_recover_directives_unknown_line(fortran_reader):
+    """
+    Test that Loops whose line numbers are unknown are left without recovered
+    directives.
+    """
+    code = cs.loop_with_1_assignment.replace(
+        "      DO i", "      !$acc kernels\n      DO i"
+    ).replace("END DO\n", "END DO\n      !$acc end kernels\n")
+    schedule = get_schedule(fortran_reader, code)
+    loop = schedule.walk(nodes.Loop)[0]
+    schedule.addchild(loop.copy())
+    new_loop = schedule.children[-1]
+    new_loop._ast = None
+    loops = schedule.walk(nodes.Loop)
+    records = _recover_directives(
+        coverage_report(schedule), loops, code.splitlines()
+    )
+    assert [record.region for record in records] == [
+        "ACCKernelsDirective",
+        "",
+    ]
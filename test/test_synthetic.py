@@ -0,0 +1,114 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+"""
+Unit tests for PSyTran's `synthetic` module.
+"""
+
+import pytest
+
+from psyclone.psyir import nodes
+from utils import get_schedule
+
+from psytran.loop import is_independent, is_outer_loop, is_perfectly_nested
+from psytran.synthetic import generate_kernel, nest_structures
+
+
+def _outer_loops(schedule):
+    """
+    Get the outer-most Loops of a Schedule.
+    """
+    return [loop for loop in schedule.walk(nodes.Loop) if is_outer_loop(loop)]
+
+
+def test_generate_kernel_seed():
+    """
+    Test that the same seed always gives the same source.
+    """
+    kwargs = {
+        "num_loops": 10,
+        "depth": 3,
+        "structures": nest_structures,
+        "dependent_bounds": 0.5,
+        "calls": 0.5,
+    }
+    assert generate_kernel(seed=1, **kwargs) == generate_kernel(
+        seed=1, **kwargs
+    )
+    assert generate_kernel(seed=1, **kwargs) != generate_kernel(
+        seed=2, **kwargs
+    )
+
+
+def test_generate_kernel_size(fortran_reader, nest_depth):
+    """
+    Test that the generated kernel has the requested number of Loops and
+    statements.
+    """
+    code = generate_kernel(num_loops=3, depth=nest_depth, body=2)
+    schedule = get_schedule(fortran_reader, code)
+    loops = schedule.walk(nodes.Loop)
+    assert len(loops) == 3 * nest_depth
+    assert len(_outer_loops(schedule)) == 3
+    assert len(schedule.walk(nodes.Assignment)) == 3 * 2
+    assert not schedule.walk(nodes.CodeBlock)
+
+
+def test_generate_kernel_structure(fortran_reader, imperfection):
+    """
+    Test that nests have the requested structure.
+    """
+    perfect = generate_kernel(num_loops=2, depth=3)
+    schedule = get_schedule(fortran_reader, perfect)
+    outer_loops = _outer_loops(schedule)
+    assert all(is_perfectly_nested(loop) for loop in outer_loops)
+    imperfect = generate_kernel(
+        num_loops=2, depth=3, structures=[imperfection]
+    )
+    schedule = get_schedule(fortran_reader, imperfect)
+    outer_loops = _outer_loops(schedule)
+    assert not any(is_perfectly_nested(loop) for loop in outer_loops)
+    if imperfection == "if":
+        assert len(schedule.walk(nodes.IfBlock)) == 2
+
+
+def test_generate_kernel_features(fortran_reader):
+    """
+    Test that features included with probability one are always present.
+    """
+    code = generate_kernel(num_loops=2, depth=2, dependent_bounds=1.0)
+    schedule = get_schedule(fortran_reader, code)
+    outer_loops = _outer_loops(schedule)
+    assert not any(is_independent(loop) for loop in outer_loops)
+    code = generate_kernel(num_loops=2, depth=2, body=3, calls=1.0)
+    schedule = get_schedule(fortran_reader, code)
+    assert len(schedule.walk(nodes.Call)) == 6
+    code = generate_kernel(num_loops=2, index_arrays=1.0)
+    schedule = get_schedule(fortran_reader, code)
+    references = schedule.walk(nodes.ArrayReference)
+    assert "map" in {reference.name for reference in references}
+    code = generate_kernel(num_loops=2, array_notation=1.0)
+    schedule = get_schedule(fortran_reader, code)
+    assignments = schedule.walk(nodes.Assignment)
+    assert all(a.lhs.name == "c" for a in assignments)
+
+
+@pytest.mark.parametrize(
+    "kwargs, error",
+    [
+        ({"num_loops": 0}, ValueError),
+        ({"depth": 1.5}, TypeError),
+        ({"calls": 2.0}, ValueError),
+        ({"index_arrays": "yes"}, TypeError),
+        ({"structures": "perfect"}, TypeError),
+        ({"structures": ("spiral",)}, ValueError),
+    ],
+)
+def test_generate_kernel_errors(kwargs, error):
+    """
+    Test that invalid arguments are rejected.
+    """
+    with pytest.raises(error):
+        generate_kernel(**kwargs)
@@ -0,0 +1,160 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+"""
+Unit tests for PSyTran's `tiling` module.
+"""
+
+import pytest
+from psyclone.psyir import nodes
+from psyclone.psyir.backend.fortran import FortranWriter
+from psyclone.psyir.transformations import TransformationError
+from psyclone.transformations import (
+    ACCLoopTrans,
+    OMPLoopTrans,
+    OMPParallelTrans,
+)
+from utils import get_schedule
+
+import code_snippets as cs
+from psytran.directives import apply_parallel_directive, has_loop_directive
+from psytran.tiling import choose_tile_sizes, tile_loops
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        cs.imperfectly_nested_double_loop_before,
+        cs.dependent_double_loop,
+        cs.loop_with_recurrence,
+    ],
+)
+def test_tile_loops_valueerror(fortran_reader, code):
+    """
+    Test that :func:`tile_loops` refuses nests which are imperfect, have
+    dependent bounds or are not parallelisable, without modifying them.
+    """
+    schedule = get_schedule(fortran_reader, code)
+    before = schedule.debug_string()
+    with pytest.raises(ValueError, match="Can.* tile"):
+        tile_loops(schedule.walk(nodes.Loop)[0], tile_sizes=[2])
+    assert schedule.debug_string() == before
+
+
+def test_tile_loops_levels(fortran_reader):
+    """
+    Test that :func:`tile_loops` checks the number of levels and tile sizes.
+    """
+    schedule = get_schedule(fortran_reader, cs.double_loop_with_1_assignment)
+    loop = schedule.walk(nodes.Loop)[0]
+    with pytest.raises(ValueError, match="Cannot tile 3 levels"):
+        tile_loops(loop, levels=3)
+    with pytest.raises(TypeError, match="Expected an int"):
+        tile_loops(loop, levels=1.0)
+    with pytest.raises(ValueError, match="Expected 1 tile sizes"):
+        tile_loops(loop, levels=1, tile_sizes=[2, 2])
+    with pytest.raises(ValueError, match="positive tile size"):
+        tile_loops(loop, tile_sizes=[0])
+    with pytest.raises(TypeError, match="Expected a dict"):
+        tile_loops(loop, options=0)
+
+
+def test_choose_tile_sizes(fortran_reader):
+    """
+    Test that :func:`choose_tile_sizes` fits each tile in cache, using array
+    extents for unknown trip counts and not exceeding the extent of a Loop.
+    """
+    schedule = get_schedule(
+        fortran_reader, cs.triple_loop_with_parameter_extents
+    )
+    loop = schedule.walk(nodes.Loop)[0]
+    # Two arrays with 512 elements along the untiled dimension leave room for
+    # 32 iterations of the tiled Loops
+    assert choose_tile_sizes(loop) == [6, 5]
+    # Only the Loop over the contiguous dimension is rounded down to a whole
+    # cache line
+    assert choose_tile_sizes(loop, levels=3) == [26, 25, 24]
+    assert choose_tile_sizes(loop, cache_size=2**22) == [23, 22]
+    assert choose_tile_sizes(loop, levels=1, cache_size=2**30) == [256]
+    # Only the Loop with a known extent is limited by it
+    assert choose_tile_sizes(loop, cache_size=2**40) == [2**18, 512]
+    with pytest.raises(ValueError, match="positive int for cache_size"):
+        choose_tile_sizes(loop, cache_size=0)
+
+
+def test_tile_loops(fortran_reader):
+    """
+    Test that :func:`tile_loops` places the tile Loops outside the element
+    Loops, with clamped bounds.
+    """
+    schedule = get_schedule(fortran_reader, cs.triple_loop_with_1_assignment)
+    loop = schedule.walk(nodes.Loop)[0]
+    tile_loop = tile_loops(loop, tile_sizes=[4, 3])
+    assert schedule.children[0] is tile_loop
+    loops = schedule.walk(nodes.Loop)
+    variables = [loop.variable.name for loop in loops]
+    assert variables == ["k_tile", "j_tile", "k", "j", "i"]
+    code = FortranWriter()(schedule)
+    assert "do k_tile = 1, 10, 4" in code
+    assert "do j_tile = 1, 10, 3" in code
+    assert "do k = k_tile, MIN(k_tile + 3, 10), 1" in code
+    assert "do j = j_tile, MIN(j_tile + 2, 10), 1" in code
+    assert "do i = 1, 10, 1" in code
+
+
+def test_tile_loops_directive(fortran_reader):
+    """
+    Test that :func:`tile_loops` applies a ``loop`` directive to the tile
+    Loops.
+    """
+    schedule = get_schedule(
+        fortran_reader, cs.triple_loop_with_parameter_extents
+    )
+    loop = schedule.walk(nodes.Loop)[0]
+    apply_parallel_directive(loop, OMPParallelTrans)
+    tile_loop = tile_loops(loop, directive=OMPLoopTrans(omp_directive="do"))
+    assert has_loop_directive(tile_loop)
+    assert tile_loop.parent.parent.collapse == 2
+    assert "!$omp do" in FortranWriter()(schedule)
+
+
+def test_tile_loops_whole_extent(fortran_reader):
+    """
+    Test that :func:`tile_loops` does not tile Loops whose tile size is at
+    least their trip count.
+    """
+    schedule = get_schedule(fortran_reader, cs.triple_loop_with_1_assignment)
+    loop = schedule.walk(nodes.Loop)[0]
+    tile_loop = tile_loops(loop, tile_sizes=[10, 3])
+    variables = [loop.variable.name for loop in schedule.walk(nodes.Loop)]
+    assert variables == ["j_tile", "k", "j", "i"]
+    assert schedule.children[0] is tile_loop
+    assert "do k = 1, 10, 1" in FortranWriter()(schedule)
+
+    schedule = get_schedule(fortran_reader, cs.triple_loop_with_1_assignment)
+    loop = schedule.walk(nodes.Loop)[0]
+    code = FortranWriter()(schedule)
+    assert tile_loops(loop, tile_sizes=[10, 20]) is loop
+    assert FortranWriter()(schedule) == code
+
+
+def test_tile_loops_directive_unchanged(fortran_reader):
+    """
+    Test that :func:`tile_loops` leaves the nest unchanged if the ``loop``
+    directive cannot be applied to it.
+    """
+    schedule = get_schedule(fortran_reader, cs.triple_loop_with_1_assignment)
+    loop = schedule.walk(nodes.Loop)[0]
+    code = FortranWriter()(schedule)
+    with pytest.raises(ValueError, match="without a kernels directive"):
+        tile_loops(loop, tile_sizes=[4, 3], directive=ACCLoopTrans())
+    assert FortranWriter()(schedule) == code
+
+    schedule = get_schedule(fortran_reader, cs.pure_triple_loop)
+    loop = schedule.walk(nodes.Loop)[0]
+    code = FortranWriter()(schedule)
+    with pytest.raises(TransformationError, match="pure"):
+        tile_loops(loop, tile_sizes=[4, 3], directive=OMPLoopTrans("loop"))
+    assert FortranWriter()(schedule) == code
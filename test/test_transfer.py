@@ -0,0 +1,267 @@
+# (C) Crown Copyright 2023, Met Office. All rights reserved.
+#
+# This file is part of PSyTran and is released under the BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+"""
+Unit tests for PSyTran's `transfer` module.
+"""
+
+import csv
+import json
+
+import pytest
+from psyclone.psyir import nodes
+from psyclone.psyir.transformations import ACCKernelsTrans, OMPTargetTrans
+from utils import get_schedule
+
+import code_snippets as cs
+from psytran.data import insert_data_regions
+from psytran.directives import apply_parallel_directive
+from psytran.transfer import (
+    default_extent,
+    estimate_transfers,
+    estimate_transfers_files,
+)
+
+
+def _apply_regions(schedule, directive_cls, options=None):
+    """
+    Apply a region directive around each of the outer Loops of a Schedule.
+    """
+    for loop in schedule.children:
+        if isinstance(loop, nodes.Loop):
+            apply_parallel_directive(loop, directive_cls, options=options)
+
+
+def _volumes(records):
+    """
+    Get the estimated bytes in and out of each region.
+    """
+    return [(record.bytes_in, record.bytes_out) for record in records]
+
+
+def test_estimate_transfers(fortran_reader):
+    """
+    Test that :func:`estimate_transfers` estimates the data copied in and out
+    of kernels regions from the arrays they read and write.
+    """
+    schedule = get_schedule(fortran_reader, cs.sibling_double_loops)
+    _apply_regions(schedule, ACCKernelsTrans)
+    records = estimate_transfers(schedule)
+    assert len(records) == 4
+    assert all(record.region == "ACCKernelsDirective" for record in records)
+    assert all(record.routine == "test" and record.exact for record in records)
+    assert _volumes(records) == [(0, 400), (400, 400), (400, 400), (400, 400)]
+    array = records[1].arrays[0]
+    assert array.name == "a"
+    assert array.shape == ("10", "10")
+    assert array.elements == 100
+    assert array.element_size == 4
+    assert [array.name for array in records[3].arrays] == ["a", "c"]
+
+
+def test_estimate_transfers_kind(fortran_reader):
+    """
+    Test that :func:`estimate_transfers` accounts for the kinds of arrays.
+    """
+    code = cs.sibling_double_loops.replace("REAL ::", "REAL(KIND=wp) ::")
+    code = code.replace(
+        "PROGRAM test\n",
+        "PROGRAM test\n      INTEGER, PARAMETER :: wp = 8\n",
+        1,
+    )
+    schedule = get_schedule(fortran_reader, code)
+    _apply_regions(schedule, ACCKernelsTrans)
+    records = estimate_transfers(schedule)
+    assert records[0].arrays[0].element_size == 8
+    assert _volumes(records)[0] == (0, 800)
+
+
+def test_estimate_transfers_unknown_extent(fortran_reader):
+    """
+    Test that :func:`estimate_transfers` assumes a default extent for arrays
+    whose extents cannot be determined statically.
+    """
+    schedule = get_schedule(fortran_reader, cs.time_loop_with_work_array)
+    for loop in schedule.walk(nodes.Loop):
+        if loop.variable.name == "i":
+            apply_parallel_directive(loop, ACCKernelsTrans)
+    records = estimate_transfers(schedule)
+    assert not any(record.exact for record in records)
+    array = records[0].arrays[0]
+    assert array.shape == ("n",)
+    assert array.elements is None
+    assert array.bytes_in == default_extent * 4
+
+
+def test_estimate_transfers_present(fortran_reader):
+    """
+    Test that :func:`estimate_transfers` assumes that arrays are present in
+    regions with ``default(present)`` clauses or within data regions, which
+    are estimated from their clauses.
+    """
+    schedule = get_schedule(fortran_reader, cs.sibling_double_loops)
+    _apply_regions(schedule, ACCKernelsTrans, {"default_present": True})
+    assert _volumes(estimate_transfers(schedule)) == [(0, 0)] * 4
+
+    schedule = get_schedule(fortran_reader, cs.time_loop_with_work_array)
+    for loop in schedule.walk(nodes.Loop):
+        if loop.variable.name == "i":
+            apply_parallel_directive(loop, ACCKernelsTrans)
+    insert_data_regions(schedule)
+    records = estimate_transfers(schedule)
+    assert records[0].region == "DataRegionDirective"
+    assert [array.name for array in records[0].arrays] == [
+        "a",
+        "b",
+        "c",
+        "work",
+    ]
+    assert _volumes(records) == [(800, 800)] + [(0, 0)] * 3
+
+
+def test_estimate_transfers_omp_target(fortran_reader):
+    """
+    Test that :func:`estimate_transfers` maps arrays both ways for OpenMP
+    target regions.
+    """
+    schedule = get_schedule(fortran_reader, cs.sibling_double_loops)
+    _apply_regions(schedule, OMPTargetTrans)
+    records = estimate_transfers(schedule)
+    assert records[0].region == "OMPTargetDirective"
+    assert _volumes(records) == [(400, 400), (800, 800), (800, 800)] + [
+        (800, 800)
+    ]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_estimate_transfers_files(tmp_path, jobs):
+    """
+    Test that :func:`estimate_transfers_files` recovers regions from the
+    source of each file and aggregates per routine and per file.
+    """
+    (tmp_path / "a.f90").write_text("""subroutine a(x, y)
+  real, intent(in) :: x(10, 10)
+  real, intent(out) :: y(10, 10)
+  integer :: i, j
+  !$acc data copyin(x) copyout(y)
+  !$acc kernels default(present)
+  do j = 1, 10
+    do i = 1, 10
+      y(i, j) = x(i, j)
+    end do
+  end do
+  !$acc end kernels
+  !$acc end data
+end subroutine a
+
+subroutine b(x)
+  real, intent(inout) :: x(10)
+  integer :: i
+  !$acc kernels
+  do i = 1, 10
+    x(i) = 2.0 * x(i)
+  end do
+  !$acc end kernels
+end subroutine b
+""")
+    (tmp_path / "b.f90").write_text("subroutine c(\nend subroutine c\n")
+    report = estimate_transfers_files([str(tmp_path)], jobs=jobs)
+    records = report.records
+    assert [record.region for record in records] == [
+        "DataRegionDirective",
+        "ACCKernelsDirective",
+        "ACCKernelsDirective",
+    ]
+    assert [record.line for record in records] == [7, 7, 20]
+    assert _volumes(records) == [(400, 400), (0, 0), (40, 40)]
+    source = str(tmp_path / "a.f90")
+    assert report.by_routine() == {
+        (source, "a"): {
+            "regions": 2,
+            "bytes_in": 400,
+            "bytes_out": 400,
+            "exact": True,
+        },
+        (source, "b"): {
+            "regions": 1,
+            "bytes_in": 40,
+            "bytes_out": 40,
+            "exact": True,
+        },
+    }
+    assert report.by_file()[source]["bytes_in"] == 440
+    assert list(report.errors) == [str(tmp_path / "b.f90")]
+    assert report.summary()["failed_files"] == 1
+
+
+def test_transfer_report_write(tmp_path):
+    """
+    Test that a :class:`TransferReport` may be written as CSV or JSON.
+    """
+    (tmp_path / "a.f90").write_text(
+        cs.sibling_double_loops.replace(
+            "      DO j = 1, 10\n        DO i = 1, 10\n          a",
+            "      !$acc kernels\n      DO j = 1, 10\n        DO i = 1, 10\n"
+            "          a",
+        ).replace(
+            "      DO j = 1, 10\n        DO i = 1, 10\n          b",
+            "      !$acc end kernels\n      DO j = 1, 10\n"
+            "        DO i = 1, 10\n          b",
+        )
+    )
+    report = estimate_transfers_files([str(tmp_path)], jobs=1)
+    report.write(tmp_path / "t.csv")
+    with open(tmp_path / "t.csv", encoding="utf-8") as csv_file:
+        rows = list(csv.DictReader(csv_file))
+    assert len(rows) == 1
+    assert rows[0]["arrays"] == "a"
+    assert rows[0]["bytes_out"] == "400"
+    report.write(tmp_path / "t.json")
+    with open(tmp_path / "t.json", encoding="utf-8") as json_file:
+        data = json.load(json_file)
+    assert data["summary"]["bytes_out"] == 400
+    assert data["regions"][0]["arrays"][0]["shape"] == ["10", "10"]
+    assert data["routines"][0]["routine"] == "test"
+
+
+def test_estimate_transfers_files_clauses(tmp_path):
+    """
+    Test that :func:`estimate_transfers_files` recovers data clauses with
+    array sections, ``present`` clauses and continuation lines, as well as
+    data clauses on compute regions.
+    """
+    (tmp_path / "a.f90").write_text("""subroutine a(x, y, z)
+  real, intent(in) :: x(10, 10)
+  real, intent(inout) :: y(10, 10)
+  real, intent(out) :: z(10, 10)
+  integer :: i, j
+  !$acc data copyin(x(1:10, 1:10), y) &
+  !$acc& copyout(z(:, 1:10))
+  !$acc kernels
+  do j = 1, 10
+    do i = 1, 10
+      z(i, j) = x(i, j) + y(i, j)
+    end do
+  end do
+  !$acc end kernels
+  !$acc end data
+  !$acc kernels present(x, y) copyout(z(1:10, :))
+  do j = 1, 10
+    do i = 1, 10
+      z(i, j) = x(i, j) * y(i, j)
+    end do
+  end do
+  !$acc end kernels
+end subroutine a
+""")
+    records = estimate_transfers_files([str(tmp_path)], jobs=1).records
+    assert [record.region for record in records] == [
+        "DataRegionDirective",
+        "ACCKernelsDirective",
+        "DataRegionDirective",
+        "ACCKernelsDirective",
+    ]
+    assert [array.name for array in records[0].arrays] == ["x", "y", "z"]
+    assert _volumes(records) == [(800, 400), (0, 0), (0, 400), (0, 0)]
@@ -7,15 +7,24 @@
 Various utility functions for PSyTran's test suite.
 """
 
+from psyclone.psyir import nodes
+from psyclone.psyir.transformations import ACCKernelsTrans
+
 import code_snippets as cs
 from psytran import (
+    apply_parallel_directive,
     has_collapse_clause,
     has_gang_clause,
     has_seq_clause,
     has_vector_clause,
 )
 
-__all__ = ["has_clause", "get_schedule", "simple_loop_code"]
+__all__ = [
+    "has_clause",
+    "get_schedule",
+    "get_kernels_schedule",
+    "simple_loop_code",
+]
 
 has_clause = {
     "sequential": has_seq_clause,
@@ -36,6 +45,35 @@ def get_schedule(fortran_reader, code_string):
     return fortran_reader.psyir_from_source(code_string).children[0]
 
 
+def get_kernels_schedule(fortran_reader, code_string, outer=False):
+    """
+    Given a snippet of test code written as a string, get the schedule of the
+    (first) invoke it contains, with a kernels region around each of its
+    inner-most Loops.
+
+    :arg fortran_reader: PSyclone's fortran_reader fixture
+    :arg code_string: the code to be parsed, as a string
+    :kwarg outer: if ``True``, put the kernels regions around the outer Loops
+        which are children of the schedule instead
+    """
+    schedule = get_schedule(fortran_reader, code_string)
+    if outer:
+        loops = [
+            child
+            for child in schedule.children
+            if isinstance(child, nodes.Loop)
+        ]
+    else:
+        loops = [
+            loop
+            for loop in schedule.walk(nodes.Loop)
+            if not loop.loop_body.walk(nodes.Loop)
+        ]
+    for loop in loops:
+        apply_parallel_directive(loop, ACCKernelsTrans)
+    return schedule
+
+
 def simple_loop_code(depth):
     """
     Generate a code string containing a perfectly nested loop with a single